@@ -0,0 +1,56 @@
+from typing import Dict, List, Set
+
+
+class BatchProgress:
+    """
+    Пакетная загрузка плейлиста в один чат: какие треки уже отправлены, какие упали и почему.
+    Живёт дольше самой загрузки — повторный запуск докачивает только то, что не отправлено,
+    поэтому после частичного сбоя плейлист не начинается заново.
+    Используется только из asyncio loop.
+    """
+    def __init__(self, title: str, total: int):
+        self.title = title
+        self.total = total
+        self.delivered: Set[int] = set()
+        self.failed: Dict[int, str] = {}
+        self.active: Set[int] = set()
+        self.running = False
+        self.cancelled = False
+
+    def start(self) -> List[int]:
+        """Начинает (или возобновляет) проход: возвращает индексы треков, которые ещё не отправлены."""
+        self.running = True
+        self.cancelled = False
+        self.failed.clear()
+        return [i for i in range(self.total) if i not in self.delivered]
+
+    def begin(self, idx: int) -> None:
+        self.active.add(idx)
+
+    def done(self, idx: int) -> None:
+        self.active.discard(idx)
+        self.delivered.add(idx)
+
+    def fail(self, idx: int, reason: str) -> None:
+        self.active.discard(idx)
+        self.failed[idx] = reason
+
+    def finish(self) -> None:
+        self.running = False
+        self.active.clear()
+
+    @property
+    def remaining(self) -> int:
+        return self.total - len(self.delivered)
+
+    def render(self) -> str:
+        """Сводный статус: "«Альбом»: отправлено 3 из 12, качается 2, ошибок 1"."""
+        parts = [f"«{self.title}»: отправлено {len(self.delivered)} из {self.total}"]
+        if self.running and self.active:
+            parts.append(f"качается {len(self.active)}")
+        if self.failed:
+            parts.append(f"ошибок {len(self.failed)}")
+        text = ", ".join(parts)
+        if self.cancelled:
+            text += " — остановлено"
+        return text
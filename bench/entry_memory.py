@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Память на один закэшированный поиск: прежний dict с полным payload yt-dlp в _raw против Track.
+
+    python bench/entry_memory.py                              # синтетические entries в формате ytsearch (extract_flat)
+    python bench/entry_memory.py --query "ytsearch30:daft punk"   # настоящий поиск (нужна сеть)
+"""
+import argparse
+import copy
+import gc
+import os
+import sys
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import encode_value  # noqa: E402
+from track import Track, encode_tracks  # noqa: E402
+
+
+def legacy_entry(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Нормализация до появления Track: dict со ссылкой на весь entry yt-dlp."""
+    return {
+        "id": raw.get("id"),
+        "title": raw.get("title") or raw.get("name"),
+        "webpage_url": raw.get("webpage_url") or raw.get("url") or raw.get("original_url"),
+        "duration": raw.get("duration"),
+        "uploader": raw.get("uploader") or raw.get("uploader_id") or raw.get("channel"),
+        "source": raw.get("extractor") or raw.get("extractor_key") or raw.get("ie_key"),
+        "_raw": raw,
+    }
+
+
+def legacy_compact(entry: Dict[str, Any]) -> Dict[str, Any]:
+    compact = {k: v for k, v in entry.items() if k != "_raw"}
+    compact["_raw"] = {"url": entry["_raw"].get("url")}
+    return compact
+
+
+def synthetic_raw(i: int) -> Dict[str, Any]:
+    # поля, которые ytsearch с extract_flat отдаёт на каждый результат
+    video_id = f"vid{i:08d}"
+    return {
+        "_type": "url",
+        "ie_key": "Youtube",
+        "id": video_id,
+        "url": f"https://www.youtube.com/watch?v={video_id}",
+        "title": f"Artist {i} - Some Song Title (Official Video) #{i}",
+        "description": "Official music video. Listen on all platforms: https://example.invalid/" + "x" * 120,
+        "duration": 180.0 + i,
+        "channel_id": f"UC{i:022d}",
+        "channel": f"Artist {i}",
+        "channel_url": f"https://www.youtube.com/channel/UC{i:022d}",
+        "uploader": f"Artist {i}",
+        "uploader_id": f"@artist{i}",
+        "uploader_url": f"https://www.youtube.com/@artist{i}",
+        "thumbnails": [
+            {"url": f"https://i.ytimg.com/vi/{video_id}/hq720.jpg?sqp=-oaymwEcCOgCEMoBSFXyq4qpAw4IARUAAIhCGAFwAcABBg==&rs=AOn4CLA", "height": 202, "width": 360},
+            {"url": f"https://i.ytimg.com/vi/{video_id}/hq720.jpg?sqp=-oaymwEcCNAFEJQDSFXyq4qpAw4IARUAAIhCGAFwAcABBg==&rs=AOn4CLB", "height": 404, "width": 720},
+        ],
+        "timestamp": None,
+        "release_timestamp": None,
+        "availability": None,
+        "view_count": 1_000_000 + i,
+        "live_status": None,
+        "channel_is_verified": True,
+        "__x_forwarded_for_ip": None,
+    }
+
+
+def real_raw(query: str) -> List[Dict[str, Any]]:
+    import music_downloader
+
+    with music_downloader._search_pool(None).acquire() as ydl:
+        info = ydl.extract_info(query, download=False)
+    return [e for e in (info or {}).get("entries") or [] if e]
+
+
+def measure(make: Callable[[], List[Any]], searches: int) -> float:
+    """Средний прирост памяти (байты) на один закэшированный поиск."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make() for _ in range(searches)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / searches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--results", type=int, default=30, help="результатов на поиск (синтетика)")
+    parser.add_argument("--searches", type=int, default=200, help="закэшированных поисков в замере")
+    parser.add_argument("--query", help="настоящий запрос yt-dlp вместо синтетики")
+    args = parser.parse_args()
+
+    if args.query:
+        sample = real_raw(args.query)
+        # каждый поиск получает свою копию payload — как при независимых запросах
+        def raws():
+            return copy.deepcopy(sample)
+    else:
+        def raws():
+            return [synthetic_raw(i) for i in range(args.results)]
+
+    n = len(raws())
+    legacy = measure(lambda: [legacy_entry(r) for r in raws()], args.searches)
+    compact = measure(lambda: [Track.from_raw(r) for r in raws()], args.searches)
+    print(f"results per search: {n}")
+    print(f"in-memory cache, per search:  legacy dict+_raw {legacy / 1024:8.1f} KB   Track {compact / 1024:8.1f} KB"
+          f"   ({legacy / max(compact, 1):.1f}x)")
+
+    sample_raws = raws()
+    old_blob = encode_value([legacy_compact(legacy_entry(r)) for r in sample_raws])
+    new_blob = encode_tracks(Track.from_raw(r) for r in sample_raws)
+    print(f"serialized (sqlite backend):  legacy {len(old_blob):6d} B   Track rows {len(new_blob):6d} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Локальная заглушка Telegram Bot API для офлайн-нагрузочных тестов.
+Отвечает на методы, которые вызывает бот, и запоминает последнюю клавиатуру в каждом чате,
+чтобы генератор нагрузки нажимал настоящие кнопки (callback_data) из ответа бота.
+"""
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+BOT_USER = {"id": 1000000, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+_MULTIPART_FIELD = re.compile(rb'name="([^"]+)"\r\n(?:[^\r\n]+\r\n)*\r\n(.*?)\r\n--', re.S)
+
+
+def _decode(value: str) -> Any:
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def _parse_body(content_type: str, body: bytes) -> Dict[str, Any]:
+    if content_type.startswith("application/json"):
+        return json.loads(body or b"{}")
+    if content_type.startswith("multipart/form-data"):
+        params = {}
+        for name, value in _MULTIPART_FIELD.findall(body):
+            if len(value) < 4096:  # пропускаем сами файлы
+                params[name.decode()] = _decode(value.decode("utf-8", "replace"))
+        return params
+    return {k: _decode(v[0]) for k, v in parse_qs(body.decode("utf-8")).items()}
+
+
+class FakeBotAPI:
+    """
+    flood_rate > 0 — имитация flood control: больше flood_rate запросов в секунду в один чат
+    получают 429 с retry_after=1 (ответы на нажатия и getMe не ограничиваются).
+    """
+    def __init__(self, latency: float = 0.0, host: str = "127.0.0.1", port: int = 0, flood_rate: int = 0):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        self.floods = 0
+        # chat_id -> время последних запросов (для flood_rate)
+        self._recent: Dict[int, List[float]] = {}
+        # chat_id -> (message_id, callback_data кнопок) последней клавиатуры
+        self._keyboards: Dict[int, Tuple[int, List[str]]] = {}
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                params = _parse_body(self.headers.get("Content-Type", ""), body)
+                error = api.validate(params)
+                if error:
+                    status = 400
+                    payload = json.dumps({"ok": False, "error_code": 400, "description": error}).encode()
+                elif api.flooded(method, params):
+                    status = 429
+                    payload = json.dumps({
+                        "ok": False,
+                        "error_code": 429,
+                        "description": "Too Many Requests: retry after 1",
+                        "parameters": {"retry_after": 1},
+                    }).encode()
+                else:
+                    status = 200
+                    payload = json.dumps({"ok": True, "result": api.handle(method, params)}).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST
+
+            def log_message(self, format, *args):  # noqa: A002
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-bot-api", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def start(self) -> "FakeBotAPI":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+
+    def validate(self, params: Dict[str, Any]) -> Optional[str]:
+        """Проверки, которые делает настоящий Bot API: callback_data кнопки — не больше 64 байт."""
+        markup = params.get("reply_markup")
+        if isinstance(markup, dict):
+            for row in markup.get("inline_keyboard") or []:
+                for button in row:
+                    if len(str(button.get("callback_data") or "").encode("utf-8")) > 64:
+                        with self._lock:
+                            self.calls["invalid"] = self.calls.get("invalid", 0) + 1
+                        return "Bad Request: BUTTON_DATA_INVALID"
+        return None
+
+    def flooded(self, method: str, params: Dict[str, Any]) -> bool:
+        if not self.flood_rate or method in ("getMe", "answerCallbackQuery", "answerInlineQuery"):
+            return False
+        chat_id = int(params.get("chat_id") or 1)
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._recent.get(chat_id, ()) if now - t < 1.0]
+            if len(recent) >= self.flood_rate:
+                self.floods += 1
+                self._recent[chat_id] = recent
+                return True
+            recent.append(now)
+            self._recent[chat_id] = recent
+        return False
+
+    def last_keyboard(self, chat_id: int) -> Tuple[int, List[str]]:
+        with self._lock:
+            return self._keyboards.get(chat_id, (0, []))
+
+    def _message(self, chat_id: int, params: Dict[str, Any], message_id: Optional[int] = None) -> Dict[str, Any]:
+        message = {
+            "message_id": message_id or next(self._ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = str(params["text"])
+        return message
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        chat_id = int(params.get("chat_id") or 1)
+        if method == "getMe":
+            return BOT_USER
+        if method in ("sendMessage", "editMessageText", "editMessageReplyMarkup"):
+            message = self._message(chat_id, params, params.get("message_id"))
+            markup = params.get("reply_markup")
+            if isinstance(markup, dict) and markup.get("inline_keyboard"):
+                buttons = [b["callback_data"] for row in markup["inline_keyboard"] for b in row if b.get("callback_data")]
+                with self._lock:
+                    self._keyboards[chat_id] = (message["message_id"], buttons)
+            return message
+        if method == "sendAudio":
+            message = self._message(chat_id, params)
+            audio = params.get("audio")
+            file_id = audio if isinstance(audio, str) and not audio.startswith("attach://") else f"fake-file-{message['message_id']}"
+            message["audio"] = {"file_id": file_id, "file_unique_id": f"u-{file_id}", "duration": 0}
+            return message
+        # answerCallbackQuery, deleteMessage и прочее
+        return True
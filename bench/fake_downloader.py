@@ -0,0 +1,105 @@
+"""
+Детерминированная замена сетевой части music_downloader для офлайн-бенчмарков.
+Задержки, число результатов и доля ошибок настраиваются; yt-dlp, ffmpeg и сеть не используются.
+"""
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from track import Track
+
+
+class FakeDownloader:
+    def __init__(
+        self,
+        search_latency: float = 0.3,
+        info_latency: float = 0.1,
+        fetch_latency: float = 1.0,
+        transcode_latency: float = 0.5,
+        results: int = 30,
+        failure_rate: float = 0.0,
+        file_size: int = 64 * 1024,
+        playlist_size: int = 12,
+        seed: int = 1,
+    ):
+        self.search_latency = search_latency
+        self.info_latency = info_latency
+        self.fetch_latency = fetch_latency
+        self.transcode_latency = transcode_latency
+        self.results = results
+        self.failure_rate = failure_rate
+        self.file_size = file_size
+        self.playlist_size = playlist_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls: Dict[str, int] = {"search": 0, "info": 0, "fetch": 0, "transcode": 0}
+
+    def _tick(self, kind: str, latency: float) -> bool:
+        """Считает вызов, спит latency (±20%), возвращает False для «неудачного» вызова."""
+        with self._lock:
+            self.calls[kind] += 1
+            jitter = self._random.uniform(0.8, 1.2)
+            failed = self._random.random() < self.failure_rate
+        time.sleep(latency * jitter)
+        return not failed
+
+    @staticmethod
+    def _entry(track_id: str, title: str) -> Track:
+        return Track(
+            id=track_id,
+            title=title,
+            webpage_url=f"https://example.invalid/watch?v={track_id}",
+            duration=200,
+            uploader="Fake Artist",
+            source="fake",
+        )
+
+    def search_combined(self, query: str, sources: List[str], max_results_total: int = 50, **kwargs) -> List[Track]:
+        if not self._tick("search", self.search_latency):
+            return []
+        slug = "".join(c for c in query.lower() if c.isalnum())[:16] or "q"
+        count = min(self.results, max_results_total)
+        return [self._entry(f"{slug}{i}", f"{query} #{i}") for i in range(count)]
+
+    def fetch_playlist(self, url: str, max_items: int = 50) -> Tuple[Optional[str], List[Track]]:
+        """Ссылки с "list=" — плейлист из playlist_size треков, остальные — одиночный трек."""
+        if not self._tick("info", self.info_latency):
+            return None, []
+        if "list=" not in url:
+            track_id = "".join(c for c in url if c.isalnum())[-11:]
+            return None, [self._entry(track_id, f"Track {track_id}")]
+        slug = "".join(c for c in url.rsplit("list=", 1)[-1] if c.isalnum())[:16] or "pl"
+        count = min(self.playlist_size, max_items)
+        return f"Playlist {slug}", [self._entry(f"{slug}t{i}", f"{slug} track {i + 1}") for i in range(count)]
+
+    def fetch_audio(self, url: str, out_dir: str, passthrough: bool = False, progress: Optional[Callable] = None,
+                    inspect: Optional[Callable] = None) -> Optional[str]:
+        if inspect is not None:
+            inspect({"duration": 200, "filesize": self.file_size})
+        if not self._tick("fetch", self.fetch_latency):
+            return None
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, "track.m4a")
+        with open(path, "wb") as f:
+            f.write(b"\0" * self.file_size)
+        if progress is not None:
+            progress(1.0, None)
+        return path
+
+    def prepare_audio(self, src_path: str, codec: str = "mp3", bitrate: str = "192", passthrough: bool = False,
+                      progress: Optional[Callable] = None, duration: Optional[float] = None, max_size: Optional[int] = None):
+        if not self._tick("transcode", self.transcode_latency):
+            return None, "transcode"
+        return src_path, "passthrough" if passthrough else "transcode"
+
+    def install(self, module) -> None:
+        """Подменяет функции модуля music_downloader на фейковые."""
+        module.search_combined = self.search_combined
+        module.fetch_playlist = self.fetch_playlist
+        module.fetch_audio = self.fetch_audio
+        module.prepare_audio = self.prepare_audio
+        module.warm_pools = lambda *args, **kwargs: None
+        module.search_extractors = lambda prefixes: {prefix: "Fake" for prefix in prefixes}
+        module.ffmpeg_version = lambda: "ffmpeg (fake)"
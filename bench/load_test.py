@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Офлайн-нагрузочный тест обработчиков бота: без YouTube и без Telegram.
+
+music_downloader подменяется детерминированным фейком (bench/fake_downloader.py), ApplicationBuilder
+направляется на локальную заглушку Bot API (bench/fake_bot_api.py). Приложение собирается тем же
+main.build_application, что и в продакшене, апдейты подаются через app.update_queue, как их кладёт
+Updater. Каждый синтетический пользователь отправляет запрос, листает страницу и нажимает кнопку
+трека. В конце — p50/p99 по типам апдейтов (от постановки в очередь до конца обработки),
+пропускная способность и пиковый RSS.
+
+    python bench/load_test.py --users 200 --concurrency 50 --queries 20 --fetch-latency 0.5
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FAKE_TOKEN = "123456:FAKE-TOKEN-FOR-BENCHMARKS"
+
+
+def _configure_env(workdir: str) -> None:
+    # до импорта main: config.py читает окружение при импорте
+    os.environ["BOT_TOKEN"] = FAKE_TOKEN
+    os.environ["ADMIN_ID"] = ""
+    os.environ["TEMP_DIR"] = os.path.join(workdir, "tmp")
+    os.environ["TRACK_DB_PATH"] = os.path.join(workdir, "tracks.db")
+    os.environ["TRACK_INDEX_PATH"] = os.path.join(workdir, "track_index.db")
+    os.environ["SEARCH_CACHE_BACKEND"] = "memory"
+    os.environ["METRICS_PORT"] = "0"
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class Replayer:
+    def __init__(self, app, api, args, bot=None):
+        self._app = app
+        self._bot = bot
+        self._api = api
+        self._args = args
+        self._random = random.Random(args.seed)
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(10_000_000)
+        self.latencies: Dict[str, List[float]] = {"search": [], "page": [], "play": [], "batch": [], "playlist": []}
+        self._handled: Dict[int, asyncio.Future] = {}
+
+    async def handled(self, update, context) -> None:
+        """TypeHandler последней группы: обработка апдейта во всех группах закончилась."""
+        future = self._handled.pop(update.update_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    async def _process(self, kind: str, data: dict) -> None:
+        from telegram import Update
+
+        update = Update.de_json(data, self._app.bot)
+        done = self._handled[update.update_id] = asyncio.get_running_loop().create_future()
+        started = time.perf_counter()
+        await self._app.update_queue.put(update)
+        await done
+        self.latencies[kind].append(time.perf_counter() - started)
+
+    async def send_text(self, user_id: int, text: str) -> None:
+        await self._process("search", {
+            "update_id": next(self._update_ids),
+            "message": {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": text,
+            },
+        })
+
+    async def press(self, kind: str, user_id: int, message_id: int, data: str) -> None:
+        from fake_bot_api import BOT_USER
+
+        await self._process(kind, {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._update_ids)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "results",
+                },
+            },
+        })
+
+    async def playlist_session(self, user_id: int) -> None:
+        # ссылка на плейлист -> «Скачать все»; латентность — до отправки последнего трека
+        await self.send_text(user_id, f"https://example.invalid/playlist?list=PL{self._random.randrange(self._args.queries)}")
+        message_id, buttons = self._api.last_keyboard(user_id)
+        batch = [b for b in buttons if b.startswith("batch:")]
+        if not batch:
+            return
+        started = time.perf_counter()
+        await self.press("batch", user_id, message_id, batch[0])
+        key = (user_id, batch[0].split(":", 1)[1])
+        while key in self._bot._batches and self._bot._batches[key].running:
+            await asyncio.sleep(0.05)
+        self.latencies["playlist"].append(time.perf_counter() - started)
+
+    async def user_session(self, user_id: int) -> None:
+        if self._args.playlist_ratio and self._random.random() < self._args.playlist_ratio:
+            await self.playlist_session(user_id)
+            return
+        query = f"song {self._random.randrange(self._args.queries)}"
+        await self.send_text(user_id, query)
+        message_id, buttons = self._api.last_keyboard(user_id)
+        pages = [b for b in buttons if b.startswith("page:")]
+        if pages and self._random.random() < self._args.page_ratio:
+            await self.press("page", user_id, message_id, pages[-1])
+            message_id, buttons = self._api.last_keyboard(user_id)
+        plays = [b for b in buttons if b.startswith("play:")]
+        if plays and self._random.random() < self._args.play_ratio:
+            if self._args.think_time:
+                # пользователь читает выдачу; за это время бот может успеть сделать prefetch
+                await asyncio.sleep(self._random.uniform(0.5, 1.5) * self._args.think_time)
+                message_id, buttons = self._api.last_keyboard(user_id)
+                plays = [b for b in buttons if b.startswith("play:")] or plays
+            # чаще всего нажимают верхние результаты
+            idx = min(int(self._random.expovariate(1.0)), len(plays) - 1)
+            await self.press("play", user_id, message_id, plays[idx])
+
+
+async def run(args) -> None:
+    workdir = tempfile.mkdtemp(prefix="bot-bench-")
+    _configure_env(workdir)
+
+    import music_downloader
+    from fake_downloader import FakeDownloader
+
+    fake = FakeDownloader(
+        search_latency=args.search_latency,
+        info_latency=args.info_latency,
+        fetch_latency=args.fetch_latency,
+        transcode_latency=args.transcode_latency,
+        results=args.results,
+        failure_rate=args.failure_rate,
+        seed=args.seed,
+    )
+    fake.install(music_downloader)
+
+    import main as bot
+    from fake_bot_api import FakeBotAPI
+    from telegram import Update
+    from telegram.ext import ApplicationBuilder, TypeHandler
+
+    if not args.verbose:
+        # main настраивает INFO-логирование; httpx пишет строку на каждый вызов API
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    api = FakeBotAPI(latency=args.api_latency, flood_rate=args.flood_rate).start()
+    # та же сборка, что в main(), только Bot API — заглушка
+    app = bot.build_application(
+        ApplicationBuilder().token(FAKE_TOKEN).base_url(api.base_url).base_file_url(api.base_url),
+        rate_limit=not args.no_rate_limit,
+    )
+    replayer = Replayer(app, api, args, bot)
+    app.add_handler(TypeHandler(Update, replayer.handled), group=100)
+    await app.initialize()
+    # без updater (он опрашивал бы getUpdates): апдейты кладутся в update_queue напрямую.
+    # post_init не вызывается — его фоновые задачи бесконечны, и app.stop() ждал бы их
+    await app.start()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def session(user_id: int) -> None:
+        async with semaphore:
+            await replayer.user_session(user_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(1000 + i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    await app.stop()
+    await app.shutdown()
+    api.stop()
+
+    total = sum(len(v) for v in replayer.latencies.values())
+    print(f"users={args.users} concurrency={args.concurrency} updates={total} wall={elapsed:.2f}s")
+    print(f"throughput: {total / elapsed:.1f} updates/s")
+    for kind, samples in replayer.latencies.items():
+        if not samples:
+            continue
+        print(
+            f"{kind:>7}: n={len(samples):5d}  p50 {statistics.median(samples) * 1000:8.1f} ms"
+            f"  p99 {_percentile(samples, 0.99) * 1000:8.1f} ms  max {max(samples) * 1000:8.1f} ms"
+        )
+    # ru_maxrss в Linux — КБ
+    phases = ", ".join(f"{k} {v:.2f}s" for k, v in bot.health.phases.items())
+    print(f"startup (from main import): {phases}")
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+    print(f"fake extractor calls: {fake.calls}")
+    print(f"prefetch: {bot.prefetch_holds.stats()}")
+    print(f"fake Bot API calls: {dict(sorted(api.calls.items()))}  429 responses: {api.floods}")
+    if not args.no_rate_limit:
+        print(f"rate limiter: {bot.telegram_limiter.stats()}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="число синтетических пользователей")
+    parser.add_argument("--concurrency", type=int, default=20, help="одновременно активных пользователей")
+    parser.add_argument("--queries", type=int, default=20, help="размер пула запросов (меньше — больше попаданий в кэш)")
+    parser.add_argument("--page-ratio", type=float, default=0.5, help="доля пользователей, листающих страницу")
+    parser.add_argument("--play-ratio", type=float, default=0.8, help="доля пользователей, нажимающих трек")
+    parser.add_argument("--playlist-ratio", type=float, default=0.0,
+                        help="доля пользователей, присылающих ссылку на плейлист и нажимающих «Скачать все»")
+    parser.add_argument("--results", type=int, default=30, help="результатов на поиск")
+    parser.add_argument("--search-latency", type=float, default=0.3)
+    parser.add_argument("--info-latency", type=float, default=0.1)
+    parser.add_argument("--fetch-latency", type=float, default=1.0)
+    parser.add_argument("--transcode-latency", type=float, default=0.5)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка заглушки Bot API на вызов")
+    parser.add_argument("--flood-rate", type=int, default=0,
+                        help="заглушка отвечает 429 на запросы сверх N в секунду в один чат (0 — без flood control)")
+    parser.add_argument("--no-rate-limit", action="store_true", help="без ограничителя исходящих запросов (для сравнения)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="доля неудачных вызовов фейкового extractor")
+    parser.add_argument("--think-time", type=float, default=0.0, help="средняя пауза перед нажатием трека (сек)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="не приглушать логи бота и httpx")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Сравнение задержки вызова: новый YoutubeDL на каждый вызов vs экземпляр из пула.
+
+    python bench/ydl_pool_bench.py                          # только создание экземпляра
+    python bench/ydl_pool_bench.py --query "ytsearch5:billie jean" -n 10   # с реальным запросом (нужна сеть)
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yt_dlp import YoutubeDL  # noqa: E402
+
+import music_downloader  # noqa: E402
+from ydl_pool import YDLPool  # noqa: E402
+
+
+def _report(name: str, samples) -> None:
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    print(
+        f"{name:>10}: mean {statistics.mean(samples) * 1000:8.2f} ms"
+        f"  p50 {statistics.median(samples) * 1000:8.2f} ms"
+        f"  p95 {p95 * 1000:8.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", "--iterations", type=int, default=50)
+    parser.add_argument("--query", help="выполнять extract_info(query) в каждом вызове")
+    args = parser.parse_args()
+
+    make_opts = music_downloader._make_ydl_opts_for_search
+
+    def call(ydl):
+        if args.query:
+            ydl.extract_info(args.query, download=False)
+
+    fresh = []
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        with YoutubeDL(make_opts()) as ydl:
+            call(ydl)
+        fresh.append(time.perf_counter() - started)
+
+    pool = YDLPool(make_opts, size=1, max_uses=0, max_age=0)
+    pool.warm(1)
+    pooled = []
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        with pool.acquire() as ydl:
+            call(ydl)
+        pooled.append(time.perf_counter() - started)
+    pool.close()
+
+    _report("per-call", fresh)
+    _report("pooled", pooled)
+
+
+if __name__ == "__main__":
+    main()
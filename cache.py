@@ -1,32 +1,264 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
 import time
-from typing import Any, Dict, Optional
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+
+def approx_size(obj: Any, _seen: Optional[set] = None) -> int:
+    """
+    Грубая оценка занимаемой памяти (байты) для словарей/списков/строк и объектов со __slots__.
+    Достаточно точна для лимита кэша, не претендует на точность tracemalloc.
+    """
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += approx_size(k, _seen) + approx_size(v, _seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += approx_size(item, _seen)
+    elif hasattr(type(obj), "__slots__"):
+        for name in type(obj).__slots__:
+            size += approx_size(getattr(obj, name, None), _seen)
+    return size
+
+
+def encode_value(value: Any) -> bytes:
+    """Компактная сериализация: JSON без пробелов, zlib для крупных значений (флаг в первом байте)."""
+    raw = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    if len(raw) > 512:
+        return b"z" + zlib.compress(raw, 6)
+    return b"j" + raw
+
+
+def decode_value(blob: bytes) -> Any:
+    blob = bytes(blob)
+    if blob[:1] == b"z":
+        return json.loads(zlib.decompress(blob[1:]).decode("utf-8"))
+    return json.loads(blob[1:].decode("utf-8"))
+
 
 class TTLCache:
     """
-    Простая реализация TTL-кэша в памяти.
-    key -> (timestamp, value)
+    TTL-кэш в памяти с LRU-вытеснением.
+    key -> (timestamp, size, value); порядок OrderedDict = порядок использования.
+    max_entries / max_bytes = 0 — без ограничения.
+    Потокобезопасен: sweep() можно вызывать из фонового потока или задачи рядом с asyncio loop.
     """
-    def __init__(self, ttl: int = 3600):
+    def __init__(
+        self,
+        ttl: int = 3600,
+        max_entries: int = 0,
+        max_bytes: int = 0,
+        sizeof: Callable[[Any], int] = approx_size,
+    ):
         self._ttl = ttl
-        self._data: Dict[str, Any] = {}
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
 
     def get(self, key: str) -> Optional[Any]:
-        item = self._data.get(key)
-        if not item:
-            return None
-        ts, value = item
-        if time.time() - ts > self._ttl:
-            # удаляем просроченную запись
-            try:
-                del self._data[key]
-            except KeyError:
-                pass
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                self.misses += 1
+                return None
+            ts, size, value = item
+            if time.time() - ts > self._ttl:
+                # удаляем просроченную запись
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        size = self._sizeof(value) if self._max_bytes else 0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (time.time(), size, value)
+            self._bytes += size
+            self._shrink()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def sweep(self) -> int:
+        """Удаляет все просроченные записи, возвращает их количество."""
+        deadline = time.time() - self._ttl
+        with self._lock:
+            expired = [k for k, (ts, _, _) in self._data.items() if ts < deadline]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+        return len(expired)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _remove(self, key: str) -> None:
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _shrink(self) -> None:
+        # вытесняем с начала — это самые давно использованные записи
+        while self._data and (
+            (self._max_entries and len(self._data) > self._max_entries)
+            or (self._max_bytes and self._bytes > self._max_bytes)
+        ):
+            _, (_, size, _) = self._data.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+
+class SQLiteCache:
+    """
+    TTL-кэш в SQLite с тем же интерфейсом, что и TTLCache (get/set/delete/sweep/stats).
+    Переживает перезапуски и может разделяться несколькими процессами на одном хосте (WAL).
+    key -> (expires_at, value); по expires_at есть индекс, очистка идёт пачками.
+    """
+    def __init__(
+        self,
+        path: str,
+        ttl: int = 3600,
+        max_entries: int = 0,
+        encode: Callable[[Any], bytes] = encode_value,
+        decode: Callable[[bytes], Any] = decode_value,
+        cleanup_batch: int = 500,
+    ):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._encode = encode
+        self._decode = decode
+        self._cleanup_batch = cleanup_batch
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY,"
+            " expires_at REAL NOT NULL,"
+            " value BLOB NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS cache_expires_at ON cache(expires_at)")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM cache WHERE key = ? AND expires_at > ?",
+                (key, time.time()),
+            ).fetchone()
+            if not row:
+                self.misses += 1
+                return None
+        try:
+            value = self._decode(row[0])
+        except (ValueError, TypeError, KeyError, zlib.error):
+            # повреждённая запись или запись другого формата (например, строка с чужим числом полей Track) — промах
+            self.delete(key)
+            with self._lock:
+                self.misses += 1
             return None
+        with self._lock:
+            self.hits += 1
         return value
 
     def set(self, key: str, value: Any) -> None:
-        self._data[key] = (time.time(), value)
+        blob = self._encode(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, time.time() + self._ttl, blob),
+            )
 
     def delete(self, key: str) -> None:
-        if key in self._data:
-            del self._data[key]
+        with self._lock:
+            self._conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def sweep(self) -> int:
+        """Удаляет просроченные записи пачками по cleanup_batch и обрезает кэш до max_entries."""
+        removed = 0
+        now = time.time()
+        while True:
+            with self._lock:
+                cur = self._conn.execute(
+                    "DELETE FROM cache WHERE rowid IN"
+                    " (SELECT rowid FROM cache WHERE expires_at <= ? LIMIT ?)",
+                    (now, self._cleanup_batch),
+                )
+            removed += cur.rowcount
+            if cur.rowcount < self._cleanup_batch:
+                break
+        self.expirations += removed
+        if self._max_entries:
+            with self._lock:
+                # самые старые записи (раньше всех истекают) вытесняются первыми
+                cur = self._conn.execute(
+                    "DELETE FROM cache WHERE rowid IN"
+                    " (SELECT rowid FROM cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self._max_entries,),
+                )
+            self.evictions += cur.rowcount
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cache"
+            ).fetchone()
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
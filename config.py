@@ -12,6 +12,19 @@ def _parse_list_env(var: str, default):
         return [s.strip() for s in raw.split(",") if s.strip()]
     return default
 
+def _parse_float_map_env(var: str):
+    """"prefix:seconds,prefix:seconds" -> {prefix: seconds}"""
+    result = {}
+    for item in _parse_list_env(var, []):
+        name, sep, value = item.rpartition(":")
+        if not sep or not name:
+            continue
+        try:
+            result[name.strip()] = float(value)
+        except ValueError:
+            continue
+    return result
+
 BOT_TOKEN = os.getenv("BOT_TOKEN", "").strip()
 ADMIN_ID = int(os.getenv("ADMIN_ID", "0")) if os.getenv("ADMIN_ID") else 0
 
@@ -26,6 +39,126 @@ SEARCH_SOURCES = _parse_list_env("SEARCH_SOURCES", [
 ])
 
 MAX_RESULTS_TOTAL = int(os.getenv("MAX_RESULTS_TOTAL", "30"))
+# Источники опрашиваются параллельно: дедлайн на один источник, переопределения
+# для отдельных префиксов ("deezersearch:5,scsearch:6") и общий дедлайн поиска (секунды)
+SEARCH_SOURCE_TIMEOUT = float(os.getenv("SEARCH_SOURCE_TIMEOUT", "8"))
+SEARCH_SOURCE_TIMEOUTS = _parse_float_map_env("SEARCH_SOURCE_TIMEOUTS")
+SEARCH_TOTAL_TIMEOUT = float(os.getenv("SEARCH_TOTAL_TIMEOUT", "12"))
+# Потоков для опроса источников: на каждый поиск — по потоку на источник, брошенные по таймауту потоки
+# продолжают занимать место, пока не ответят
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "16"))
+# Здоровье источников: окно статистики (вызовов на источник); источник выключается после N отказов
+# (ошибка или таймаут) подряд или при доле отказов >= ERROR_RATE в окне из не менее MIN_SAMPLES вызовов.
+# Выключенный источник пропускается COOLDOWN секунд, затем пробуется одним запросом; при повторном отказе
+# пауза удваивается до MAX_COOLDOWN
+SOURCE_HEALTH_WINDOW = int(os.getenv("SOURCE_HEALTH_WINDOW", "50"))
+SOURCE_BREAKER_FAILURES = int(os.getenv("SOURCE_BREAKER_FAILURES", "3"))
+SOURCE_BREAKER_ERROR_RATE = float(os.getenv("SOURCE_BREAKER_ERROR_RATE", "0.5"))
+SOURCE_BREAKER_MIN_SAMPLES = int(os.getenv("SOURCE_BREAKER_MIN_SAMPLES", "10"))
+SOURCE_BREAKER_COOLDOWN = float(os.getenv("SOURCE_BREAKER_COOLDOWN", "60"))
+SOURCE_BREAKER_MAX_COOLDOWN = float(os.getenv("SOURCE_BREAKER_MAX_COOLDOWN", "900"))
 PAGE_SIZE = int(os.getenv("PAGE_SIZE", "10"))
 SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "3600"))
+# Лимиты кэша поиска (0 — без ограничения) и период фоновой очистки просроченных записей (секунды)
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv("SEARCH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Бэкенд кэша поиска: memory (в процессе) или sqlite (переживает перезапуски, общий для процессов)
+SEARCH_CACHE_BACKEND = os.getenv("SEARCH_CACHE_BACKEND", "memory").strip().lower()
+SEARCH_CACHE_DB_PATH = os.getenv("SEARCH_CACHE_DB_PATH", "data/search_cache.db")
+# Кнопки панели ссылаются на результаты коротким ключом search_cache (работают после перезапуска и в других
+# процессах с общим SQLite-кэшем); в памяти — готовые страницы клавиатуры не больше чем для N панелей
+SEARCH_SESSIONS_MAX = int(os.getenv("SEARCH_SESSIONS_MAX", "10000"))
+CACHE_SWEEP_INTERVAL = int(os.getenv("CACHE_SWEEP_INTERVAL", "60"))
 TEMP_DIR = os.getenv("TEMP_DIR", "/tmp/telegram_music_bot")
+# Квота TEMP_DIR в байтах (0 — без ограничения): при превышении новая загрузка ждёт до TEMP_SPACE_WAIT секунд,
+# затем отклоняется. Каталоги, которые не держит ни одна загрузка, удаляются при старте и после TEMP_ORPHAN_AGE секунд.
+# У каждого процесса свой подкаталог TEMP_DIR/proc-<host>-<pid>, поэтому TEMP_DIR можно делить между процессами
+TEMP_DIR_MAX_BYTES = int(os.getenv("TEMP_DIR_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+TEMP_SPACE_WAIT = float(os.getenv("TEMP_SPACE_WAIT", "60"))
+TEMP_ORPHAN_AGE = float(os.getenv("TEMP_ORPHAN_AGE", "3600"))
+# Каталог в RAM (tmpfs, например /dev/shm/telegram_music_bot) для промежуточных файлов — пусто, выключено;
+# готовый файл переносится в TEMP_DIR. Если staging заполнен — загрузка идёт прямо в TEMP_DIR
+TEMP_STAGING_DIR = os.getenv("TEMP_STAGING_DIR", "").strip()
+TEMP_STAGING_MAX_BYTES = int(os.getenv("TEMP_STAGING_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Планировщик загрузок: общий лимит, лимиты на пользователя и чат, размер очереди (всего и на пользователя)
+# Слот планировщика занят только на время скачивания: дальше трек ждёт в стадиях конвейера
+MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "4"))
+DOWNLOADS_PER_USER = int(os.getenv("DOWNLOADS_PER_USER", "1"))
+DOWNLOADS_PER_CHAT = int(os.getenv("DOWNLOADS_PER_CHAT", "2"))
+DOWNLOAD_QUEUE_SIZE = int(os.getenv("DOWNLOAD_QUEUE_SIZE", "100"))
+DOWNLOAD_QUEUE_PER_USER = int(os.getenv("DOWNLOAD_QUEUE_PER_USER", "5"))
+# Сколько апдейтов обрабатывается одновременно: нажатие трека ждёт всю загрузку, и без параллельной
+# обработки поиски других пользователей и «Закрыть» стояли бы за ней (1 — строго по одному)
+UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "256"))
+# Стадии конвейера загрузки: скачивание (сеть), перекодирование ffmpeg (по умолчанию — по числу CPU),
+# отправка в Telegram. Скачивание дополнительно ограничено MAX_CONCURRENT_DOWNLOADS (с честной очередью)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "4"))
+TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", str(os.cpu_count() or 2)))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+
+# Доставка аудио: passthrough — отдавать m4a/mp3 источника без перекодирования (только перепаковка),
+# transcode — всегда перекодировать. Кодек (mp3 / m4a) и битрейт (кбит/с) для перекодирования
+AUDIO_DELIVERY_MODE = os.getenv("AUDIO_DELIVERY_MODE", "passthrough").strip().lower()
+AUDIO_CODEC = os.getenv("AUDIO_CODEC", "mp3").strip().lower()
+AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "192").strip()
+# Лимит Telegram Bot API на загрузку файла (50 МБ). Размер проверяется до скачивания: битрейт понижается
+# до AUDIO_MIN_BITRATE, длинное аудио режется на части (не больше AUDIO_MAX_PARTS, 1 — не резать),
+# а то, что не укладывается и так, отклоняется сразу, не занимая очередь загрузок
+UPLOAD_LIMIT_BYTES = int(os.getenv("UPLOAD_LIMIT_BYTES", str(50 * 1024 * 1024)))
+AUDIO_MIN_BITRATE = int(os.getenv("AUDIO_MIN_BITRATE", "64"))
+AUDIO_MAX_PARTS = int(os.getenv("AUDIO_MAX_PARTS", "4"))
+
+# Спекулятивная загрузка первых PREFETCH_TOP_K результатов нового поиска, пока очередь загрузок простаивает
+# (0 — выключено). Не больше PREFETCH_CONCURRENCY загрузок одновременно (и не больше DOWNLOADS_PER_USER:
+# в планировщике они идут от одного служебного пользователя) и PREFETCH_MAX_BYTES готовых файлов на диске.
+# Файлы удаляются при закрытии панели или по истечении SEARCH_CACHE_TTL
+PREFETCH_TOP_K = int(os.getenv("PREFETCH_TOP_K", "0"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "1"))
+PREFETCH_MAX_BYTES = int(os.getenv("PREFETCH_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Пул экземпляров YoutubeDL на профиль опций (поиск, плейлисты, скачивание): размер,
+# пересоздание после N использований и по возрасту (сек). Экземпляр после ошибки выбрасывается
+YDL_POOL_SIZE = int(os.getenv("YDL_POOL_SIZE", "8"))
+YDL_POOL_MAX_USES = int(os.getenv("YDL_POOL_MAX_USES", "200"))
+YDL_POOL_MAX_AGE = float(os.getenv("YDL_POOL_MAX_AGE", "1800"))
+
+# Ссылка на плейлист/альбом: не больше PLAYLIST_MAX_TRACKS треков; «Скачать все» качает не больше
+# BATCH_CONCURRENCY треков одновременно (через общую очередь, с приоритетом ниже обычных нажатий)
+PLAYLIST_MAX_TRACKS = int(os.getenv("PLAYLIST_MAX_TRACKS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "2"))
+
+# Статус загрузки редактируется не чаще раза в N секунд на сообщение (flood limits Telegram)
+PROGRESS_EDIT_INTERVAL = float(os.getenv("PROGRESS_EDIT_INTERVAL", "3"))
+
+# Исходящие запросы к Bot API: общий лимит (запросов/с), лимит на личный чат и на группу (запросов/с),
+# запас токенов на чат. На ответ 429 запрос повторяется после retry_after не больше API_FLOOD_RETRIES раз
+API_RATE_GLOBAL = float(os.getenv("API_RATE_GLOBAL", "30"))
+API_RATE_PER_CHAT = float(os.getenv("API_RATE_PER_CHAT", "1"))
+API_RATE_PER_GROUP = float(os.getenv("API_RATE_PER_GROUP", str(20 / 60)))
+API_RATE_BURST = float(os.getenv("API_RATE_BURST", "3"))
+API_FLOOD_RETRIES = int(os.getenv("API_FLOOD_RETRIES", "3"))
+
+# Метрики в формате Prometheus на http://METRICS_HOST:METRICS_PORT/metrics (0 — выключено)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+# Период (сек), с которым event loop снимает значения своих счётчиков (сессии, предзагрузки, очереди) для /metrics
+METRICS_REFRESH_INTERVAL = float(os.getenv("METRICS_REFRESH_INTERVAL", "5"))
+# Пробы на том же порту: /healthz — event loop отвечает (не завис дольше HEALTH_MAX_LAG сек),
+# /readyz — прогрев yt-dlp завершён и ffmpeg найден. `python health.py` — проверка для Docker HEALTHCHECK
+HEALTH_MAX_LAG = float(os.getenv("HEALTH_MAX_LAG", "30"))
+
+# Постоянное хранилище отправленных треков: (extractor, id) -> Telegram file_id
+TRACK_DB_PATH = os.getenv("TRACK_DB_PATH", "data/tracks.db")
+# Опциональный архив MP3 на диске (пусто — отключён) и его лимит в байтах (LRU-вытеснение)
+MP3_STORE_DIR = os.getenv("MP3_STORE_DIR", "").strip()
+MP3_STORE_MAX_BYTES = int(os.getenv("MP3_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+
+# Локальный полнотекстовый индекс всех найденных треков (SQLite FTS5; пусто — выключен).
+# Если по запросу нашлось не меньше MIN_HITS треков, они показываются сразу, а поиск по источникам
+# обновляет панель в фоне. Размер индекса ограничен MAX_ROWS (вытесняются давно не встречавшиеся),
+# INLINE_RESULTS — число ответов в inline-режиме
+TRACK_INDEX_PATH = os.getenv("TRACK_INDEX_PATH", "data/track_index.db").strip()
+TRACK_INDEX_MIN_HITS = int(os.getenv("TRACK_INDEX_MIN_HITS", "3"))
+TRACK_INDEX_MAX_ROWS = int(os.getenv("TRACK_INDEX_MAX_ROWS", "200000"))
+INLINE_RESULTS = int(os.getenv("INLINE_RESULTS", "20"))
@@ -0,0 +1,118 @@
+import logging
+import os
+import socket
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Health:
+    """
+    Состояние процесса для проб systemd / Docker:
+    - живость (/healthz): event loop отвечает — фоновая задача вызывает beat() каждые interval секунд,
+      пауза дольше max_lag означает, что loop завис;
+    - готовность (/readyz): прогрев завершён (фаза "warmup") и обязательные проверки пройдены.
+    Заодно хранит моменты фаз запуска в секундах от started: импорты, прогрев, первый ответ.
+    Пишется из asyncio loop, читается из потока HTTP-сервера метрик.
+    """
+    def __init__(self, started: float, max_lag: float = 30.0):
+        self.started = started
+        self.max_lag = max_lag
+        self.phases: Dict[str, float] = {}
+        self.failed: Dict[str, str] = {}
+        self._heartbeat = time.monotonic()
+
+    @property
+    def interval(self) -> float:
+        return max(1.0, self.max_lag / 3)
+
+    def mark(self, phase: str) -> float:
+        """Запоминает первый момент фазы; повторные вызовы возвращают уже записанное значение."""
+        if phase not in self.phases:
+            self.phases[phase] = time.monotonic() - self.started
+        return self.phases[phase]
+
+    def check(self, name: str, ok: bool, reason: str = "") -> None:
+        if ok:
+            self.failed.pop(name, None)
+        else:
+            self.failed[name] = reason or name
+
+    def beat(self) -> None:
+        self._heartbeat = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        return "warmup" in self.phases and not self.failed
+
+    def liveness(self) -> Tuple[bool, str]:
+        lag = time.monotonic() - self._heartbeat
+        if lag > self.max_lag:
+            return False, f"event loop stalled for {lag:.0f}s"
+        return True, "ok"
+
+    def readiness(self) -> Tuple[bool, str]:
+        alive, reason = self.liveness()
+        if not alive:
+            return False, reason
+        if self.failed:
+            return False, "; ".join(f"{name}: {reason}" for name, reason in sorted(self.failed.items()))
+        if "warmup" not in self.phases:
+            return False, "warming up"
+        return True, "ok"
+
+
+def sd_notify(state: str) -> bool:
+    """
+    Сообщение менеджеру сервисов по протоколу sd_notify ("READY=1", "STATUS=...", "WATCHDOG=1").
+    Без NOTIFY_SOCKET (запуск не из systemd с Type=notify) ничего не делает.
+    """
+    address = os.environ.get("NOTIFY_SOCKET")
+    if not address:
+        return False
+    if address.startswith("@"):
+        # абстрактный сокет Linux
+        address = "\0" + address[1:]
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.connect(address)
+            sock.sendall(state.encode("utf-8"))
+    except OSError as e:
+        logger.warning("sd_notify(%s) failed: %s", state, e)
+        return False
+    return True
+
+
+def watchdog_interval() -> Optional[float]:
+    """Период WatchDogSec= из unit-файла (сек) или None, если watchdog systemd не включён для этого процесса."""
+    usec = os.environ.get("WATCHDOG_USEC")
+    pid = os.environ.get("WATCHDOG_PID")
+    if not usec or not usec.isdigit() or (pid and pid != str(os.getpid())):
+        return None
+    return int(usec) / 1_000_000
+
+
+def probe(path: str = "/readyz", port: Optional[int] = None, host: str = "127.0.0.1", timeout: float = 5.0) -> bool:
+    """Опрос /readyz или /healthz работающего бота — для HEALTHCHECK в Docker, без curl в образе."""
+    port = port or int(os.getenv("METRICS_PORT", "0"))
+    if not port:
+        print("METRICS_PORT is not set: health endpoints are disabled", file=sys.stderr)
+        return False
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}{path}", timeout=timeout) as response:
+            print(response.read().decode("utf-8", "replace").strip())
+            return True
+    except urllib.error.HTTPError as e:
+        print(f"{e.code}: {e.read().decode('utf-8', 'replace').strip()}", file=sys.stderr)
+    except OSError as e:
+        print(e, file=sys.stderr)
+    return False
+
+
+if __name__ == "__main__":
+    # python health.py [/readyz|/healthz]
+    sys.exit(0 if probe(sys.argv[1] if len(sys.argv) > 1 else "/readyz") else 1)
@@ -0,0 +1,37 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Реестр выполняющихся задач (single-flight): одновременные вызовы с одинаковым
+    ключом ждут одну общую future вместо того, чтобы запускать работу повторно.
+    Используется только из asyncio loop, поэтому блокировки не нужны.
+    """
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            # shield: отмена одного ожидающего не должна отменять работу для остальных
+            return await asyncio.shield(fut)
+        fut = asyncio.ensure_future(factory())
+        self._inflight[key] = fut
+        fut.add_done_callback(lambda _: self._forget(key, fut))
+        return await asyncio.shield(fut)
+
+    def in_flight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def _forget(self, key: Hashable, fut: asyncio.Future) -> None:
+        if self._inflight.get(key) is fut:
+            del self._inflight[key]
+        # исключение уже получили ожидающие; не даём asyncio ругаться на "never retrieved"
+        if not fut.cancelled():
+            fut.exception()
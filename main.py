@@ -1,36 +1,133 @@
 #!/usr/bin/env python3
-import os
+import time
+
+# startup phases are measured from here: the imports below are part of the time to first response
+_STARTED = time.monotonic()
+
 import asyncio
+import contextlib
+import functools
 import hashlib
 import html
 import logging
+import os
 import shutil
 import re
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedAudio,
+    InputTextMessageContent,
+)
+from telegram.error import RetryAfter
 from telegram.ext import (
     ApplicationBuilder,
     CommandHandler,
     CallbackQueryHandler,
+    InlineQueryHandler,
     MessageHandler,
     filters,
     ContextTypes,
+    TypeHandler,
 )
 
 from config import (
     BOT_TOKEN,
     SEARCH_SOURCES,
     MAX_RESULTS_TOTAL,
+    SEARCH_SOURCE_TIMEOUT,
+    SEARCH_SOURCE_TIMEOUTS,
+    SEARCH_TOTAL_TIMEOUT,
+    SEARCH_WORKERS,
+    SOURCE_HEALTH_WINDOW,
+    SOURCE_BREAKER_FAILURES,
+    SOURCE_BREAKER_ERROR_RATE,
+    SOURCE_BREAKER_MIN_SAMPLES,
+    SOURCE_BREAKER_COOLDOWN,
+    SOURCE_BREAKER_MAX_COOLDOWN,
     PAGE_SIZE,
     SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_MAX_BYTES,
+    SEARCH_CACHE_BACKEND,
+    SEARCH_CACHE_DB_PATH,
+    SEARCH_SESSIONS_MAX,
+    CACHE_SWEEP_INTERVAL,
     TEMP_DIR,
+    TEMP_DIR_MAX_BYTES,
+    TEMP_SPACE_WAIT,
+    TEMP_ORPHAN_AGE,
+    TEMP_STAGING_DIR,
+    TEMP_STAGING_MAX_BYTES,
+    MAX_CONCURRENT_DOWNLOADS,
+    DOWNLOADS_PER_USER,
+    DOWNLOADS_PER_CHAT,
+    DOWNLOAD_QUEUE_SIZE,
+    DOWNLOAD_QUEUE_PER_USER,
+    UPDATE_CONCURRENCY,
+    FETCH_CONCURRENCY,
+    TRANSCODE_CONCURRENCY,
+    UPLOAD_CONCURRENCY,
+    AUDIO_DELIVERY_MODE,
+    AUDIO_CODEC,
+    AUDIO_BITRATE,
+    UPLOAD_LIMIT_BYTES,
+    AUDIO_MIN_BITRATE,
+    AUDIO_MAX_PARTS,
+    PROGRESS_EDIT_INTERVAL,
+    API_RATE_GLOBAL,
+    API_RATE_PER_CHAT,
+    API_RATE_PER_GROUP,
+    API_RATE_BURST,
+    API_FLOOD_RETRIES,
+    PREFETCH_TOP_K,
+    PREFETCH_CONCURRENCY,
+    PREFETCH_MAX_BYTES,
+    YDL_POOL_SIZE,
+    YDL_POOL_MAX_USES,
+    YDL_POOL_MAX_AGE,
+    PLAYLIST_MAX_TRACKS,
+    BATCH_CONCURRENCY,
+    METRICS_PORT,
+    METRICS_HOST,
+    METRICS_REFRESH_INTERVAL,
+    HEALTH_MAX_LAG,
     ADMIN_ID,
+    TRACK_DB_PATH,
+    MP3_STORE_DIR,
+    MP3_STORE_MAX_BYTES,
+    TRACK_INDEX_PATH,
+    TRACK_INDEX_MIN_HITS,
+    TRACK_INDEX_MAX_ROWS,
+    INLINE_RESULTS,
 )
-from cache import TTLCache
+from batch import BatchProgress
+from cache import TTLCache, SQLiteCache
+from health import Health, sd_notify, watchdog_interval
+from inflight import SingleFlight
+from pipeline import DownloadPipeline
+from prefetch import PrefetchHolds
+from progress import StatusMessage, render_progress
+from rate_limiter import TelegramRateLimiter
+from scheduler import DownloadScheduler, QueueFull, JobCancelled
+from sessions import SearchSessions, short_key
+from sizing import DeliveryRejected
+from source_health import SourceHealth
+from track import Track, decode_results, encode_results
+from track_index import TrackIndex
+from track_store import TrackStore, track_key
 from utils import sanitize_title, format_duration
+from workspace import Workspace, WorkspaceFull
+import metrics
+# yt_dlp itself is imported lazily: by the background warm-up or by the first search, whichever comes first
 import music_downloader
+import ydl_pool
 
 # Logging
 logging.basicConfig(
@@ -42,15 +139,131 @@ logger = logging.getLogger(__name__)
 if not BOT_TOKEN:
     raise RuntimeError("BOT_TOKEN not set. Put it into environment variables or .env")
 
-# In-memory search cache
-search_cache = TTLCache(ttl=SEARCH_CACHE_TTL)
+health = Health(_STARTED, max_lag=HEALTH_MAX_LAG)
+health.mark("imports")
+
+
+# Search cache: in-memory by default, SQLite to survive restarts and share between processes
+if SEARCH_CACHE_BACKEND == "sqlite":
+    search_cache = SQLiteCache(
+        SEARCH_CACHE_DB_PATH,
+        ttl=SEARCH_CACHE_TTL,
+        max_entries=SEARCH_CACHE_MAX_ENTRIES,
+        encode=encode_results,
+        decode=decode_results,
+    )
+else:
+    search_cache = TTLCache(
+        ttl=SEARCH_CACHE_TTL,
+        max_entries=SEARCH_CACHE_MAX_ENTRIES,
+        max_bytes=SEARCH_CACHE_MAX_BYTES,
+    )
+
+# SQLite calls (search cache, track store, local index) may wait up to the busy timeout: they run on their
+# own small pool, off the event loop and away from the default executor, which slow searches can fill up
+db_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="sqlite")
+
+
+# search_cache values are (playlist title or None, tracks): the title is needed again to render a panel from the cache
+async def _cache_get(key: str) -> Optional[Tuple[Optional[str], List[Track]]]:
+    if isinstance(search_cache, SQLiteCache):
+        return await asyncio.get_running_loop().run_in_executor(db_executor, search_cache.get, key)
+    return search_cache.get(key)
+
+
+async def _cache_set(key: str, entries: List[Track], playlist: Optional[str] = None) -> None:
+    value = (playlist, entries)
+    if isinstance(search_cache, SQLiteCache):
+        await asyncio.get_running_loop().run_in_executor(db_executor, search_cache.set, key, value)
+    else:
+        search_cache.set(key, value)
+
+
+async def _store_call(func, *args):
+    # TrackStore is SQLite too (and put_file copies audio files): same pool as the cache
+    return await asyncio.get_running_loop().run_in_executor(db_executor, func, *args)
+
+
+# Short callback_data ids for cached result sets, with their pre-rendered keyboard pages
+search_sessions = SearchSessions(max_sessions=SEARCH_SESSIONS_MAX, ttl=SEARCH_CACHE_TTL)
+
+# Persistent store of already delivered tracks (file_id reuse + optional MP3 archive)
+track_store = TrackStore(TRACK_DB_PATH, files_dir=MP3_STORE_DIR or None, max_bytes=MP3_STORE_MAX_BYTES)
+
+# Full-text index of every track search has returned: instant answers for similar queries and inline mode
+track_index = TrackIndex(TRACK_INDEX_PATH, max_rows=TRACK_INDEX_MAX_ROWS) if TRACK_INDEX_PATH else None
+
+# Threads polling the search sources in parallel; reusable YoutubeDL instances per options profile
+music_downloader.configure_search(SEARCH_WORKERS)
+ydl_pool.configure(YDL_POOL_SIZE, YDL_POOL_MAX_USES, YDL_POOL_MAX_AGE)
+
+# Per-source latency/error statistics: circuit breaker and adaptive ordering of search sources
+source_health = SourceHealth(
+    window=SOURCE_HEALTH_WINDOW,
+    failure_threshold=SOURCE_BREAKER_FAILURES,
+    error_rate=SOURCE_BREAKER_ERROR_RATE,
+    min_samples=SOURCE_BREAKER_MIN_SAMPLES,
+    cooldown=SOURCE_BREAKER_COOLDOWN,
+    max_cooldown=SOURCE_BREAKER_MAX_COOLDOWN,
+)
 
 # Simple URL regex to detect links in messages
 URL_RE = re.compile(r"https?://\S+")
 
-# Limit concurrent downloads to avoid overload
-MAX_CONCURRENT_DOWNLOADS = int(os.getenv("MAX_CONCURRENT_DOWNLOADS", "2"))
-_download_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOWNLOADS)
+# Download queue: global and per-user/per-chat limits, round-robin between users
+download_scheduler = DownloadScheduler(
+    max_concurrent=MAX_CONCURRENT_DOWNLOADS,
+    per_user=DOWNLOADS_PER_USER,
+    per_chat=DOWNLOADS_PER_CHAT,
+    max_queue=DOWNLOAD_QUEUE_SIZE,
+    max_user_queue=DOWNLOAD_QUEUE_PER_USER,
+)
+
+# Staged fetch -> transcode -> upload with separate concurrency limits
+download_pipeline = DownloadPipeline(
+    fetch_concurrency=FETCH_CONCURRENCY,
+    transcode_concurrency=TRANSCODE_CONCURRENCY,
+    upload_concurrency=UPLOAD_CONCURRENCY,
+    codec=AUDIO_CODEC,
+    bitrate=AUDIO_BITRATE,
+    passthrough=AUDIO_DELIVERY_MODE == "passthrough",
+    upload_limit=UPLOAD_LIMIT_BYTES,
+    min_bitrate=AUDIO_MIN_BITRATE,
+    max_parts=AUDIO_MAX_PARTS,
+)
+
+# TEMP_DIR/<process>/<download key>/ per download: byte quota, orphan sweeping, optional RAM staging
+workspace = Workspace(
+    TEMP_DIR,
+    max_bytes=TEMP_DIR_MAX_BYTES,
+    staging_root=TEMP_STAGING_DIR or None,
+    staging_max_bytes=TEMP_STAGING_MAX_BYTES,
+)
+
+# Every outgoing Bot API call: global and per-chat token buckets, priorities, edit merging, retry-after
+telegram_limiter = TelegramRateLimiter(
+    global_rate=API_RATE_GLOBAL,
+    chat_rate=API_RATE_PER_CHAT,
+    group_rate=API_RATE_PER_GROUP,
+    burst=API_RATE_BURST,
+    max_retries=API_FLOOD_RETRIES,
+)
+
+# Speculative downloads of top results: low priority, under a pseudo-user so they never take a real user's slot
+PREFETCH_PRIORITY = 10
+PREFETCH_USER = 0
+prefetch_holds = PrefetchHolds(ttl=SEARCH_CACHE_TTL, max_bytes=PREFETCH_MAX_BYTES, max_active=PREFETCH_CONCURRENCY)
+
+# "Download all" of a playlist: below clicks, above prefetches; progress per (chat, session) survives
+# the run itself so pressing the button again resumes with the tracks not delivered yet
+BATCH_PRIORITY = 5
+_batches: Dict[Tuple[int, str], BatchProgress] = {}
+
+# Identical searches / info fetches / downloads running right now share one future
+_inflight = SingleFlight()
+# Chats waiting on a shared download dir (removed when the last one is done) and their upload locks
+_download_refs: Dict[str, int] = {}
+_upload_locks: Dict[str, asyncio.Lock] = {}
 
 
 def _cache_key_for_query(query: str) -> str:
@@ -59,39 +272,447 @@ def _cache_key_for_query(query: str) -> str:
     return h.hexdigest()
 
 
-def build_keyboard(cache_key: str, page: int, total_pages: int, entries: List[dict]) -> InlineKeyboardMarkup:
+def _search_key(query: str) -> str:
+    # search_cache key; short enough to be the panel id in callback_data (see SearchSessions)
+    return short_key(query.strip().lower())
+
+
+def build_keyboard(
+    session_id: str, page: int, total_pages: int, entries: List[Track], playlist: bool = False
+) -> InlineKeyboardMarkup:
     buttons = []
     start = page * PAGE_SIZE
     end = min(start + PAGE_SIZE, len(entries))
     for idx in range(start, end):
-        title = entries[idx].get("title") or "Unknown"
+        title = entries[idx].title or "Unknown"
         title = sanitize_title(title)
-        cb = f"play:{cache_key}:{idx}"
+        cb = f"play:{session_id}:{idx}"
         buttons.append([InlineKeyboardButton(text=f"{idx - start + 1}. {title[:50]}", callback_data=cb)])
     nav = []
     if page > 0:
-        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"page:{cache_key}:{page-1}"))
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"page:{session_id}:{page-1}"))
     if page < total_pages - 1:
-        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"page:{cache_key}:{page+1}"))
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"page:{session_id}:{page+1}"))
     if nav:
         buttons.append(nav)
-    buttons.append([InlineKeyboardButton("Закрыть", callback_data=f"close:{cache_key}")])
+    if playlist:
+        buttons.append([InlineKeyboardButton(f"⬇️ Скачать все ({len(entries)})", callback_data=f"batch:{session_id}")])
+    buttons.append([InlineKeyboardButton("Закрыть", callback_data=f"close:{session_id}")])
     return InlineKeyboardMarkup(buttons)
 
 
-async def _run_search(query: str):
+def _keyboard_page(
+    session_id: str, page: int, entries: Optional[List[Track]] = None, playlist: Optional[str] = None
+) -> Optional[InlineKeyboardMarkup]:
+    # each page is built once per session; entries (and the playlist title they were cached with)
+    # are needed only to build a page not seen yet
+    def build() -> Optional[InlineKeyboardMarkup]:
+        if not entries:
+            return None
+        total_pages = (len(entries) + PAGE_SIZE - 1) // PAGE_SIZE
+        if not 0 <= page < total_pages:
+            return None
+        is_playlist = playlist is not None or search_sessions.playlist(session_id) is not None
+        return build_keyboard(session_id, page, total_pages, entries, playlist=is_playlist)
+
+    return search_sessions.page(session_id, page, build, playlist=playlist)
+
+
+async def _session_results(session_id: str) -> Tuple[Optional[str], Optional[List[Track]]]:
+    # the panel id is the search_cache key itself
+    return await _cache_get(session_id) or (None, None)
+
+
+async def _index_tracks(entries: List[Track]) -> None:
+    if track_index is None or not entries:
+        return
+    try:
+        await asyncio.get_running_loop().run_in_executor(db_executor, track_index.add, entries)
+    except Exception as e:
+        logger.warning("Failed to index tracks: %s", e)
+
+
+async def _search_local(query: str, limit: int) -> List[Track]:
+    if track_index is None:
+        return []
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, music_downloader.search_combined, query, SEARCH_SOURCES, MAX_RESULTS_TOTAL)
+    with metrics.STAGE_SECONDS.time(stage="index"):
+        try:
+            return await loop.run_in_executor(db_executor, track_index.search, query, limit)
+        except Exception as e:
+            logger.warning("Local index search failed: %s", e)
+            return []
 
 
-async def _run_fetch_info(url: str):
+async def _run_search(query: str):
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, music_downloader.fetch_info, url)
+    with metrics.STAGE_SECONDS.time(stage="search"):
+        entries = await loop.run_in_executor(
+            None,
+            functools.partial(
+                music_downloader.search_combined,
+                query,
+                SEARCH_SOURCES,
+                MAX_RESULTS_TOTAL,
+                source_timeout=SEARCH_SOURCE_TIMEOUT,
+                total_timeout=SEARCH_TOTAL_TIMEOUT,
+                source_timeouts=SEARCH_SOURCE_TIMEOUTS,
+                health=source_health,
+            ),
+        )
+    await _index_tracks(entries)
+    return entries
 
 
-async def _run_download(url: str, out_dir: str):
+async def _run_fetch_playlist(url: str):
     loop = asyncio.get_running_loop()
-    return await loop.run_in_executor(None, music_downloader.download_to_mp3, url, out_dir)
+    with metrics.STAGE_SECONDS.time(stage="info"):
+        title, entries = await loop.run_in_executor(None, music_downloader.fetch_playlist, url, PLAYLIST_MAX_TRACKS)
+    await _index_tracks(entries)
+    return title, entries
+
+
+async def _send_from_store(context: ContextTypes.DEFAULT_TYPE, chat_id: int, entry: Track) -> bool:
+    """
+    Пытается отправить трек без загрузки: по сохранённому file_id или из архива на диске.
+    Возвращает True, если трек отправлен.
+    """
+    tkey = track_key(entry)
+    if not tkey:
+        return False
+    title = (entry.title or "Track")[:64]
+    performer = entry.uploader or None
+    file_id = await _store_call(track_store.get_file_id, *tkey)
+    if file_id:
+        try:
+            await context.bot.send_audio(chat_id=chat_id, audio=file_id, title=title, performer=performer)
+            return True
+        except Exception as e:
+            logger.warning("Cached file_id for %s rejected: %s", tkey, e)
+            await _store_call(track_store.forget_file_id, *tkey)
+    stored_path = await _store_call(track_store.get_file, *tkey)
+    if stored_path:
+        with open(stored_path, "rb") as audio_file:
+            msg = await context.bot.send_audio(chat_id=chat_id, audio=audio_file, title=title, performer=performer)
+        if msg.audio:
+            await _store_call(track_store.set_file_id, *tkey, msg.audio.file_id)
+        return True
+    return False
+
+
+async def _remember_delivery(entry: Track, audio_path: str, msg) -> None:
+    tkey = track_key(entry)
+    if not tkey:
+        return
+    if msg is not None and msg.audio:
+        await _store_call(track_store.set_file_id, *tkey, msg.audio.file_id)
+    try:
+        await _store_call(track_store.put_file, *tkey, audio_path)
+    except OSError as e:
+        logger.warning("Failed to store audio for %s: %s", tkey, e)
+
+
+async def _download_shared(
+    context: ContextTypes.DEFAULT_TYPE,
+    url: str,
+    out_dir: Path,
+    status: Optional[StatusMessage],
+    duration: Optional[float] = None,
+    report_errors: bool = True,
+) -> List[str]:
+    """
+    Одна загрузка на всех, кто ждёт тот же url; возвращает аудиофайл(ы) — несколько, если трек разрезан.
+    Прогресс пишется в статус чата, начавшего загрузку (у предзагрузки его нет).
+    Об ошибке админ узнаёт здесь один раз, каждый ожидающий сообщает своему чату сам.
+    """
+    if out_dir.exists():
+        # other chats are still uploading a finished download from this dir — reuse it
+        finished = _finished_files(out_dir)
+        if finished and _download_refs.get(out_dir.name, 0) > 1:
+            return finished
+        shutil.rmtree(out_dir, ignore_errors=True)
+    if not workspace.has_room():
+        # prefetched files are the first to go; then wait for running downloads to finish
+        for key in prefetch_holds.evict_ready():
+            _release_download_dir(key)
+        if status is not None:
+            status.update("Жду свободного места для загрузки...")
+        if not await workspace.wait_for_room(TEMP_SPACE_WAIT if report_errors else 0):
+            raise WorkspaceFull()
+    out_dir.mkdir(parents=True, exist_ok=True)
+    staging_dir = workspace.staging_dir(out_dir.name)
+
+    def progress(stage: str, fraction: Optional[float], speed: Optional[float]) -> None:
+        status.update_threadsafe(render_progress(stage, fraction, speed))
+
+    try:
+        return await download_pipeline.download(
+            url,
+            str(out_dir),
+            progress=progress if status is not None else None,
+            duration=duration,
+            staging_dir=str(staging_dir) if staging_dir else None,
+            # the queue bounds fetching only: transcode and upload are limited by their pipeline stages
+            on_fetched=download_scheduler.release_slot,
+        )
+    except DeliveryRejected:
+        # the track itself is too long for Telegram, nothing for the admin to fix
+        raise
+    except Exception as e:
+        if not report_errors:
+            raise
+        logger.exception("Download exception: %s", e)
+        # notify admin about repeated errors if needed
+        try:
+            await send_admin_message(context, f"Ошибка скачивания {url}: {e}")
+        except Exception:
+            pass
+        raise
+
+
+def _finished_files(out_dir: Path) -> List[str]:
+    if not out_dir.is_dir():
+        return []
+    return [str(p) for p in sorted(out_dir.iterdir()) if p.suffix.lower() in music_downloader.NATIVE_AUDIO_EXTS]
+
+
+def _release_download_dir(dl_key: str) -> None:
+    # the last holder of a shared download dir removes it
+    _download_refs[dl_key] -= 1
+    if _download_refs[dl_key] <= 0:
+        del _download_refs[dl_key]
+        _upload_locks.pop(dl_key, None)
+        workspace.remove(dl_key)
+
+
+async def _prefetch(context: ContextTypes.DEFAULT_TYPE, group, entries: List[Track]) -> None:
+    """
+    Пока очередь загрузок простаивает, по одному скачивает первые результаты нового поиска,
+    чтобы нажатие play: только отправляло файл. Файлы держатся до закрытия панели,
+    истечения кэша поиска или превышения лимита места.
+    """
+    for entry in entries[:PREFETCH_TOP_K]:
+        if not download_scheduler.idle or not prefetch_holds.can_start() or not workspace.has_room():
+            return
+        url = entry.download_url
+        tkey = track_key(entry)
+        if not url or (tkey and await _store_call(track_store.get_file_id, *tkey)):
+            continue
+        try:
+            download_pipeline.plan(entry.duration)
+        except DeliveryRejected:
+            continue
+        dl_key = _cache_key_for_query(url)
+        flight_key = ("download", dl_key)
+        if dl_key in _download_refs or _inflight.in_flight(flight_key) or not prefetch_holds.hold(dl_key, group):
+            continue
+        _download_refs[dl_key] = _download_refs.get(dl_key, 0) + 1
+        paths: List[str] = []
+        try:
+            paths = await _inflight.run(
+                flight_key,
+                functools.partial(
+                    download_scheduler.submit,
+                    PREFETCH_USER,
+                    PREFETCH_USER,
+                    functools.partial(
+                        _download_shared, context, url, workspace.job_dir(dl_key), None, entry.duration, report_errors=False
+                    ),
+                    priority=PREFETCH_PRIORITY,
+                    key=dl_key,
+                    group=group,
+                ),
+            )
+        except (QueueFull, JobCancelled, WorkspaceFull, DeliveryRejected):
+            pass
+        except Exception as e:
+            logger.info("Prefetch of %s failed: %s", url, e)
+        size = sum(os.path.getsize(p) for p in paths if os.path.exists(p)) if paths else None
+        if not prefetch_holds.finish(dl_key, size):
+            _release_download_dir(dl_key)
+        for key in prefetch_holds.over_budget():
+            _release_download_dir(key)
+
+
+def _start_prefetch(context: ContextTypes.DEFAULT_TYPE, message, entries: List[Track]) -> None:
+    if PREFETCH_TOP_K > 0 and entries:
+        context.application.create_task(_prefetch(context, (message.chat_id, message.message_id), entries))
+
+
+async def _upload_audio(context: ContextTypes.DEFAULT_TYPE, chat_id: int, path: str, title: str, performer):
+    with open(path, "rb") as audio_file:
+        return await context.bot.send_audio(chat_id=chat_id, audio=audio_file, title=title, performer=performer)
+
+
+async def _upload_parts(context: ContextTypes.DEFAULT_TYPE, chat_id: int, paths: List[str], title: str, performer):
+    """Отправляет трек; разрезанный — по частям как "Название (1/3)". Возвращает сообщение последней части."""
+    sent = None
+    for i, path in enumerate(paths, 1):
+        if UPLOAD_LIMIT_BYTES and os.path.getsize(path) > UPLOAD_LIMIT_BYTES:
+            raise DeliveryRejected(f"файл больше {UPLOAD_LIMIT_BYTES // (1024 * 1024)} МБ")
+        part_title = title if len(paths) == 1 else f"{title[:56]} ({i}/{len(paths)})"
+        sent = await download_pipeline.upload.run_async(
+            functools.partial(_upload_audio, context, chat_id, path, part_title[:64], performer)
+        )
+    return sent
+
+
+@contextlib.asynccontextmanager
+async def _track_download(
+    context: ContextTypes.DEFAULT_TYPE,
+    entry: Track,
+    user_id: int,
+    chat_id: int,
+    group,
+    status: Optional[StatusMessage],
+    priority: int = 0,
+    on_position=None,
+):
+    """
+    Скачивает entry через очередь загрузок (или присоединяется к уже идущей загрузке того же url)
+    и отдаёт (dl_key, пути к аудио); готовая предзагрузка отдаётся сразу, без очереди.
+    Общий временный каталог держится до выхода из блока.
+    """
+    url = entry.download_url
+    # one temp dir per track, shared by every chat waiting for the same download
+    dl_key = _cache_key_for_query(url)
+    flight_key = ("download", dl_key)
+    if _inflight.in_flight(flight_key):
+        download_scheduler.attach(dl_key, group)
+        # a queued prefetch (or batch track) moves up once somebody actually asks for it
+        download_scheduler.promote(dl_key, priority)
+        if status is not None:
+            status.update(render_progress("fetch"))
+    prefetch_holds.mark_used(dl_key)
+    _download_refs[dl_key] = _download_refs.get(dl_key, 0) + 1
+    try:
+        # a finished prefetch is sent straight away instead of waiting for a queue slot
+        audio_paths = _finished_files(workspace.job_dir(dl_key)) if prefetch_holds.ready(dl_key) else []
+        if audio_paths:
+            yield dl_key, audio_paths
+            return
+        audio_paths = await _inflight.run(
+            flight_key,
+            functools.partial(
+                download_scheduler.submit,
+                user_id,
+                chat_id,
+                functools.partial(_download_shared, context, url, workspace.job_dir(dl_key), status, entry.duration),
+                priority=priority,
+                key=dl_key,
+                group=group,
+                on_position=on_position,
+            ),
+        )
+        yield dl_key, audio_paths
+    finally:
+        _release_download_dir(dl_key)
+
+
+async def _upload_track(
+    context: ContextTypes.DEFAULT_TYPE,
+    chat_id: int,
+    entry: Track,
+    dl_key: str,
+    audio_paths: List[str],
+    status: Optional[StatusMessage] = None,
+) -> None:
+    # uploads of one track are serialized so later waiters reuse the first file_id
+    async with _upload_locks.setdefault(dl_key, asyncio.Lock()):
+        try:
+            if await _send_from_store(context, chat_id, entry):
+                return
+        except Exception as e:
+            logger.exception("Failed to send stored track: %s", e)
+
+        # send audio as separate message (keeps original keyboard)
+        if status is not None:
+            status.update(render_progress("upload"))
+        sent = await _upload_parts(context, chat_id, audio_paths, entry.title or "Track", entry.uploader or None)
+        # file_id and the archive hold whole tracks only
+        if len(audio_paths) == 1:
+            await _remember_delivery(entry, audio_paths[0], sent)
+
+
+async def _batch_track(context: ContextTypes.DEFAULT_TYPE, message, user_id: int, group, entry: Track) -> Optional[str]:
+    """Отправляет один трек плейлиста; возвращает None при успехе или короткую причину для итога."""
+    try:
+        if await _send_from_store(context, message.chat_id, entry):
+            return None
+    except Exception as e:
+        logger.exception("Failed to send stored track: %s", e)
+    if not entry.download_url:
+        return "нет ссылки"
+    try:
+        download_pipeline.plan(entry.duration)
+        async with _track_download(
+            context, entry, user_id, message.chat_id, group, None, priority=BATCH_PRIORITY
+        ) as (dl_key, audio_paths):
+            if not audio_paths:
+                return "недоступен"
+            await _upload_track(context, message.chat_id, entry, dl_key, audio_paths)
+    except DeliveryRejected:
+        return "слишком длинный"
+    except (QueueFull, WorkspaceFull):
+        return "очередь занята"
+    except Exception as e:
+        logger.warning("Batch track %s failed: %s", entry.download_url, e)
+        return "ошибка"
+    return None
+
+
+async def _run_batch(
+    context: ContextTypes.DEFAULT_TYPE,
+    message,
+    user_id: int,
+    session_id: str,
+    entries: List[Track],
+    progress: BatchProgress,
+    indices: List[int],
+) -> None:
+    """
+    Качает ещё не отправленные треки плейлиста по BATCH_CONCURRENCY за раз через общую очередь
+    (лимиты пользователя и стадии конвейера действуют) и отправляет каждый, как только он готов.
+    Один статус показывает общий прогресс и остаётся с итогом и кнопкой дозагрузки неудавшихся.
+    """
+    pending = iter(indices)
+    group = ("batch", message.chat_id, session_id)
+    status = StatusMessage(message, interval=PROGRESS_EDIT_INTERVAL)
+    status.update(progress.render())
+
+    async def worker() -> None:
+        for idx in pending:
+            if progress.cancelled:
+                return
+            progress.begin(idx)
+            status.update(progress.render())
+            try:
+                reason = await _batch_track(context, message, user_id, group, entries[idx])
+            except JobCancelled:
+                progress.fail(idx, "отменён")
+                return
+            if reason is None:
+                progress.done(idx)
+            else:
+                progress.fail(idx, reason)
+            status.update(progress.render())
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(max(1, BATCH_CONCURRENCY))))
+    finally:
+        progress.finish()
+        keyboard = None
+        if progress.remaining and not progress.cancelled:
+            keyboard = InlineKeyboardMarkup(
+                [[InlineKeyboardButton(f"🔁 Докачать ({progress.remaining})", callback_data=f"batch:{session_id}")]]
+            )
+        text = progress.render()
+        if progress.failed:
+            text += "\n" + "\n".join(
+                f"{idx + 1}. {sanitize_title(entries[idx].title or 'Unknown')} — {reason}"
+                for idx, reason in sorted(progress.failed.items())[:PAGE_SIZE]
+            )
+        await status.close(text, reply_markup=keyboard)
 
 
 async def send_admin_message(context: ContextTypes.DEFAULT_TYPE, text: str) -> None:
@@ -104,10 +725,15 @@ async def send_admin_message(context: ContextTypes.DEFAULT_TYPE, text: str) -> N
 
 
 # Handlers
+# what a click delivers: passthrough sends the source's m4a/mp3 as is (anything else is transcoded to AUDIO_CODEC)
+_DELIVERED_FORMAT = "аудио (m4a или mp3)" if AUDIO_DELIVERY_MODE == "passthrough" else AUDIO_CODEC.upper()
+
+
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(
         "Привет! Отправь название песни или ссылку на трек, либо используй команду /search <запрос>.\n"
-        "Я покажу результаты постранично (по 10). Нажми кнопку — я скачаю MP3 и пришлю. Панель останется доступной."
+        f"Я покажу результаты постранично (по {PAGE_SIZE}). Нажми кнопку — я скачаю {_DELIVERED_FORMAT} и пришлю. "
+        "Панель останется доступной."
     )
 
 
@@ -117,7 +743,36 @@ async def search_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text("Укажите запрос, например: /search Billie Jean")
         return
-    await do_search_and_send(update, query)
+    await do_search_and_send(update, context, query)
+
+
+def _format_source_health() -> str:
+    snapshot = source_health.snapshot()
+    if not snapshot:
+        return "Статистики по источникам пока нет."
+    lines = []
+    # in the order the next search will use
+    for prefix in source_health.rank(list(snapshot)):
+        h = snapshot[prefix]
+        p50 = f"{h['p50']:.2f}s" if h["p50"] is not None else "—"
+        p90 = f"{h['p90']:.2f}s" if h["p90"] is not None else "—"
+        line = (
+            f"{prefix}: {h['state']}, n={h['samples']}, p50 {p50}, p90 {p90}, "
+            f"ошибки {h['error_rate']:.0%}, пусто {h['empty_rate']:.0%}, "
+            f"в среднем {h['avg_results']:.1f} рез., пропущен {h['skipped']}"
+        )
+        if h["state"] == "open":
+            line += f", повтор через {h['retry_in']:.0f}s"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def sources_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # admin-only: health of search sources
+    user = update.effective_user
+    if not ADMIN_ID or user is None or user.id != ADMIN_ID:
+        return
+    await update.message.reply_text(_format_source_health())
 
 
 async def text_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -129,71 +784,146 @@ async def text_message_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         url = m.group(0)
         await do_fetch_and_send(update, url)
         return
-    await do_search_and_send(update, text)
+    await do_search_and_send(update, context, text)
 
 
 async def do_fetch_and_send(update: Update, url: str):
-    key = _cache_key_for_query(url)
-    cached = search_cache.get(key)
+    key = _search_key(url)
+    cached = await _cache_get(key)
     if cached:
-        entries = cached
+        title, entries = cached
     else:
         info_msg = await update.message.reply_text("Извлекаю информацию о ссылке...")
         try:
-            info = await _run_fetch_info(url)
+            title, entries = await _inflight.run(("info", key), functools.partial(_run_fetch_playlist, url))
         finally:
             try:
                 await info_msg.delete()
             except Exception:
                 pass
-        if not info:
+        if not entries:
             await update.message.reply_text("Не удалось извлечь информацию по ссылке.")
             return
-        entries = [info]
-        search_cache.set(key, entries)
+        await _cache_set(key, entries, title)
+
+    if title is not None or len(entries) > 1:
+        # a playlist or an album: list its tracks with a "download all" button
+        text, keyboard = _render_results(url, key, entries, fresh=not cached, playlist=title or "Плейлист")
+        await update.message.reply_text(text, reply_markup=keyboard, parse_mode="HTML")
+        return
 
-    total_pages = (len(entries) + PAGE_SIZE - 1) // PAGE_SIZE
-    page = 0
-    keyboard = build_keyboard(key, page, total_pages, entries)
+    keyboard = _keyboard_page(search_sessions.open(key, fresh=not cached), 0, entries)
     e = entries[0]
-    dur = e.get("duration")
-    dur_str = f" [{format_duration(dur)}]" if dur else ""
-    text = f"Найден трек: {html.escape(e.get('title') or 'Unknown')}{dur_str}"
+    dur_str = f" [{format_duration(e.duration)}]" if e.duration else ""
+    text = f"Найден трек: {html.escape(e.title or 'Unknown')}{dur_str}"
     await update.message.reply_text(text, reply_markup=keyboard, parse_mode="HTML")
 
 
-async def do_search_and_send(update: Update, query: str):
-    key = _cache_key_for_query(query)
-    cached = search_cache.get(key)
-    if cached:
-        entries = cached
+def _render_results(
+    query: str, key: str, entries: List[Track], note: str = "", fresh: bool = False, playlist: Optional[str] = None
+) -> Tuple[str, InlineKeyboardMarkup]:
+    # fresh: the entries were just stored under key, pages rendered for older results are stale
+    keyboard = _keyboard_page(search_sessions.open(key, fresh=fresh, playlist=playlist), 0, entries)
+    first_chunk = entries[0: min(PAGE_SIZE, len(entries))]
+    if playlist is not None:
+        text_lines = [f"Плейлист: {html.escape(playlist)} (треков: {len(entries)}){note}"]
     else:
+        text_lines = [f"Результаты поиска: {html.escape(query)} (всего: {len(entries)}){note}"]
+    for i, e in enumerate(first_chunk, start=1):
+        dur_str = f" [{format_duration(e.duration)}]" if e.duration else ""
+        t = sanitize_title(e.title or "Unknown")
+        text_lines.append(f"{i}. {t}{dur_str}")
+    return "\n".join(text_lines), keyboard
+
+
+async def _refresh_results(
+    context: ContextTypes.DEFAULT_TYPE, message, query: str, key: str, local: List[Track], local_key: str
+) -> None:
+    # replace the panel answered from the local index with fresh multi-source results
+    entries: List[Track] = []
+    try:
+        entries = await _inflight.run(("search", key), functools.partial(_run_search, query))
+    except Exception as e:
+        logger.warning("Background search for %r failed: %s", query, e)
+    if entries:
+        await _cache_set(key, entries)
+        text, keyboard = _render_results(query, key, entries, fresh=True)
+    else:
+        # nothing fresh: keep the local answer, just drop the "updating" note
+        text, keyboard = _render_results(query, local_key, local)
+    try:
+        await message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except Exception as e:
+        logger.debug("Failed to refresh results panel: %s", e)
+        return
+    if entries:
+        _start_prefetch(context, message, entries)
+
+
+async def do_search_and_send(update: Update, context: ContextTypes.DEFAULT_TYPE, query: str):
+    key = _search_key(query)
+    cached = await _cache_get(key)
+    if cached and cached[1]:
+        _, entries = cached
+    else:
+        cached = None
+        local = await _search_local(query, MAX_RESULTS_TOTAL)
+        if len(local) >= TRACK_INDEX_MIN_HITS:
+            # answer from the index now; its panel keeps its own cache key so buttons pressed
+            # before the refresh still point at the tracks they were shown with
+            local_key = _search_key("local:" + query)
+            await _cache_set(local_key, local)
+            text, keyboard = _render_results(query, local_key, local, note=" — обновляю...", fresh=True)
+            message = await update.message.reply_text(text, reply_markup=keyboard, parse_mode="HTML")
+            context.application.create_task(_refresh_results(context, message, query, key, local, local_key))
+            return
         searching_msg = await update.message.reply_text(f"Ищу: {html.escape(query)} ...")
         try:
-            entries = await _run_search(query)
+            entries = await _inflight.run(("search", key), functools.partial(_run_search, query))
         finally:
             try:
                 await searching_msg.delete()
             except Exception:
                 pass
-        search_cache.set(key, entries)
+        await _cache_set(key, entries)
 
     if not entries:
         await update.message.reply_text("❌ Ничего не найдено. Попробуйте изменить запрос.")
         return
 
-    total_pages = (len(entries) + PAGE_SIZE - 1) // PAGE_SIZE
-    page = 0
-    keyboard = build_keyboard(key, page, total_pages, entries)
-    first_chunk = entries[0: min(PAGE_SIZE, len(entries))]
-    text_lines = [f"Результаты поиска: {html.escape(query)} (всего: {len(entries)})"]
-    for i, e in enumerate(first_chunk, start=1):
-        dur = e.get("duration")
-        dur_str = f" [{format_duration(dur)}]" if dur else ""
-        t = sanitize_title(e.get("title") or "Unknown")
-        text_lines.append(f"{i}. {t}{dur_str}")
-    text = "\n".join(text_lines)
-    await update.message.reply_text(text, reply_markup=keyboard, parse_mode="HTML")
+    text, keyboard = _render_results(query, key, entries, fresh=not cached)
+    message = await update.message.reply_text(text, reply_markup=keyboard, parse_mode="HTML")
+    if not cached:
+        _start_prefetch(context, message, entries)
+
+
+async def inline_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # inline mode answers only from the local index and the track store: no yt-dlp on this path
+    inline_query = update.inline_query
+    text = (inline_query.query or "").strip()
+    tracks = await _search_local(text, INLINE_RESULTS) if len(text) >= 2 else []
+    # one trip to the store for the whole answer
+    file_ids = await _store_call(lambda: [track_store.get_file_id(*track_key(t)) for t in tracks])
+    results = []
+    for t, file_id in zip(tracks, file_ids):
+        tkey = track_key(t)
+        result_id = hashlib.sha1(":".join(tkey).encode("utf-8")).hexdigest()
+        if file_id:
+            results.append(InlineQueryResultCachedAudio(id=result_id, audio_file_id=file_id))
+        elif t.download_url:
+            dur_str = f" [{format_duration(t.duration)}]" if t.duration else ""
+            results.append(
+                InlineQueryResultArticle(
+                    id=result_id,
+                    title=t.title or "Unknown",
+                    description=f"{t.uploader or ''}{dur_str}".strip(),
+                    input_message_content=InputTextMessageContent(t.download_url),
+                )
+            )
+    try:
+        await inline_query.answer(results, cache_time=60)
+    except Exception as e:
+        logger.debug("Failed to answer inline query: %s", e)
 
 
 async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -203,14 +933,16 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
 
     try:
         if data.startswith("page:"):
-            _, cache_key, page_s = data.split(":", 2)
+            _, session_id, page_s = data.split(":", 2)
             page = int(page_s)
-            entries = search_cache.get(cache_key)
-            if not entries:
+            # the results are loaded from the cache only if this page has not been built yet
+            playlist, entries = None, None
+            if not search_sessions.has_page(session_id, page):
+                playlist, entries = await _session_results(session_id)
+            keyboard = _keyboard_page(session_id, page, entries, playlist)
+            if keyboard is None:
                 await query.message.reply_text("Кэш просрочен. Повторите поиск.")
                 return
-            total_pages = (len(entries) + PAGE_SIZE - 1) // PAGE_SIZE
-            keyboard = build_keyboard(cache_key, page, total_pages, entries)
             try:
                 await query.message.edit_reply_markup(reply_markup=keyboard)
             except Exception:
@@ -219,9 +951,9 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
             return
 
         if data.startswith("play:"):
-            _, cache_key, idx_s = data.split(":", 2)
+            _, session_id, idx_s = data.split(":", 2)
             idx = int(idx_s)
-            entries = search_cache.get(cache_key)
+            _, entries = await _session_results(session_id)
             if not entries:
                 await query.message.reply_text("Кэш просрочен. Повторите поиск.")
                 return
@@ -230,80 +962,112 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
                 return
             entry = entries[idx]
 
+            # already delivered before — reuse Telegram file_id / stored file
+            try:
+                if await _send_from_store(context, query.message.chat_id, entry):
+                    return
+            except Exception as e:
+                logger.exception("Failed to send stored track: %s", e)
+
             # notify user that download will start
             await query.answer(text="Начинаю загрузку, подожди...")
 
-            # prepare temp dir
-            os.makedirs(TEMP_DIR, exist_ok=True)
-            out_dir = Path(TEMP_DIR) / f"{cache_key}_{idx}"
-            if out_dir.exists():
-                shutil.rmtree(out_dir, ignore_errors=True)
-            out_dir.mkdir(parents=True, exist_ok=True)
-
             # determine url for download
-            url = entry.get("webpage_url") or entry.get("_raw", {}).get("url") or entry.get("id")
-            if not url:
+            if not entry.download_url:
                 await query.message.reply_text("Не удалось определить URL для скачивания.")
-                try:
-                    shutil.rmtree(out_dir, ignore_errors=True)
-                except Exception:
-                    pass
                 return
 
-            # limit concurrent downloads
-            async with _download_semaphore:
-                mp3_path: Optional[str] = None
-                try:
-                    mp3_path = await _run_download(url, str(out_dir))
-                except Exception as e:
-                    logger.exception("Download exception: %s", e)
-                    await query.message.reply_text("Ошибка при скачивании трека.")
-                    # notify admin about repeated errors if needed
-                    try:
-                        await send_admin_message(context, f"Ошибка скачивания {url}: {e}")
-                    except Exception:
-                        pass
-                if not mp3_path:
-                    await query.message.reply_text("Ошибка при скачивании трека или трек недоступен.")
-                    try:
-                        shutil.rmtree(out_dir, ignore_errors=True)
-                    except Exception:
-                        pass
-                    return
+            # reject tracks that cannot fit the upload limit before they take a queue slot
+            try:
+                download_pipeline.plan(entry.duration)
+            except DeliveryRejected as e:
+                await query.message.reply_text(f"Трек слишком длинный для отправки: {e}.")
+                return
 
-                # send audio as separate message (keeps original keyboard)
-                title = entry.get("title") or "Track"
-                performer = entry.get("uploader") or None
-                try:
-                    with open(mp3_path, "rb") as audio_file:
-                        await context.bot.send_audio(
-                            chat_id=query.message.chat_id,
-                            audio=audio_file,
-                            title=title[:64],
-                            performer=performer,
-                        )
-                except Exception as e:
-                    logger.exception("Failed to send audio: %s", e)
-                    await query.message.reply_text("Ошибка при отправке аудио: " + str(e))
-                    try:
-                        await send_admin_message(context, f"Ошибка отправки аудио: {e}")
-                    except Exception:
-                        pass
-                finally:
+            # jobs are cancelled by closing their panel; a shared job only when all its panels are closed
+            group = (query.message.chat_id, query.message.message_id)
+            status = StatusMessage(query.message, interval=PROGRESS_EDIT_INTERVAL)
+
+            async def on_position(position: int) -> None:
+                if position > 0:
+                    status.update(f"В очереди на загрузку: {position}")
+
+            try:
+                async with _track_download(
+                    context, entry, query.from_user.id, query.message.chat_id, group, status, on_position=on_position
+                ) as (dl_key, audio_paths):
+                    if not audio_paths:
+                        await query.message.reply_text("Ошибка при скачивании трека или трек недоступен.")
+                        return
                     try:
-                        shutil.rmtree(out_dir, ignore_errors=True)
-                    except Exception:
-                        pass
+                        await _upload_track(context, query.message.chat_id, entry, dl_key, audio_paths, status)
+                    except DeliveryRejected as e:
+                        await query.message.reply_text(f"Трек слишком большой для отправки: {e}.")
+                    except Exception as e:
+                        logger.exception("Failed to send audio: %s", e)
+                        await query.message.reply_text("Ошибка при отправке аудио: " + str(e))
+                        try:
+                            await send_admin_message(context, f"Ошибка отправки аудио: {e}")
+                        except Exception:
+                            pass
+            except QueueFull:
+                await query.message.reply_text("Очередь загрузок переполнена, попробуйте чуть позже.")
+            except JobCancelled:
+                pass
+            except WorkspaceFull:
+                await query.message.reply_text("Сейчас не хватает места для загрузки, попробуйте чуть позже.")
+            except DeliveryRejected as e:
+                await query.message.reply_text(f"Трек слишком длинный для отправки: {e}.")
+            except Exception:
+                await query.message.reply_text("Ошибка при скачивании трека.")
+            finally:
+                await status.close()
+            return
+
+        if data.startswith("batch:"):
+            _, session_id = data.split(":", 1)
+            playlist, entries = await _session_results(session_id)
+            if not entries:
+                await query.message.reply_text("Кэш просрочен. Повторите поиск.")
+                return
+            batch_key = (query.message.chat_id, session_id)
+            progress = _batches.get(batch_key)
+            if progress is not None and progress.running:
+                return
+            if progress is None or progress.total != len(entries):
+                progress = BatchProgress(playlist or search_sessions.playlist(session_id) or "Плейлист", len(entries))
+                _batches[batch_key] = progress
+            if not progress.remaining:
+                await query.message.reply_text(f"{progress.render()} — все треки уже отправлены.")
+                return
+            # started here, not in the task: a second press must already see it running
+            indices = progress.start()
+            context.application.create_task(
+                _run_batch(context, query.message, query.from_user.id, session_id, entries, progress, indices)
+            )
             return
 
         if data.startswith("close:"):
-            _, cache_key = data.split(":", 1)
+            _, session_id = data.split(":", 1)
+            # drop this panel's downloads that are still waiting in the queue and its prefetched files
+            group = (query.message.chat_id, query.message.message_id)
+            download_scheduler.cancel_group(group)
+            # and stop its playlist download: tracks already being downloaded are still sent
+            progress = _batches.get((query.message.chat_id, session_id))
+            if progress is not None and progress.running:
+                progress.cancelled = True
+                download_scheduler.cancel_group(("batch", query.message.chat_id, session_id))
+            for dl_key in prefetch_holds.release_group(group):
+                _release_download_dir(dl_key)
             try:
                 await query.message.edit_reply_markup(reply_markup=None)
             except Exception:
                 pass
             return
 
+    except RetryAfter as e:
+        # flood control outlasted the rate limiter's retries: replying would only hit it again
+        logger.warning("Callback dropped by flood control: %s", e)
     except Exception as e:
         logger.exception("Error handling callback: %s", e)
         await query.message.reply_text("Внутренняя ошибка при обработке запроса.")
@@ -313,8 +1077,233 @@ async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_T
             pass
 
 
+def _register_metrics() -> None:
+    # values read at scrape time from the components that already keep their own counters;
+    # on_loop ones read state only the event loop mutates, so the exporter thread serves the
+    # snapshot _metrics_refresher takes on the loop instead of iterating those dicts itself
+    reg = metrics.REGISTRY
+    reg.gauge_callback(
+        "bot_download_queue_jobs",
+        "Download scheduler jobs by state",
+        lambda: {metrics.labels(state=k): v for k, v in download_scheduler.stats().items() if k in ("queued", "running")},
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_download_jobs_total",
+        "Download jobs rejected (queue full) or cancelled before start",
+        lambda: {metrics.labels(outcome=k): v for k, v in download_scheduler.stats().items() if k in ("rejected", "cancelled")},
+        kind="counter",
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_inflight_operations", "Coalesced searches/info fetches/downloads in flight", lambda: len(_inflight), on_loop=True
+    )
+    reg.gauge_callback("bot_temp_dir_bytes", "Bytes currently stored in TEMP_DIR", workspace.usage)
+    reg.gauge_callback("bot_temp_staging_bytes", "Bytes currently stored in the RAM staging dir", workspace.staging_usage)
+    reg.gauge_callback(
+        "bot_pipeline_stage_jobs",
+        "Pipeline stage jobs by state",
+        lambda: {
+            metrics.labels(stage=name, state=state): value
+            for name, stage in download_pipeline.stats().items()
+            if name != "delivery"
+            for state, value in stage.items()
+            if state in ("waiting", "active")
+        },
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_delivery_total",
+        "Prepared audio files by delivery mode (passthrough/remux/transcode)",
+        lambda: {metrics.labels(mode=k): v for k, v in download_pipeline.stats()["delivery"].items()},
+        kind="counter",
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_search_cache_events_total",
+        "Search cache hits/misses/evictions/expirations",
+        lambda: {
+            metrics.labels(event=k): v
+            for k, v in search_cache.stats().items()
+            if k in ("hits", "misses", "evictions", "expirations")
+        },
+        kind="counter",
+    )
+    reg.gauge_callback(
+        "bot_prefetch",
+        "Speculative downloads: running, ready files, bytes held, started and clicked totals",
+        lambda: {metrics.labels(state=k): v for k, v in prefetch_holds.stats().items()},
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_search_source_open",
+        "1 if the search source is disabled by its circuit breaker (open or half-open)",
+        lambda: {
+            metrics.labels(source=prefix): int(h["state"] != "closed")
+            for prefix, h in source_health.snapshot().items()
+        },
+    )
+    reg.gauge_callback(
+        "bot_telegram_requests_total",
+        "Outgoing Bot API calls: sent, throttled by rate limits, merged edits, retried after 429, failed",
+        lambda: {metrics.labels(outcome=k): v for k, v in telegram_limiter.counters.items()},
+        kind="counter",
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_telegram_queue",
+        "Outgoing Bot API calls waiting for a rate limit token",
+        lambda: telegram_limiter.queued,
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_search_sessions",
+        "Result sets addressable from keyboards and their cached keyboard pages",
+        lambda: {metrics.labels(unit=k): v for k, v in search_sessions.stats().items() if k in ("sessions", "pages")},
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_startup_seconds",
+        "Seconds since main.py started loading to each startup phase (imports, warmup, first_response ...)",
+        lambda: {metrics.labels(phase=k): v for k, v in health.phases.items()},
+        on_loop=True,
+    )
+    reg.gauge_callback(
+        "bot_ready", "1 once warm-up is done and required checks (ffmpeg) passed", lambda: int(health.ready), on_loop=True
+    )
+    reg.gauge_callback(
+        "bot_search_cache_size",
+        "Search cache size (entries and approximate bytes)",
+        lambda: {metrics.labels(unit=k): v for k, v in search_cache.stats().items() if k in ("entries", "bytes")},
+    )
+
+
+async def _metrics_refresher() -> None:
+    # snapshots loop-owned metric values on the loop itself (see _register_metrics)
+    while True:
+        metrics.REGISTRY.refresh()
+        await asyncio.sleep(METRICS_REFRESH_INTERVAL)
+
+
+async def _cache_sweeper() -> None:
+    # periodically drop expired search results so memory stays flat between lookups
+    while True:
+        await asyncio.sleep(CACHE_SWEEP_INTERVAL)
+        try:
+            removed = await asyncio.get_running_loop().run_in_executor(db_executor, search_cache.sweep)
+            if removed:
+                logger.debug("Search cache sweep: removed %d, stats %s", removed, search_cache.stats())
+        except Exception:
+            logger.exception("Search cache sweep failed")
+        for dl_key in prefetch_holds.expired():
+            _release_download_dir(dl_key)
+        telegram_limiter.sweep()
+        search_sessions.sweep()
+        for batch_key in [k for k, p in _batches.items() if not p.running and k[1] not in search_sessions]:
+            del _batches[batch_key]
+        try:
+            # dirs no download holds any more (a crashed flight, files copied in by hand ...)
+            removed = await asyncio.get_running_loop().run_in_executor(
+                None, workspace.sweep, set(_download_refs), TEMP_ORPHAN_AGE
+            )
+            removed += await asyncio.get_running_loop().run_in_executor(None, workspace.sweep_stale, TEMP_ORPHAN_AGE)
+            if removed:
+                logger.info("Removed %d orphaned entries from TEMP_DIR", removed)
+        except Exception:
+            logger.exception("TEMP_DIR sweep failed")
+        if track_index is not None:
+            try:
+                await asyncio.get_running_loop().run_in_executor(db_executor, track_index.prune)
+            except Exception:
+                logger.exception("Track index prune failed")
+
+
+async def _warm_up() -> None:
+    """Загружает yt-dlp и extractors поиска, проверяет ffmpeg, пока бот уже отвечает на сообщения."""
+    loop = asyncio.get_running_loop()
+    extractors: Dict[str, Optional[str]] = {}
+    try:
+        extractors = await loop.run_in_executor(None, music_downloader.search_extractors, SEARCH_SOURCES)
+    except Exception:
+        logger.exception("Failed to look up yt-dlp extractors")
+    unknown = [prefix for prefix, ie_key in extractors.items() if ie_key is None]
+    if unknown:
+        logger.warning("yt-dlp has no extractor for search sources %s: they will return nothing", ", ".join(unknown))
+    # pre-create pooled YoutubeDL instances with the search extractors loaded, so the first search doesn't pay for it
+    timeouts = [SEARCH_SOURCE_TIMEOUTS.get(prefix, SEARCH_SOURCE_TIMEOUT) for prefix in SEARCH_SOURCES]
+    ie_keys = tuple(sorted({ie_key for ie_key in extractors.values() if ie_key}))
+    try:
+        await loop.run_in_executor(
+            None,
+            functools.partial(
+                music_downloader.warm_pools, timeouts, AUDIO_DELIVERY_MODE == "passthrough", ie_keys=ie_keys
+            ),
+        )
+    except Exception:
+        logger.exception("Failed to warm up YoutubeDL pools")
+    ffmpeg = await loop.run_in_executor(None, music_downloader.ffmpeg_version)
+    health.check("ffmpeg", ffmpeg is not None, "ffmpeg not found in PATH")
+    health.mark("warmup")
+    if health.ready:
+        logger.info(
+            "Ready in %.2fs (imports %.2fs), %s", health.phases["warmup"], health.phases["imports"], ffmpeg
+        )
+        sd_notify("READY=1")
+    else:
+        # no READY=1: systemd keeps the unit "activating" and restarts it after TimeoutStartSec
+        _, reason = health.readiness()
+        logger.error("Not ready: %s", reason)
+        sd_notify(f"STATUS=Not ready: {reason}")
+
+
+async def _heartbeat() -> None:
+    # proves the event loop is not stuck: feeds /healthz and the systemd watchdog (WatchdogSec=)
+    watchdog = watchdog_interval()
+    interval = min(health.interval, watchdog / 2) if watchdog else health.interval
+    while True:
+        health.beat()
+        if watchdog:
+            sd_notify("WATCHDOG=1")
+        await asyncio.sleep(interval)
+
+
+async def _first_update(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    health.mark("first_update")
+
+
+async def _first_response(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # runs after the regular handlers of the update: the reply has been sent
+    if "first_response" not in health.phases:
+        answered = health.mark("first_response")
+        logger.info(
+            "First update answered %.2fs after start (handled in %.2fs)",
+            answered,
+            answered - health.phases.get("first_update", answered),
+        )
+
+
+async def post_init(app) -> None:
+    health.mark("initialized")
+    # nothing is downloading yet: whatever is left in this process' dir is from a previous run;
+    # other processes sharing TEMP_DIR keep theirs unless they are gone
+    removed = workspace.sweep(()) + workspace.sweep_stale(TEMP_ORPHAN_AGE)
+    if removed:
+        logger.info("Removed %d leftover entries from TEMP_DIR", removed)
+    # background tasks bound to the application's event loop
+    app.create_task(_cache_sweeper())
+    app.create_task(_heartbeat())
+    if METRICS_PORT:
+        app.create_task(_metrics_refresher())
+    # warm-up runs in the background: polling starts right away, /readyz and READY=1 follow when it is done
+    app.create_task(_warm_up())
+
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Centralized error handler for the dispatcher
+    if isinstance(context.error, RetryAfter):
+        # flood control is not a bug: the rate limiter already retried, don't flood the admin as well
+        logger.warning("Update dropped by flood control: %s", context.error)
+        return
     logger.exception("Update caused error: %s", context.error)
     # attempt to notify admin
     try:
@@ -323,15 +1312,41 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> N
         logger.exception("Failed sending admin notification")
 
 
-def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
-
+def register_handlers(app) -> None:
     app.add_handler(CommandHandler("start", start_cmd))
     app.add_handler(CommandHandler("search", search_cmd))
+    app.add_handler(CommandHandler("sources", sources_cmd))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, text_message_handler))
     app.add_handler(CallbackQueryHandler(callback_query_handler))
+    app.add_handler(InlineQueryHandler(inline_query_handler))
+    # time to first response: around the regular handlers (group 0)
+    app.add_handler(TypeHandler(Update, _first_update), group=-1)
+    app.add_handler(TypeHandler(Update, _first_response), group=1)
     app.add_error_handler(error_handler)
 
+
+def build_application(builder: Optional[ApplicationBuilder] = None, rate_limit: bool = True):
+    # the benchmark passes its own builder (fake Bot API) so it measures the same application as production.
+    # updates are handled concurrently: a play: click awaits its whole download, and one at a time
+    # (PTB's default) every other user's search and "Закрыть" would wait behind it
+    builder = (builder or ApplicationBuilder().token(BOT_TOKEN)).post_init(post_init)
+    if rate_limit:
+        builder = builder.rate_limiter(telegram_limiter)
+    app = builder.concurrent_updates(UPDATE_CONCURRENCY if UPDATE_CONCURRENCY > 1 else False).build()
+    register_handlers(app)
+    return app
+
+
+def main():
+    app = build_application()
+
+    if METRICS_PORT:
+        _register_metrics()
+        metrics.start_http_server(
+            METRICS_PORT, METRICS_HOST, probes={"/healthz": health.liveness, "/readyz": health.readiness}
+        )
+        logger.info("Metrics on http://%s:%d/metrics, probes /healthz and /readyz", METRICS_HOST, METRICS_PORT)
+
     logger.info("Bot is starting...")
     app.run_polling(allowed_updates=None)  # blocking
 
@@ -0,0 +1,234 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+CallbackValue = Union[float, int, Dict[LabelKey, float]]
+
+# Границы бакетов (секунды): от быстрых ответов кэша до долгих загрузок
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def labels(**kwargs: str) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in kwargs.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = ",".join('{}="{}"'.format(k, v.replace("\\", "\\\\").replace('"', '\\"')) for k, v in items)
+    return "{" + escaped + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **label_values: str) -> None:
+        key = labels(**label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self._buckets = tuple(sorted(buckets))
+        # labels -> (счётчики по бакетам, сумма, количество)
+        self._values: Dict[LabelKey, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **label_values: str) -> None:
+        key = labels(**label_values)
+        idx = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self._buckets), 0.0, 0]
+            if idx < len(self._buckets):
+                state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **label_values: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **label_values)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class _Callback:
+    """
+    Значение считается в момент сбора: глубина очереди, размер TEMP_DIR, счётчики кэша.
+    on_loop — fn читает состояние, которое меняет только asyncio loop (словари без блокировок):
+    её вызывает refresh() из задачи на loop, а поток HTTP отдаёт последний снимок.
+    """
+    def __init__(self, name: str, help_text: str, fn: Callable[[], CallbackValue], kind: str, on_loop: bool = False):
+        self.name = name
+        self.help = help_text
+        self._fn = fn
+        self._kind = kind
+        self.on_loop = on_loop
+        self._snapshot: Optional[CallbackValue] = None
+
+    def _call(self) -> Optional[CallbackValue]:
+        try:
+            return self._fn()
+        except Exception:
+            logger.exception("Metric callback %s failed", self.name)
+            return None
+
+    def refresh(self) -> None:
+        # присваивание атомарно: поток HTTP видит либо прежний снимок, либо новый целиком
+        self._snapshot = self._call()
+
+    def render(self) -> List[str]:
+        value = self._snapshot if self.on_loop else self._call()
+        if value is None:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self._kind}"]
+        if isinstance(value, dict):
+            lines += [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(value.items())]
+        else:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def gauge_callback(
+        self, name: str, help_text: str, fn: Callable[[], CallbackValue], kind: str = "gauge", on_loop: bool = False
+    ) -> None:
+        with self._lock:
+            self._metrics[name] = _Callback(name, help_text, fn, kind, on_loop)
+
+    def refresh(self) -> None:
+        """Снимает значения on_loop-метрик; вызывается из event loop, которому принадлежит их состояние."""
+        with self._lock:
+            callbacks = [m for m in self._metrics.values() if isinstance(m, _Callback) and m.on_loop]
+        for callback in callbacks:
+            callback.refresh()
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Длительность стадий: search, info, fetch, transcode, upload ...
+STAGE_SECONDS = REGISTRY.histogram("bot_stage_seconds", "Duration of a processing stage in seconds")
+# Ожидание свободного слота стадии конвейера
+STAGE_WAIT_SECONDS = REGISTRY.histogram("bot_stage_wait_seconds", "Time spent waiting for a pipeline stage slot")
+# Время ответа отдельного поискового источника (префикса yt-dlp) и исход
+SEARCH_SOURCE_SECONDS = REGISTRY.histogram("bot_search_source_seconds", "Search latency per source prefix")
+SEARCH_SOURCE_RESULTS = REGISTRY.counter("bot_search_source_results_total", "Search calls per source prefix and outcome")
+
+
+# Проба: (в порядке ли, пояснение) — /healthz, /readyz
+Probe = Callable[[], Tuple[bool, str]]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry: Registry = REGISTRY
+    probes: Dict[str, Probe] = {}
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/metrics":
+            self._reply(200, self.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        probe = self.probes.get(path)
+        if probe is None:
+            self.send_error(404)
+            return
+        try:
+            ok, text = probe()
+        except Exception as e:
+            ok, text = False, f"probe failed: {e}"
+        self._reply(200 if ok else 503, text + "\n", "text/plain; charset=utf-8")
+
+    def _reply(self, status: int, text: str, content_type: str) -> None:
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002 — без access-логов в stderr
+        pass
+
+
+def start_http_server(port: int, host: str = "127.0.0.1", probes: Optional[Dict[str, Probe]] = None) -> ThreadingHTTPServer:
+    """
+    Отдаёт /metrics в формате Prometheus из фонового потока.
+    probes — дополнительные пути-пробы ("/healthz": fn): 200, если fn() вернула True, иначе 503.
+    """
+    handler = type("_Handler", (_Handler,), {"probes": dict(probes or {})})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True)
+    thread.start()
+    return server
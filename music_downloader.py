@@ -1,7 +1,30 @@
+import functools
+import logging
+import math
 import os
-import tempfile
-from typing import List, Dict, Any, Optional
-from yt_dlp import YoutubeDL
+import subprocess
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, List, Dict, Any, Optional, Tuple
+
+from metrics import SEARCH_SOURCE_RESULTS, SEARCH_SOURCE_SECONDS
+from sizing import DeliveryRejected
+from source_health import SourceHealth
+from track import Track
+from ydl_pool import ExtractionFailed, YDLPool, checked, pool_for
+
+logger = logging.getLogger(__name__)
+
+# Пул потоков для параллельного опроса поисковых источников; размер задаёт configure_search
+_search_workers = 16
+_search_executor: Optional[ThreadPoolExecutor] = None
+_search_executor_lock = threading.Lock()
+
+def configure_search(workers: int) -> None:
+    """Размер пула потоков поиска (SEARCH_WORKERS); действует, если вызван до первого поиска."""
+    global _search_workers
+    _search_workers = max(1, workers)
 
 def _make_ydl_opts_for_search():
     return {
@@ -21,114 +44,471 @@ def _make_ydl_opts_for_info():
         "ignoreerrors": True,
     }
 
-def _make_ydl_opts_for_download(out_dir: str):
+def _make_ydl_opts_for_playlist():
+    # плейлист раскрывается плоско: id, название и длительность треков без захода на их страницы
+    opts = _make_ydl_opts_for_info()
+    opts["extract_flat"] = "in_playlist"
+    return opts
+
+# Форматы, которые Telegram проигрывает нативно: их можно отдавать без перекодирования
+NATIVE_AUDIO_EXTS = (".mp3", ".m4a")
+# Предпочитаем нативно проигрываемое аудио, иначе — лучшее доступное
+PASSTHROUGH_FORMAT = "bestaudio[ext=m4a]/bestaudio[ext=mp3]/bestaudio/best"
+
+# ffmpeg-энкодеры для поддерживаемых выходных кодеков
+_CODEC_ENCODERS = {
+    "mp3": ("libmp3lame", ".mp3"),
+    "m4a": ("aac", ".m4a"),
+    "aac": ("aac", ".m4a"),
+}
+
+# Колбэк прогресса текущей загрузки: экземпляр из пула обслуживает один поток за раз,
+# поэтому постоянный хук пула находит получателя через thread-local
+_progress_local = threading.local()
+
+def _dispatch_progress(d: Dict[str, Any]) -> None:
+    callback = getattr(_progress_local, "callback", None)
+    if callback is None:
+        return
+    status = d.get("status")
+    if status == "downloading":
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        done = d.get("downloaded_bytes")
+        fraction = done / total if total and done is not None else None
+        callback(fraction, d.get("speed"))
+    elif status == "finished":
+        callback(1.0, None)
+
+def _make_ydl_opts_for_fetch(passthrough: bool = False):
+    # только сетевая часть: без постпроцессоров (перекодирование — отдельная стадия).
+    # Каталог задаётся на каждый вызов через params["paths"], поэтому экземпляр можно переиспользовать
     return {
-        "format": "bestaudio/best",
-        "outtmpl": os.path.join(out_dir, "%(id)s.%(ext)s"),
+        "format": PASSTHROUGH_FORMAT if passthrough else "bestaudio/best",
+        "outtmpl": "%(id)s.%(ext)s",
         "noplaylist": True,
         "quiet": True,
         "no_warnings": True,
         "ignoreerrors": True,
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            },
-        ],
+        "progress_hooks": [_dispatch_progress],
     }
 
-def _normalize_entry(raw: Dict[str, Any]) -> Dict[str, Any]:
-    """Нормализуем разные структуры entry в единый словарь"""
-    return {
-        "id": raw.get("id"),
-        "title": raw.get("title") or raw.get("name"),
-        "webpage_url": raw.get("webpage_url") or raw.get("url") or raw.get("original_url"),
-        "duration": raw.get("duration"),
-        "uploader": raw.get("uploader") or raw.get("uploader_id") or raw.get("channel"),
-        "source": raw.get("extractor") or raw.get("extractor_key"),
-        "_raw": raw,
-    }
+def _search_pool(timeout: Optional[float]) -> YDLPool:
+    # socket_timeout фиксируется при создании экземпляра — отдельный пул на каждое значение
+    def make_opts():
+        opts = _make_ydl_opts_for_search()
+        if timeout:
+            # ограничиваем сетевые ожидания, чтобы "брошенный" поток не висел долго
+            opts["socket_timeout"] = timeout
+        return opts
+    return pool_for(("search", timeout), make_opts)
+
+def _playlist_pool() -> YDLPool:
+    return pool_for("playlist", _make_ydl_opts_for_playlist)
+
+def _fetch_pool(passthrough: bool) -> YDLPool:
+    return pool_for(("fetch", passthrough), functools.partial(_make_ydl_opts_for_fetch, passthrough))
+
+def warm_pools(
+    search_timeouts: List[Optional[float]],
+    passthrough: bool = False,
+    count: int = 2,
+    ie_keys: Tuple[str, ...] = (),
+) -> None:
+    """
+    Создаёт экземпляры YoutubeDL заранее (на старте), чтобы первый запрос не платил за инициализацию.
+    ie_keys — extractors поисковых источников: загружаются в каждый экземпляр поискового пула.
+    """
+    def prepare(ydl) -> None:
+        for key in ie_keys:
+            ydl.get_info_extractor(key)
+
+    for timeout in set(search_timeouts):
+        _search_pool(timeout).warm(count, prepare)
+    _playlist_pool().warm(1)
+    _fetch_pool(passthrough).warm(1)
+
+def search_extractors(prefixes: List[str]) -> Dict[str, Optional[str]]:
+    """
+    ie_key extractor'а yt-dlp для каждого поискового префикса ("ytsearch" -> "YoutubeSearch").
+    None — префикс yt-dlp не знает: поиск по такому источнику всегда будет пустым.
+    """
+    from yt_dlp.extractor import gen_extractor_classes
+
+    # Generic подходит к любой строке — он не считается
+    extractors = [ie for ie in gen_extractor_classes() if ie.ie_key() != "Generic"]
+    found: Dict[str, Optional[str]] = {}
+    for prefix in prefixes:
+        found[prefix] = next((ie.ie_key() for ie in extractors if ie.suitable(f"{prefix}:test")), None)
+    return found
+
+def ffmpeg_version() -> Optional[str]:
+    """Первая строка `ffmpeg -version` или None, если ffmpeg не найден или не запускается."""
+    try:
+        result = subprocess.run(
+            ["ffmpeg", "-version"], capture_output=True, text=True, timeout=10, check=False
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.split("\n", 1)[0].strip() or None
+
+def _normalize_entry(raw: Dict[str, Any]) -> Track:
+    """Нормализуем разные структуры entry в компактный Track (без полного payload yt-dlp)"""
+    return Track.from_raw(raw)
 
-def search_combined(query: str, sources: List[str], max_results_total: int = 50) -> List[Dict[str, Any]]:
+def _search_one_source(prefix: str, query: str, per_source: int, timeout: Optional[float]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Поиск по одному префиксу. Экземпляр YoutubeDL из пула принадлежит потоку до конца вызова.
+    None — ошибка extractor (с ignoreerrors yt-dlp возвращает None вместо исключения), [] — пустой ответ.
+    Исход считает search_combined: брошенный по таймауту вызов не должен попасть в статистику второй раз.
+    """
+    started = time.perf_counter()
+    try:
+        with _search_pool(timeout).acquire() as ydl:
+            info = checked(ydl.extract_info(f"{prefix}{per_source}:{query}", download=False))
+        return [e for e in (info.get("entries") or []) if e]
+    except ExtractionFailed:
+        return None
+    finally:
+        SEARCH_SOURCE_SECONDS.observe(time.perf_counter() - started, source=prefix)
+
+def _get_search_executor() -> ThreadPoolExecutor:
+    global _search_executor
+    with _search_executor_lock:
+        if _search_executor is None:
+            _search_executor = ThreadPoolExecutor(max_workers=_search_workers, thread_name_prefix="search")
+        return _search_executor
+
+def _merge_results(per_source_entries: List[Optional[List[Dict[str, Any]]]], max_results_total: int) -> Dict[str, Track]:
+    """Сливает результаты в порядке sources (не в порядке завершения), с дедупликацией по id."""
+    results: Dict[str, Track] = {}
+    for entries in per_source_entries:
+        if not entries:
+            continue
+        for e in entries:
+            key = e.get("id") or e.get("webpage_url") or e.get("title")
+            if not key:
+                continue
+            if key in results:
+                continue
+            results[key] = _normalize_entry(e)
+        if len(results) >= max_results_total:
+            break
+    return results
+
+def search_combined(
+    query: str,
+    sources: List[str],
+    max_results_total: int = 50,
+    source_timeout: Optional[float] = None,
+    total_timeout: Optional[float] = None,
+    source_timeouts: Optional[Dict[str, float]] = None,
+    health: Optional[SourceHealth] = None,
+) -> List[Track]:
     """
     Выполняет комбинированный поиск по префиксам sources.
-    Возвращает список нормализованных entries (id, title, webpage_url, duration, uploader, source).
+    Источники опрашиваются параллельно, у каждого свой дедлайн (source_timeouts[prefix]
+    или source_timeout), у всего поиска — общий total_timeout. Порядок результатов
+    детерминирован: как в sources. Возвращаемся раньше, если первые по порядку
+    завершившиеся источники уже дали max_results_total; опоздавшие отменяются.
+    С health: выключенные circuit breaker'ом источники пропускаются (если выключены все —
+    опрашиваются все), остальные упорядочиваются по скорости и результативности,
+    квота результатов делится по доле непустых ответов; исход каждого опроса записывается в health.
+    Возвращает список Track (id, title, webpage_url, url, duration, uploader, source).
     Работает синхронно — вызывайте в run_in_executor.
     """
-    results: Dict[str, Dict[str, Any]] = {}
-    per_source = max(5, int(max_results_total / max(1, len(sources))) + 2)
-    ydl_opts = _make_ydl_opts_for_search()
-    with YoutubeDL(ydl_opts) as ydl:
+    if not sources:
+        return []
+    source_timeouts = source_timeouts or {}
+    if health is not None:
+        allowed = [prefix for prefix in sources if health.allow(prefix)]
         for prefix in sources:
-            query_string = f"{prefix}{per_source}:{query}"
-            try:
-                info = ydl.extract_info(query_string, download=False)
-            except Exception:
-                continue
-            if not info:
-                continue
-            entries = info.get("entries") or []
-            for e in entries:
-                if not e:
-                    continue
-                key = e.get("id") or e.get("webpage_url") or e.get("title")
-                if not key:
-                    continue
-                if key in results:
-                    continue
-                normalized = _normalize_entry(e)
-                results[key] = normalized
-            if len(results) >= max_results_total:
+            if prefix not in allowed:
+                SEARCH_SOURCE_RESULTS.inc(source=prefix, outcome="skipped")
+        sources = health.rank(allowed or sources, default_latency=(source_timeout or 4.0) / 2)
+        quotas = health.allocate(sources, max_results_total)
+    else:
+        per_source = max(5, int(max_results_total / max(1, len(sources))) + 2)
+        quotas = {prefix: per_source for prefix in sources}
+    executor = _get_search_executor()
+    started = time.monotonic()
+    overall_deadline = started + total_timeout if total_timeout else None
+
+    def finish(idx: int, outcome: str, count: int = 0) -> None:
+        # ровно один исход на каждый опрошенный источник
+        SEARCH_SOURCE_RESULTS.inc(source=sources[idx], outcome=outcome)
+        if health is not None:
+            health.record(sources[idx], time.monotonic() - started, outcome, count)
+
+    futures: Dict[Future, int] = {}
+    deadlines: List[Optional[float]] = []
+    for idx, prefix in enumerate(sources):
+        timeout = source_timeouts.get(prefix, source_timeout)
+        deadlines.append(started + timeout if timeout else None)
+        futures[executor.submit(_search_one_source, prefix, query, quotas[prefix], timeout)] = idx
+
+    per_source_entries: List[Optional[List[Dict[str, Any]]]] = [None] * len(sources)
+    pending = set(futures)
+    while pending:
+        now = time.monotonic()
+        for fut in list(pending):
+            deadline = deadlines[futures[fut]]
+            if deadline is not None and deadline <= now:
+                pending.discard(fut)
+                fut.cancel()
+                per_source_entries[futures[fut]] = []
+                finish(futures[fut], "timeout")
+        if overall_deadline is not None and overall_deadline <= now:
+            break
+        # первые по порядку завершённые источники уже дают нужное количество
+        leading: List[Optional[List[Dict[str, Any]]]] = []
+        for entries in per_source_entries:
+            if entries is None:
                 break
+            leading.append(entries)
+        if len(_merge_results(leading, max_results_total)) >= max_results_total:
+            break
+        if not pending:
+            break
+        candidates = [d for d in (deadlines[futures[f]] for f in pending) if d is not None]
+        if overall_deadline is not None:
+            candidates.append(overall_deadline)
+        wait_for = max(0.0, min(candidates) - now) if candidates else None
+        done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        for fut in done:
+            pending.discard(fut)
+            idx = futures[fut]
+            try:
+                entries = fut.result()
+            except Exception as e:
+                logger.warning("Search source %s failed: %s", sources[idx], e)
+                entries = None
+            if entries is None:
+                finish(idx, "error")
+            else:
+                finish(idx, "ok" if entries else "empty", len(entries))
+            per_source_entries[idx] = entries or []
+    for fut in pending:
+        fut.cancel()
+        idx = futures[fut]
+        if overall_deadline is not None and overall_deadline <= time.monotonic():
+            finish(idx, "timeout")
+        else:
+            # результат не понадобился — это не отказ источника
+            SEARCH_SOURCE_RESULTS.inc(source=sources[idx], outcome="unused")
+            if health is not None:
+                health.release(sources[idx])
+
+    results = _merge_results(per_source_entries, max_results_total)
     return list(results.values())[:max_results_total]
 
-def fetch_info(url_or_id: str) -> Optional[Dict[str, Any]]:
+def fetch_playlist(url: str, max_items: int = 50) -> Tuple[Optional[str], List[Track]]:
     """
-    Извлекает подробную информацию для конкретного URL или id (не скачивая).
-    Возвращает нормализованный entry или None.
-    Работает синхронно — вызывать через run_in_executor.
+    Извлекает URL без скачивания; плейлист или альбом раскрывается плоско (не больше max_items треков).
+    Возвращает (название плейлиста, треки); для одиночного трека название None, трек один.
+    ([], если извлечь не удалось.) Работает синхронно — вызывать через run_in_executor.
     """
-    ydl_opts = _make_ydl_opts_for_info()
-    with YoutubeDL(ydl_opts) as ydl:
-        try:
-            info = ydl.extract_info(url_or_id, download=False)
-        except Exception:
-            return None
-        if not info:
-            return None
-        # Если playlist — берём первый элемент (если есть)
-        if info.get("entries"):
-            first = info["entries"][0] if info["entries"] else None
-            if first:
-                return _normalize_entry(first)
-        return _normalize_entry(info)
-
-def download_to_mp3(url: str, out_dir: Optional[str] = None) -> Optional[str]:
-    """
-    Скачивает единичный трек по url (или id), конвертирует в mp3 и возвращает путь к mp3-файлу.
-    Работает синхронно — вызывать в run_in_executor.
+    try:
+        with _playlist_pool().acquire() as ydl:
+            ydl.params["playlistend"] = max_items
+            info = checked(ydl.extract_info(url, download=False))
+    except Exception:
+        return None, []
+    if info.get("_type") in ("playlist", "multi_video") or info.get("entries") is not None:
+        tracks = [_normalize_entry(e) for e in list(info.get("entries") or [])[:max_items] if e]
+        tracks = [t for t in tracks if t.download_url]
+        return info.get("title") or info.get("id") or url, tracks
+    return None, [_normalize_entry(info)]
+
+def estimate_source_size(info: Dict[str, Any]) -> Optional[int]:
     """
-    if out_dir is None:
-        out_dir = tempfile.mkdtemp()
-    if not os.path.exists(out_dir):
-        os.makedirs(out_dir, exist_ok=True)
+    Размер выбранного формата по метаданным yt-dlp (до скачивания): filesize, filesize_approx
+    или средний битрейт * длительность. None — оценить нечем.
+    """
+    formats = info.get("requested_formats") or [info]
+    total = 0
+    for fmt in formats:
+        size = fmt.get("filesize") or fmt.get("filesize_approx")
+        if not size:
+            bitrate = fmt.get("abr") or fmt.get("tbr")
+            duration = fmt.get("duration") or info.get("duration")
+            if not bitrate or not duration:
+                return None
+            size = bitrate * 1000 / 8 * duration
+        total += int(size)
+    return total
 
-    ydl_opts = _make_ydl_opts_for_download(out_dir)
+def fetch_audio(
+    url: str,
+    out_dir: str,
+    passthrough: bool = False,
+    progress: Optional[Callable[[Optional[float], Optional[float]], None]] = None,
+    inspect: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Optional[str]:
+    """
+    Скачивает аудио по url без перекодирования и возвращает путь к исходному файлу.
+    passthrough=True — выбирать формат, который Telegram проигрывает без перекодирования.
+    progress(fraction, speed) вызывается из потока загрузки (progress_hooks yt-dlp).
+    inspect(info) вызывается после выбора формата, но до скачивания: может проверить размер
+    и отменить загрузку исключением DeliveryRejected (оно пробрасывается).
+    Работает синхронно — вызывать в run_in_executor.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    _progress_local.callback = progress
     try:
-        with YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            if not info:
-                return None
-            track_id = info.get("id")
-            if track_id:
-                expected = os.path.join(out_dir, f"{track_id}.mp3")
-                if os.path.exists(expected):
-                    return expected
-            # fallback: найдём любой mp3 в директории
-            for fname in os.listdir(out_dir):
-                if fname.lower().endswith(".mp3"):
-                    return os.path.join(out_dir, fname)
-            return None
+        with _fetch_pool(passthrough).acquire() as ydl:
+            ydl.params["paths"] = {"home": out_dir}
+            if inspect is None:
+                info = checked(ydl.extract_info(url, download=True))
+            else:
+                # сначала только метаданные и выбор формата, затем скачивание по уже извлечённому info
+                info = checked(ydl.extract_info(url, download=False))
+                inspect(info)
+                info = checked(ydl.process_ie_result(info, download=True))
+            for item in info.get("requested_downloads") or []:
+                path = item.get("filepath")
+                if path and os.path.exists(path):
+                    return path
+            path = ydl.prepare_filename(info)
+            if os.path.exists(path):
+                return path
+    except DeliveryRejected:
+        raise
     except Exception:
         return None
+    finally:
+        _progress_local.callback = None
+    # fallback: любой скачанный файл в директории
+    for fname in sorted(os.listdir(out_dir)):
+        if not fname.endswith((".part", ".ytdl")):
+            return os.path.join(out_dir, fname)
+    return None
+
+def _run_ffmpeg(args: List[str], on_time: Optional[Callable[[float], None]] = None) -> bool:
+    """Запускает ffmpeg; on_time(секунды) получает позицию кодирования из -progress."""
+    cmd = ["ffmpeg", "-y", "-loglevel", "error", "-nostdin"]
+    if on_time is None:
+        try:
+            result = subprocess.run(cmd + args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        except OSError:
+            return False
+        return result.returncode == 0
+    cmd += ["-progress", "pipe:1", "-nostats"] + args
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    except OSError:
+        return False
+    with proc:
+        for line in proc.stdout:
+            key, _, value = line.strip().partition("=")
+            if key == "out_time_us" and value.isdigit():
+                on_time(int(value) / 1_000_000)
+    return proc.returncode == 0
+
+def transcode_audio(
+    src_path: str,
+    codec: str = "mp3",
+    bitrate: str = "192",
+    progress: Optional[Callable[[Optional[float], Optional[float]], None]] = None,
+    duration: Optional[float] = None,
+) -> Optional[str]:
+    """
+    Перекодирует аудиофайл через ffmpeg в codec (mp3 / m4a) и возвращает путь к результату рядом с исходником.
+    progress(fraction, None) вызывается по ходу кодирования, если известна длительность.
+    Работает синхронно — вызывать в run_in_executor.
+    """
+    encoder, ext = _CODEC_ENCODERS.get(codec, _CODEC_ENCODERS["mp3"])
+    base, src_ext = os.path.splitext(src_path)
+    dst_path = base + ext if src_ext.lower() != ext else base + ".out" + ext
+    on_time = None
+    if progress is not None and duration:
+        on_time = lambda seconds: progress(seconds / duration, None)  # noqa: E731
+    if not _run_ffmpeg(["-i", src_path, "-vn", "-codec:a", encoder, "-b:a", f"{bitrate}k", dst_path], on_time):
+        return None
+    if not os.path.exists(dst_path):
+        return None
+    try:
+        os.remove(src_path)
+    except OSError:
+        pass
+    return dst_path
+
+def split_audio(
+    src_path: str,
+    parts: int,
+    duration: float,
+    codec: str = "mp3",
+    bitrate: str = "192",
+    progress: Optional[Callable[[Optional[float], Optional[float]], None]] = None,
+) -> List[str]:
+    """
+    Перекодирует и режет аудио на parts частей равной длительности одним проходом ffmpeg
+    (segment muxer). Возвращает пути частей по порядку ("<id>_01.mp3", ...) или [] при ошибке.
+    Работает синхронно — вызывать в run_in_executor.
+    """
+    encoder, ext = _CODEC_ENCODERS.get(codec, _CODEC_ENCODERS["mp3"])
+    base = os.path.splitext(src_path)[0]
+    pattern = f"{base}_%02d{ext}"
+    segment = math.ceil(duration / parts)
+    on_time = None
+    if progress is not None:
+        on_time = lambda seconds: progress(seconds / duration, None)  # noqa: E731
+    args = [
+        "-i", src_path, "-vn", "-codec:a", encoder, "-b:a", f"{bitrate}k",
+        "-f", "segment", "-segment_time", str(segment), "-segment_start_number", "1",
+        "-reset_timestamps", "1", pattern,
+    ]
+    if not _run_ffmpeg(args, on_time):
+        return []
+    paths = []
+    number = 1
+    while os.path.exists(pattern % number):
+        paths.append(pattern % number)
+        number += 1
+    if not paths:
+        return []
+    try:
+        os.remove(src_path)
+    except OSError:
+        pass
+    return paths
+
+def remux_audio(src_path: str) -> Optional[str]:
+    """
+    Перепаковывает m4a без перекодирования (DASH-контейнер -> обычный, moov в начале).
+    При ошибке возвращает исходный файл — он всё равно проигрывается.
+    """
+    tmp_path = src_path + ".remux.m4a"
+    if _run_ffmpeg(["-i", src_path, "-vn", "-codec:a", "copy", "-movflags", "+faststart", tmp_path]):
+        os.replace(tmp_path, src_path)
+    elif os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    return src_path
+
+def prepare_audio(
+    src_path: str,
+    codec: str = "mp3",
+    bitrate: str = "192",
+    passthrough: bool = False,
+    progress: Optional[Callable[[Optional[float], Optional[float]], None]] = None,
+    duration: Optional[float] = None,
+    max_size: Optional[int] = None,
+):
+    """
+    Готовит файл к отправке: нативно проигрываемый формат отдаётся как есть (m4a — с перепаковкой),
+    остальное перекодируется. Исходник больше max_size байт перекодируется в любом случае.
+    Возвращает (путь или None, "passthrough" | "remux" | "transcode").
+    """
+    ext = os.path.splitext(src_path)[1].lower()
+    if max_size and os.path.getsize(src_path) > max_size:
+        return transcode_audio(src_path, codec, bitrate, progress, duration), "transcode"
+    if passthrough and ext in NATIVE_AUDIO_EXTS:
+        if ext == ".m4a":
+            return remux_audio(src_path), "remux"
+        return src_path, "passthrough"
+    encoder_ext = _CODEC_ENCODERS.get(codec, _CODEC_ENCODERS["mp3"])[1]
+    if ext == encoder_ext == ".mp3":
+        # уже нужный кодек — перекодирование ничего не даст
+        return src_path, "passthrough"
+    return transcode_audio(src_path, codec, bitrate, progress, duration), "transcode"
@@ -0,0 +1,205 @@
+import asyncio
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import music_downloader
+from metrics import STAGE_SECONDS, STAGE_WAIT_SECONDS
+from sizing import SIZE_MARGIN, DeliveryPlan, plan_delivery
+
+
+class Stage:
+    """
+    Стадия конвейера: собственная очередь ожидания (FIFO семафора) и лимит параллелизма.
+    Синхронная работа выполняется в выделенном пуле потоков стадии.
+    """
+    def __init__(self, name: str, concurrency: int, executor: Optional[ThreadPoolExecutor] = None):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self._executor = executor
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.active = 0
+        self.completed = 0
+
+    def _sem(self) -> asyncio.Semaphore:
+        # создаём лениво — внутри работающего loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        return await self.run_async(lambda: loop.run_in_executor(self._executor, func, *args))
+
+    async def run_async(self, factory: Callable[[], Awaitable[Any]]) -> Any:
+        self.waiting += 1
+        queued_at = time.perf_counter()
+        try:
+            await self._sem().acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        STAGE_WAIT_SECONDS.observe(started - queued_at, stage=self.name)
+        self.active += 1
+        try:
+            return await factory()
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self._sem().release()
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=self.name)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "waiting": self.waiting,
+            "active": self.active,
+            "completed": self.completed,
+            "concurrency": self.concurrency,
+        }
+
+
+class DownloadPipeline:
+    """
+    Загрузка трека разбита на стадии с отдельными лимитами:
+    fetch (сеть, bestaudio как есть) -> transcode (ffmpeg, по числу CPU) -> upload (Telegram).
+    Медленная сеть не держит слоты перекодирования, и наоборот.
+    Перекодирование выполняет отдельный процесс ffmpeg, поэтому пулу стадии достаточно потоков,
+    которые лишь ждут его завершения.
+    Размер результата планируется до скачивания (upload_limit): битрейт понижается до min_bitrate,
+    длинное аудио режется на части (не больше max_parts), а безнадёжная загрузка отклоняется
+    исключением DeliveryRejected ещё до того, как начнёт качаться.
+    """
+    def __init__(
+        self,
+        fetch_concurrency: int,
+        transcode_concurrency: int,
+        upload_concurrency: int,
+        codec: str = "mp3",
+        bitrate: str = "192",
+        passthrough: bool = False,
+        upload_limit: int = 0,
+        min_bitrate: int = 64,
+        max_parts: int = 1,
+    ):
+        self.codec = codec
+        self.bitrate = bitrate
+        self.passthrough = passthrough
+        self.upload_limit = upload_limit
+        self.min_bitrate = min_bitrate
+        self.max_parts = max_parts
+        # сколько раз отдали файл без перекодирования / перепаковали / перекодировали / порезали на части
+        self.delivery_modes: Dict[str, int] = {"passthrough": 0, "remux": 0, "transcode": 0, "split": 0}
+        self.fetch = Stage(
+            "fetch",
+            fetch_concurrency,
+            ThreadPoolExecutor(max_workers=max(1, fetch_concurrency), thread_name_prefix="fetch"),
+        )
+        self.transcode = Stage(
+            "transcode",
+            transcode_concurrency,
+            ThreadPoolExecutor(max_workers=max(1, transcode_concurrency), thread_name_prefix="transcode"),
+        )
+        self.upload = Stage("upload", upload_concurrency)
+
+    def plan(self, duration: Optional[float], source_size: Optional[int] = None) -> DeliveryPlan:
+        """План доставки по длительности и размеру исходника; DeliveryRejected — не уложиться в лимит."""
+        return plan_delivery(
+            duration,
+            self.upload_limit,
+            int(self.bitrate),
+            min_bitrate=self.min_bitrate,
+            max_parts=self.max_parts,
+            passthrough=self.passthrough,
+            source_size=source_size,
+        )
+
+    async def download(
+        self,
+        url: str,
+        out_dir: str,
+        progress: Optional[Callable[[str, Optional[float], Optional[float]], None]] = None,
+        duration: Optional[float] = None,
+        staging_dir: Optional[str] = None,
+        on_fetched: Optional[Callable[[], None]] = None,
+    ) -> List[str]:
+        """
+        fetch + transcode; возвращает пути к готовым аудиофайлам в out_dir (несколько — если трек
+        порезан на части) или [] при ошибке. План доставки уточняется по метаданным формата
+        перед скачиванием; DeliveryRejected пробрасывается.
+        staging_dir — каталог для исходника и промежуточных файлов (например, в RAM):
+        готовые файлы переносятся в out_dir, staging_dir удаляется.
+        progress(stage, fraction, speed) вызывается из рабочих потоков стадий.
+        on_fetched() вызывается в loop, когда стадия fetch закончилась (успешно или нет).
+        """
+        def reporter(stage: str):
+            if progress is None:
+                return None
+            return lambda fraction=None, speed=None: progress(stage, fraction, speed)
+
+        # план, уточнённый по метаданным (длительность из поиска бывает пустой), и длительность для нарезки
+        planned: Dict[str, Any] = {"plan": None, "duration": duration}
+
+        def inspect(info: Dict[str, Any]) -> None:
+            planned["duration"] = info.get("duration") or duration
+            planned["plan"] = self.plan(planned["duration"], music_downloader.estimate_source_size(info))
+
+        work_dir = staging_dir or out_dir
+        try:
+            try:
+                src_path = await self.fetch.run(
+                    music_downloader.fetch_audio, url, work_dir, self.passthrough, reporter("fetch"), inspect
+                )
+            finally:
+                if on_fetched is not None:
+                    on_fetched()
+            if not src_path:
+                return []
+            plan = planned["plan"] or self.plan(duration)
+            if progress is not None:
+                progress("transcode", None, None)
+            if plan.parts > 1:
+                paths = await self.transcode.run(
+                    music_downloader.split_audio,
+                    src_path,
+                    plan.parts,
+                    planned["duration"],
+                    self.codec,
+                    str(plan.bitrate),
+                    reporter("transcode"),
+                )
+                mode = "split"
+            else:
+                path, mode = await self.transcode.run(
+                    music_downloader.prepare_audio,
+                    src_path,
+                    self.codec,
+                    str(plan.bitrate),
+                    self.passthrough and plan.passthrough,
+                    reporter("transcode"),
+                    planned["duration"],
+                    int(self.upload_limit * SIZE_MARGIN) or None,
+                )
+                paths = [path] if path else []
+            if not paths:
+                return []
+            self.delivery_modes[mode] += 1
+            if staging_dir:
+                os.makedirs(out_dir, exist_ok=True)
+                loop = asyncio.get_running_loop()
+                # между файловыми системами move — это копирование, не держим им loop
+                paths = [
+                    await loop.run_in_executor(None, shutil.move, path, os.path.join(out_dir, os.path.basename(path)))
+                    for path in paths
+                ]
+            return paths
+        finally:
+            if staging_dir:
+                shutil.rmtree(staging_dir, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats = {stage.name: stage.stats() for stage in (self.fetch, self.transcode, self.upload)}
+        stats["delivery"] = dict(self.delivery_modes)
+        return stats
@@ -0,0 +1,140 @@
+import time
+from typing import Dict, Hashable, List, Optional, Set
+
+
+class _Hold:
+    __slots__ = ("group", "expires_at", "size", "running", "dropped")
+
+    def __init__(self, group: Hashable, expires_at: float):
+        self.group = group
+        self.expires_at = expires_at
+        self.size = 0
+        self.running = True
+        self.dropped = False
+
+
+class PrefetchHolds:
+    """
+    Учёт спекулятивных загрузок: какая панель (group) их заказала, когда они протухают
+    и сколько места занимают готовые файлы.
+    Пока загрузка держится здесь, её каталог в TEMP_DIR не удаляется, и нажатие play:
+    переиспользует готовый файл. Снятая запущенная загрузка помечается dropped —
+    её каталог освобождается, когда она завершится (finish вернёт False).
+    Используется только из asyncio loop.
+    """
+    def __init__(self, ttl: float, max_bytes: int = 0, max_active: int = 1):
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._max_active = max_active
+        self._holds: Dict[str, _Hold] = {}
+        self._groups: Dict[Hashable, Set[str]] = {}
+        self.started = 0
+        self.used = 0
+
+    @property
+    def active(self) -> int:
+        return sum(1 for h in self._holds.values() if h.running and not h.dropped)
+
+    @property
+    def bytes(self) -> int:
+        return sum(h.size for h in self._holds.values())
+
+    def can_start(self) -> bool:
+        if self._max_active and self.active >= self._max_active:
+            return False
+        return not self._max_bytes or self.bytes < self._max_bytes
+
+    def __contains__(self, key: str) -> bool:
+        hold = self._holds.get(key)
+        return hold is not None and not hold.dropped
+
+    def ready(self, key: str) -> bool:
+        """Загрузка держится и уже завершилась: её файл можно отправлять без очереди."""
+        hold = self._holds.get(key)
+        return hold is not None and not hold.dropped and not hold.running
+
+    def hold(self, key: str, group: Hashable) -> bool:
+        """Регистрирует загрузку; False, если она уже держится."""
+        if key in self._holds:
+            return False
+        self._holds[key] = _Hold(group, time.monotonic() + self._ttl)
+        self._groups.setdefault(group, set()).add(key)
+        self.started += 1
+        return True
+
+    def finish(self, key: str, size: Optional[int]) -> bool:
+        """
+        Загрузка завершилась (size=None — неудачно). True — файл остаётся в учёте;
+        False — держать нечего (ошибка или загрузку уже сняли), каталог нужно освободить.
+        """
+        hold = self._holds.get(key)
+        if hold is None:
+            return False
+        hold.running = False
+        if hold.dropped or size is None:
+            self._forget(key)
+            return False
+        hold.size = size
+        return True
+
+    def mark_used(self, key: str) -> None:
+        if key in self:
+            self.used += 1
+
+    def release_group(self, group: Hashable) -> List[str]:
+        """Панель закрыта: снимает её загрузки. Возвращает ключи готовых файлов, которые можно удалить."""
+        return self._drop([k for k in self._groups.get(group, ())])
+
+    def expired(self) -> List[str]:
+        now = time.monotonic()
+        return self._drop([k for k, h in self._holds.items() if h.expires_at <= now])
+
+    def over_budget(self) -> List[str]:
+        """Сверх max_bytes: снимает самые старые готовые файлы."""
+        if not self._max_bytes:
+            return []
+        excess = self.bytes - self._max_bytes
+        victims = []
+        for key, hold in sorted(self._holds.items(), key=lambda kv: kv[1].expires_at):
+            if excess <= 0:
+                break
+            if not hold.running:
+                victims.append(key)
+                excess -= hold.size
+        return self._drop(victims)
+
+    def evict_ready(self) -> List[str]:
+        """Не хватает места в TEMP_DIR: снимает все готовые файлы — настоящие загрузки важнее."""
+        return self._drop([k for k, h in self._holds.items() if not h.running])
+
+    def _drop(self, keys: List[str]) -> List[str]:
+        ready = []
+        for key in keys:
+            hold = self._holds.get(key)
+            if hold is None or hold.dropped:
+                continue
+            if hold.running:
+                hold.dropped = True
+                continue
+            self._forget(key)
+            ready.append(key)
+        return ready
+
+    def _forget(self, key: str) -> None:
+        hold = self._holds.pop(key, None)
+        if hold is None:
+            return
+        keys = self._groups.get(hold.group)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._groups[hold.group]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self.active,
+            "ready": sum(1 for h in self._holds.values() if not h.running),
+            "bytes": self.bytes,
+            "started": self.started,
+            "used": self.used,
+        }
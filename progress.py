@@ -0,0 +1,98 @@
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_STAGE_TITLES = {
+    "fetch": "Скачиваю",
+    "transcode": "Конвертирую",
+    "upload": "Отправляю",
+}
+
+
+def render_progress(stage: str, fraction: Optional[float] = None, speed: Optional[float] = None) -> str:
+    """Текст статуса для стадии загрузки: "Скачиваю: 45% (1.2 МБ/с)"."""
+    text = _STAGE_TITLES.get(stage, stage)
+    if fraction is not None:
+        text += f": {int(max(0.0, min(fraction, 1.0)) * 100)}%"
+    else:
+        text += "..."
+    if speed:
+        text += f" ({speed / (1024 * 1024):.1f} МБ/с)"
+    return text
+
+
+class StatusMessage:
+    """
+    Статусное сообщение с прогрессом, которое редактируется не чаще раза в interval секунд.
+    Промежуточные обновления склеиваются — показывается только последнее.
+    update() вызывается из asyncio loop, update_threadsafe() — из потоков yt-dlp / ffmpeg.
+    Сообщение создаётся при первом обновлении и удаляется в close() (или остаётся с итоговым текстом).
+    """
+    def __init__(self, reply_to, interval: float = 3.0):
+        self._reply_to = reply_to
+        self._interval = interval
+        self._loop = asyncio.get_running_loop()
+        self._message = None
+        self._shown: Optional[str] = None
+        self._pending: Optional[str] = None
+        self._last_edit = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._sleeping = False
+        self._closed = False
+
+    def update(self, text: str) -> None:
+        if self._closed:
+            return
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = self._loop.create_task(self._flush())
+
+    def update_threadsafe(self, text: str) -> None:
+        self._loop.call_soon_threadsafe(self.update, text)
+
+    async def _flush(self) -> None:
+        while not self._closed and self._pending is not None and self._pending != self._shown:
+            delay = self._last_edit + self._interval - self._loop.time()
+            if self._message is not None and delay > 0:
+                self._sleeping = True
+                try:
+                    await asyncio.sleep(delay)
+                finally:
+                    self._sleeping = False
+                continue
+            text = self._pending
+            try:
+                if self._message is None:
+                    self._message = await self._reply_to.reply_text(text)
+                else:
+                    await self._message.edit_text(text)
+            except Exception as e:
+                logger.debug("Status message update failed: %s", e)
+            self._shown = text
+            self._last_edit = self._loop.time()
+
+    async def close(self, text: Optional[str] = None, reply_markup=None) -> None:
+        """Останавливает обновления и удаляет сообщение; с text — оставляет его с итоговым текстом."""
+        self._closed = True
+        task = self._task
+        if task is not None and not task.done():
+            if self._sleeping:
+                task.cancel()
+            try:
+                # сообщение может создаваться прямо сейчас — дожидаемся, чтобы не оставить его висеть
+                await task
+            except asyncio.CancelledError:
+                pass
+        message, self._message = self._message, None
+        try:
+            if text is not None:
+                if message is None:
+                    await self._reply_to.reply_text(text, reply_markup=reply_markup)
+                else:
+                    await message.edit_text(text, reply_markup=reply_markup)
+            elif message is not None:
+                await message.delete()
+        except Exception as e:
+            logger.debug("Status message close failed: %s", e)
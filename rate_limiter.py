@@ -0,0 +1,285 @@
+import asyncio
+import datetime
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Приоритеты исходящих запросов: меньше — раньше
+PRIORITY_AUDIO = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_STATUS = 2
+
+_ENDPOINT_PRIORITY = {
+    "sendAudio": PRIORITY_AUDIO,
+    "sendDocument": PRIORITY_AUDIO,
+    "editMessageText": PRIORITY_STATUS,
+    "deleteMessage": PRIORITY_STATUS,
+}
+# Ответы на нажатия и inline-запросы Telegram ждёт считанные секунды и в лимиты сообщений они не входят
+_UNLIMITED = frozenset({"answerCallbackQuery", "answerInlineQuery", "getMe", "setMyCommands"})
+# Правки одного сообщения, ещё стоящие в очереди, склеиваются: уходит только последняя
+_MERGEABLE = frozenset({"editMessageText", "editMessageReplyMarkup", "editMessageCaption"})
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше burst про запас. rate <= 0 — без ограничения."""
+    __slots__ = ("rate", "burst", "_tokens", "_updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        # now мог быть снят до создания bucket'а (новый чат в том же проходе диспетчера)
+        if now > self._updated:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def delay(self, now: float) -> float:
+        """Сколько секунд ждать до следующего токена (0 — можно сейчас)."""
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        if self.rate > 0:
+            self._refill(now)
+            self._tokens -= 1
+
+    @property
+    def full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.rate <= 0 or self._tokens >= self.burst
+
+
+class _Request:
+    __slots__ = ("priority", "seq", "chat_id", "merge_key", "call", "granted", "done", "waited")
+
+    def __init__(self, priority: int, seq: int, chat_id: Optional[int], merge_key: Optional[Tuple], call: Tuple):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.merge_key = merge_key
+        self.call = call
+        self.granted = asyncio.get_running_loop().create_future()
+        self.done = asyncio.get_running_loop().create_future()
+        self.waited = False
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    value = error.retry_after
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    return float(value)
+
+
+class TelegramRateLimiter(BaseRateLimiter[int]):
+    """
+    Единая точка для всех исходящих запросов бота (ApplicationBuilder().rate_limiter(...)):
+    - общий token bucket (global_rate запросов/с) и по bucket на чат (chat_rate для личных чатов,
+      group_rate для групп), чтобы не упираться во flood control Telegram;
+    - очередь с приоритетами: отправка аудио идёт раньше обычных ответов, а те — раньше правок и
+      удаления статусных сообщений. Чат, исчерпавший свой лимит, не задерживает остальные;
+    - правки одного сообщения, ещё ждущие в очереди, склеиваются: отправляется только последняя,
+      все вызывающие получают её результат;
+    - на 429 (RetryAfter) отправка приостанавливается на retry_after и запрос повторяется
+      до max_retries раз, после чего ошибка пробрасывается.
+    Приоритет выбирается по методу API; rate_limit_args=<приоритет> в вызове бота его переопределяет.
+    """
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        burst: float = 3.0,
+        max_retries: int = 3,
+    ):
+        self._global_rate = global_rate
+        self._chat_rate = chat_rate
+        self._group_rate = group_rate
+        self._burst = burst
+        self._max_retries = max_retries
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[int, TokenBucket] = {}
+        self._queue: List[_Request] = []
+        self._edits: Dict[Tuple, _Request] = {}
+        self._seq = 0
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.counters: Dict[str, int] = {"sent": 0, "throttled": 0, "merged": 0, "retried": 0, "failed": 0}
+
+    async def initialize(self) -> None:
+        # Application.initialize() инициализирует бота дважды (напрямую и через Updater)
+        if self._dispatcher is not None:
+            return
+        self._global = TokenBucket(self._global_rate, self._global_rate)
+        self._wakeup = asyncio.Event()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for request in self._queue:
+            if not request.granted.done():
+                request.granted.cancel()
+        self._queue.clear()
+        self._edits.clear()
+
+    @property
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # отрицательные id — группы и каналы, у них лимит строже
+            bucket = TokenBucket(self._group_rate if chat_id < 0 else self._chat_rate, self._burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Any:
+        if endpoint in _UNLIMITED:
+            return await self._call((callback, args, kwargs))
+        chat_id = data.get("chat_id")
+        chat_id = chat_id if isinstance(chat_id, int) else None
+        merge_key = None
+        if endpoint in _MERGEABLE and chat_id is not None and data.get("message_id"):
+            merge_key = (endpoint, chat_id, data["message_id"])
+            pending = self._edits.get(merge_key)
+            if pending is not None:
+                # предыдущая правка ещё не ушла — отправим вместо неё эту
+                pending.call = (callback, args, kwargs)
+                self.counters["merged"] += 1
+                return await asyncio.shield(pending.done)
+        priority = rate_limit_args if rate_limit_args is not None else _ENDPOINT_PRIORITY.get(endpoint, PRIORITY_DEFAULT)
+        self._seq += 1
+        request = _Request(priority, self._seq, chat_id, merge_key, (callback, args, kwargs))
+        self._queue.append(request)
+        if merge_key is not None:
+            self._edits[merge_key] = request
+        self._wakeup.set()
+        try:
+            await request.granted
+        except asyncio.CancelledError:
+            self._forget(request)
+            # склеенные с ней правки тоже не уйдут
+            request.done.cancel()
+            raise
+        if request.waited:
+            self.counters["throttled"] += 1
+        try:
+            result = await self._call(request.call)
+        except asyncio.CancelledError:
+            request.done.cancel()
+            raise
+        except Exception as e:
+            request.done.set_exception(e)
+            # результат забирают только склеенные вызовы; без них исключение не должно считаться потерянным
+            request.done.exception()
+            raise
+        request.done.set_result(result)
+        return result
+
+    def _forget(self, request: _Request) -> None:
+        if request in self._queue:
+            self._queue.remove(request)
+        if request.merge_key is not None and self._edits.get(request.merge_key) is request:
+            del self._edits[request.merge_key]
+
+    async def _call(self, call: Tuple) -> Any:
+        callback, args, kwargs = call
+        for attempt in range(self._max_retries + 1):
+            try:
+                result = await callback(*args, **kwargs)
+                self.counters["sent"] += 1
+                return result
+            except RetryAfter as e:
+                if attempt >= self._max_retries:
+                    self.counters["failed"] += 1
+                    raise
+                delay = _retry_seconds(e)
+                self.counters["retried"] += 1
+                logger.warning("Flood control: retrying in %.1fs", delay)
+                # 429 относится ко всему боту: притормаживаем и остальные запросы
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def _dispatch(self) -> None:
+        """Выдаёт разрешения на отправку: по приоритету, среди чатов, у которых есть токен."""
+        while True:
+            now = time.monotonic()
+            wait: Optional[float] = self._paused_until - now if self._paused_until > now else None
+            if wait is None and self._queue:
+                self._queue.sort(key=lambda r: (r.priority, r.seq))
+                wait = self._global.delay(now)
+                if wait <= 0:
+                    wait = self._grant_next(now)
+                    blocked = ()
+                else:
+                    blocked = self._queue
+            else:
+                blocked = self._queue
+            for request in blocked:
+                request.waited = True
+            self._wakeup.clear()
+            if wait is None:
+                await self._wakeup.wait()
+                continue
+            if wait <= 0:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant_next(self, now: float) -> Optional[float]:
+        """Пропускает первый запрос, чей чат не исчерпал лимит; иначе — сколько ждать ближайшего токена."""
+        soonest: Optional[float] = None
+        for request in self._queue:
+            bucket = self._bucket(request.chat_id) if request.chat_id is not None else None
+            delay = bucket.delay(now) if bucket is not None else 0.0
+            if delay > 0:
+                request.waited = True
+                soonest = delay if soonest is None else min(soonest, delay)
+                continue
+            self._global.take(now)
+            if bucket is not None:
+                bucket.take(now)
+            self._forget(request)
+            if not request.granted.done():
+                request.granted.set_result(None)
+            return 0.0
+        return soonest
+
+    def sweep(self) -> int:
+        """Удаляет bucket'ы чатов, успевших накопить полный запас (они ничем не отличаются от новых)."""
+        idle = [chat_id for chat_id, bucket in self._chats.items() if bucket.full]
+        for chat_id in idle:
+            del self._chats[chat_id]
+        return len(idle)
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.counters, "queued": len(self._queue), "chats": len(self._chats)}
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Очередь заполнена — задачу не принимаем, чтобы не копить бесконечный хвост."""
+
+
+class JobCancelled(Exception):
+    """Задача снята из очереди до запуска (например, пользователь закрыл панель)."""
+
+
+class _Job:
+    __slots__ = ("user_id", "chat_id", "priority", "key", "groups", "pinned", "state", "position", "wakeup")
+
+    def __init__(self, user_id: int, chat_id: int, priority: int, key: Optional[Hashable], group: Optional[Hashable]):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.priority = priority
+        self.key = key
+        self.groups: Set[Hashable] = {group} if group is not None else set()
+        # задача без группы не снимается через cancel_group
+        self.pinned = group is None
+        self.state = "queued"  # queued -> running -> done | cancelled
+        self.position = 0
+        self.wakeup = asyncio.Event()
+
+
+# Задача, которую сейчас выполняет factory() (и её планировщик): её слот можно освободить раньше
+_current_job: "ContextVar[Optional[Tuple[DownloadScheduler, _Job]]]" = ContextVar("download_job", default=None)
+
+
+class DownloadScheduler:
+    """
+    Планировщик загрузок вместо одного глобального семафора.
+    - общий лимит одновременных задач и лимиты на пользователя / чат;
+    - round-robin между пользователями: у каждого своя очередь, за проход берётся по одной задаче;
+    - приоритеты: меньшее значение обслуживается раньше (0 — обычные загрузки);
+    - ограниченная очередь: при переполнении submit сразу бросает QueueFull;
+    - позиция в очереди сообщается через on_position, снятие задач — cancel_group;
+    - задача может вернуть слот раньше, чем закончится (release_slot).
+    Используется только из asyncio loop.
+    """
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        per_user: int = 1,
+        per_chat: int = 2,
+        max_queue: int = 100,
+        max_user_queue: int = 10,
+    ):
+        self._max_concurrent = max_concurrent
+        self._per_user = per_user
+        self._per_chat = per_chat
+        self._max_queue = max_queue
+        self._max_user_queue = max_user_queue
+        # priority -> user_id -> очередь задач; порядок пользователей = порядок обхода
+        self._queues: Dict[int, "OrderedDict[int, Deque[_Job]]"] = {}
+        self._by_key: Dict[Hashable, _Job] = {}
+        self._queued = 0
+        self._running = 0
+        self._user_running: Dict[int, int] = {}
+        self._chat_running: Dict[int, int] = {}
+        self.rejected = 0
+        self.cancelled = 0
+
+    async def submit(
+        self,
+        user_id: int,
+        chat_id: int,
+        factory: Callable[[], Awaitable[Any]],
+        *,
+        priority: int = 0,
+        key: Optional[Hashable] = None,
+        group: Optional[Hashable] = None,
+        on_position: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> Any:
+        """
+        Ставит задачу в очередь и выполняет factory(), когда до неё дойдёт очередь.
+        on_position(n) вызывается при смене позиции (n >= 1) и один раз с 0 при запуске.
+        """
+        job = _Job(user_id, chat_id, priority, key, group)
+        self._enqueue(job)
+        try:
+            self._dispatch()
+            shown: Optional[int] = None
+            while job.state == "queued":
+                if on_position is not None and job.position != shown:
+                    shown = job.position
+                    await self._notify(on_position, shown)
+                    continue
+                job.wakeup.clear()
+                await job.wakeup.wait()
+        except asyncio.CancelledError:
+            if job.state == "queued":
+                self._unqueue(job)
+                self._dispatch()
+            elif job.state == "running":
+                self._finish(job)
+            raise
+        if job.state == "cancelled":
+            raise JobCancelled()
+        token = _current_job.set((self, job))
+        try:
+            if on_position is not None and shown is not None:
+                await self._notify(on_position, 0)
+            return await factory()
+        finally:
+            _current_job.reset(token)
+            self._finish(job)
+
+    def release_slot(self) -> None:
+        """
+        Вызывается изнутри factory(): освобождает слот задачи до её завершения. Так планировщик
+        ограничивает только скачивание, а перекодирование и отправку — лимиты стадий конвейера.
+        """
+        current = _current_job.get()
+        if current is not None and current[0] is self:
+            self._finish(current[1])
+
+    def attach(self, key: Hashable, group: Hashable) -> None:
+        """Привязывает ещё одну группу (панель) к задаче: она отменится, только когда закроют все."""
+        job = self._by_key.get(key)
+        if job is not None:
+            job.groups.add(group)
+
+    def promote(self, key: Hashable, priority: int) -> None:
+        """Повышает приоритет ожидающей задачи (спекулятивная загрузка, которую пользователь нажал)."""
+        job = self._by_key.get(key)
+        if job is None or job.state != "queued" or job.priority <= priority:
+            return
+        self._unqueue(job)
+        job.priority = priority
+        level = self._queues.setdefault(priority, OrderedDict())
+        level.setdefault(job.user_id, deque()).append(job)
+        self._queued += 1
+        self._by_key[key] = job
+        self._dispatch()
+
+    def cancel_group(self, group: Hashable) -> int:
+        """
+        Снимает ожидающие задачи группы. Уже запущенные загрузки не прерываются:
+        поток yt-dlp нельзя остановить, а освобождать его слот раньше времени нельзя.
+        """
+        count = 0
+        for level in list(self._queues.values()):
+            for queue in list(level.values()):
+                for job in list(queue):
+                    if group not in job.groups:
+                        continue
+                    job.groups.discard(group)
+                    if job.groups or job.pinned:
+                        continue
+                    self._unqueue(job)
+                    job.state = "cancelled"
+                    job.wakeup.set()
+                    count += 1
+        if count:
+            self.cancelled += count
+            self._dispatch()
+        return count
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queued,
+            "running": self._running,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+        }
+
+    @property
+    def idle(self) -> bool:
+        return self._queued == 0 and self._running < self._max_concurrent
+
+    def _enqueue(self, job: _Job) -> None:
+        level = self._queues.setdefault(job.priority, OrderedDict())
+        queue = level.get(job.user_id)
+        user_queued = sum(len(lvl.get(job.user_id, ())) for lvl in self._queues.values())
+        if (self._max_queue and self._queued >= self._max_queue) or (
+            self._max_user_queue and user_queued >= self._max_user_queue
+        ):
+            if not level:
+                del self._queues[job.priority]
+            self.rejected += 1
+            raise QueueFull()
+        if queue is None:
+            queue = level[job.user_id] = deque()
+        queue.append(job)
+        self._queued += 1
+        if job.key is not None:
+            self._by_key[job.key] = job
+
+    def _unqueue(self, job: _Job) -> None:
+        level = self._queues.get(job.priority)
+        queue = level.get(job.user_id) if level else None
+        if queue is None or job not in queue:
+            return
+        queue.remove(job)
+        self._queued -= 1
+        if not queue:
+            del level[job.user_id]
+        if not level:
+            del self._queues[job.priority]
+        self._forget_key(job)
+
+    def _forget_key(self, job: _Job) -> None:
+        if job.key is not None and self._by_key.get(job.key) is job:
+            del self._by_key[job.key]
+
+    def _next_job(self) -> Optional[_Job]:
+        for priority in sorted(self._queues):
+            level = self._queues[priority]
+            for user_id in list(level):
+                if self._per_user and self._user_running.get(user_id, 0) >= self._per_user:
+                    continue
+                queue = level[user_id]
+                for job in queue:
+                    if self._per_chat and self._chat_running.get(job.chat_id, 0) >= self._per_chat:
+                        continue
+                    self._unqueue(job)
+                    if user_id in level:
+                        # пользователь уходит в конец круга
+                        level.move_to_end(user_id)
+                    return job
+        return None
+
+    def _dispatch(self) -> None:
+        while self._running < self._max_concurrent:
+            job = self._next_job()
+            if job is None:
+                break
+            job.state = "running"
+            self._running += 1
+            self._user_running[job.user_id] = self._user_running.get(job.user_id, 0) + 1
+            self._chat_running[job.chat_id] = self._chat_running.get(job.chat_id, 0) + 1
+            job.wakeup.set()
+        self._update_positions()
+
+    def _update_positions(self) -> None:
+        # порядок обслуживания без учёта лимитов: приоритеты, внутри — по кругу между пользователями
+        position = 0
+        for priority in sorted(self._queues):
+            queues = [list(q) for q in self._queues[priority].values()]
+            depth = max((len(q) for q in queues), default=0)
+            for i in range(depth):
+                for q in queues:
+                    if i < len(q):
+                        position += 1
+                        job = q[i]
+                        if job.position != position:
+                            job.position = position
+                            job.wakeup.set()
+
+    def _finish(self, job: _Job) -> None:
+        if job.state != "running":
+            return
+        job.state = "done"
+        self._forget_key(job)
+        self._running -= 1
+        for counter, ident in ((self._user_running, job.user_id), (self._chat_running, job.chat_id)):
+            counter[ident] -= 1
+            if counter[ident] <= 0:
+                del counter[ident]
+        self._dispatch()
+
+    @staticmethod
+    async def _notify(on_position: Callable[[int], Awaitable[None]], position: int) -> None:
+        try:
+            await on_position(position)
+        except Exception as e:
+            logger.warning("Queue position callback failed: %s", e)
@@ -0,0 +1,128 @@
+import hashlib
+import string
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+_ALPHABET = string.digits + string.ascii_letters
+
+
+def base62(number: int) -> str:
+    if number == 0:
+        return _ALPHABET[0]
+    digits = []
+    while number:
+        number, rem = divmod(number, 62)
+        digits.append(_ALPHABET[rem])
+    return "".join(reversed(digits))
+
+
+def short_key(text: str, length: int = 12) -> str:
+    """Короткий ключ из sha256(text) в base62: 12 символов — около 71 бита, коллизии не грозят."""
+    digest = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest(), "big")
+    return base62(digest % 62 ** length).rjust(length, _ALPHABET[0])
+
+
+class _Session:
+    __slots__ = ("expires_at", "playlist", "pages")
+
+    def __init__(self, expires_at: float, playlist: Optional[str]):
+        self.expires_at = expires_at
+        self.playlist = playlist
+        self.pages: Dict[int, Any] = {}
+
+
+class SearchSessions:
+    """
+    Панели результатов поиска для callback_data: "play:3fZk9aQx01Lm:12" вместо "play:<sha256>:12"
+    (Telegram принимает не больше 64 байт). id панели — это сам ключ search_cache (short_key запроса),
+    поэтому кнопки работают и после перезапуска, и в другом процессе с общим SQLite-кэшем,
+    пока в кэше лежат результаты. Здесь хранится только то, что можно потерять: построенные страницы
+    клавиатуры (чтобы листание не пересобирало кнопки) и название плейлиста.
+    LRU на OrderedDict: поиск, продление и вытеснение за O(1), не больше max_sessions сессий.
+    Сессия живёт ttl секунд с момента, когда под её ключом сохранили результаты (как запись кэша).
+    Используется только из asyncio loop.
+    """
+    def __init__(self, max_sessions: int = 10_000, ttl: float = 3600):
+        self._max_sessions = max_sessions
+        self._ttl = ttl
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.evictions = 0
+
+    def open(self, cache_key: str, fresh: bool = False, playlist: Optional[str] = None) -> str:
+        """
+        id сессии для результатов под cache_key (он же и есть id). fresh=True — результаты только что
+        сохранены заново: страницы перестраиваются, срок жизни отсчитывается с нуля.
+        playlist — название, если результаты это треки одного плейлиста (их можно скачать все разом).
+        """
+        session = self._get(cache_key)
+        if session is None:
+            self._add(cache_key, playlist)
+        elif fresh:
+            session.pages.clear()
+            session.expires_at = time.monotonic() + self._ttl
+            session.playlist = playlist
+        return cache_key
+
+    def _add(self, session_id: str, playlist: Optional[str]) -> _Session:
+        session = self._sessions[session_id] = _Session(time.monotonic() + self._ttl, playlist)
+        while self._max_sessions and len(self._sessions) > self._max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return session
+
+    def _get(self, session_id: str) -> Optional[_Session]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if session.expires_at <= time.monotonic():
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._get(session_id) is not None
+
+    def playlist(self, session_id: str) -> Optional[str]:
+        """Название плейлиста сессии или None (результаты поиска, одиночный трек, сессия не в памяти)."""
+        session = self._get(session_id)
+        return session.playlist if session is not None else None
+
+    def has_page(self, session_id: str, page: int) -> bool:
+        session = self._get(session_id)
+        return session is not None and page in session.pages
+
+    def page(self, session_id: str, page: int, build: Callable[[], Any], playlist: Optional[str] = None) -> Any:
+        """
+        Готовая страница клавиатуры; при первом обращении строится build() и запоминается.
+        Сессии, которой нет в памяти (панель из другого процесса или до перезапуска), заводится заново
+        с названием плейлиста playlist, если build() смог собрать страницу из кэша.
+        None — результатов в кэше уже нет.
+        """
+        session = self._get(session_id)
+        markup = session.pages.get(page) if session is not None else None
+        if markup is None:
+            markup = build()
+            if markup is not None:
+                if session is None:
+                    session = self._add(session_id, playlist)
+                session.pages[page] = markup
+        return markup
+
+    def sweep(self) -> int:
+        now = time.monotonic()
+        expired = [sid for sid, s in self._sessions.items() if s.expires_at <= now]
+        for session_id in expired:
+            del self._sessions[session_id]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "pages": sum(len(s.pages) for s in self._sessions.values()),
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,87 @@
+import math
+from typing import Optional
+
+# Стандартные битрейты MP3/AAC (кбит/с), из которых выбирается подходящий по размеру
+STANDARD_BITRATES = (320, 256, 224, 192, 160, 128, 112, 96, 80, 64, 56, 48, 40, 32)
+# Запас на контейнер, теги и неточность оценки
+SIZE_MARGIN = 0.95
+
+
+class DeliveryRejected(Exception):
+    """Трек не уложить в лимит Telegram даже частями — загрузку не начинаем."""
+
+
+def estimate_bytes(duration: float, bitrate: int) -> int:
+    """Размер аудио с постоянным битрейтом (кбит/с) длительностью duration секунд."""
+    return int(duration * bitrate * 1000 / 8)
+
+
+def _fit_bitrate(duration: float, limit: int, ceiling: int) -> Optional[int]:
+    """Наибольший стандартный битрейт не выше ceiling, при котором duration секунд укладываются в limit байт."""
+    for bitrate in STANDARD_BITRATES:
+        if bitrate <= ceiling and estimate_bytes(duration, bitrate) <= limit * SIZE_MARGIN:
+            return bitrate
+    return None
+
+
+class DeliveryPlan:
+    """
+    Как отдать трек в пределах лимита на загрузку:
+    passthrough — можно ли отправить исходник без перекодирования;
+    bitrate — битрейт перекодирования (кбит/с); parts — на сколько частей резать (1 — не резать).
+    """
+    __slots__ = ("passthrough", "bitrate", "parts", "estimated_size")
+
+    def __init__(self, passthrough: bool, bitrate: int, parts: int = 1, estimated_size: Optional[int] = None):
+        self.passthrough = passthrough
+        self.bitrate = bitrate
+        self.parts = parts
+        self.estimated_size = estimated_size
+
+    def __repr__(self) -> str:
+        return (
+            f"DeliveryPlan(passthrough={self.passthrough}, bitrate={self.bitrate}, "
+            f"parts={self.parts}, estimated_size={self.estimated_size})"
+        )
+
+
+def plan_delivery(
+    duration: Optional[float],
+    limit: int,
+    bitrate: int,
+    min_bitrate: int = 64,
+    max_parts: int = 1,
+    passthrough: bool = False,
+    source_size: Optional[int] = None,
+) -> DeliveryPlan:
+    """
+    Выбирает способ доставки до скачивания, по длительности и (если известен) размеру исходника:
+    1) исходник как есть, если passthrough разрешён и он меньше лимита;
+    2) перекодирование с заданным битрейтом;
+    3) перекодирование с пониженным битрейтом (не ниже min_bitrate);
+    4) нарезка на части с заданным битрейтом, если частей не больше max_parts;
+    5) нарезка на max_parts частей с пониженным битрейтом.
+    Если не подходит ничего — DeliveryRejected. Без длительности оценить нечего: план по умолчанию.
+    """
+    if passthrough and source_size is not None and source_size <= limit * SIZE_MARGIN:
+        return DeliveryPlan(True, bitrate, 1, source_size)
+    if not duration or not limit:
+        return DeliveryPlan(passthrough and source_size is None, bitrate, 1, source_size)
+    size = estimate_bytes(duration, bitrate)
+    if size <= limit * SIZE_MARGIN:
+        # исходник неизвестного размера при passthrough проверяется уже после скачивания
+        return DeliveryPlan(passthrough and source_size is None, bitrate, 1, size)
+    fitted = _fit_bitrate(duration, limit, bitrate)
+    if fitted is not None and fitted >= min_bitrate:
+        return DeliveryPlan(False, fitted, 1, estimate_bytes(duration, fitted))
+    if max_parts > 1:
+        parts = math.ceil(size / (limit * SIZE_MARGIN))
+        if parts <= max_parts:
+            return DeliveryPlan(False, bitrate, parts, size)
+        fitted = _fit_bitrate(duration / max_parts, limit, bitrate)
+        if fitted is not None and fitted >= min_bitrate:
+            return DeliveryPlan(False, fitted, max_parts, estimate_bytes(duration, fitted))
+    raise DeliveryRejected(
+        f"{int(duration // 60)} мин не укладываются в {limit // (1024 * 1024)} МБ"
+        + (f" даже в {max_parts} частях" if max_parts > 1 else "")
+    )
@@ -0,0 +1,186 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Исходы вызова источника; error и timeout считаются отказами для автомата
+OUTCOMES = ("ok", "empty", "error", "timeout")
+_FAILURES = ("error", "timeout")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class _Source:
+    __slots__ = ("samples", "state", "opened_at", "cooldown", "consecutive_failures", "probe_in_flight", "skipped")
+
+    def __init__(self, window: int):
+        # (латентность, исход, число результатов) последних window вызовов
+        self.samples: Deque[Tuple[float, str, int]] = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        self.skipped = 0
+
+
+class SourceHealth:
+    """
+    Скользящая статистика по поисковым источникам (латентность, доля ошибок и пустых ответов)
+    и circuit breaker на каждый источник.
+
+    Источник выключается (open) после failure_threshold отказов подряд или если в окне из
+    не менее min_samples вызовов доля отказов достигла error_rate. Через cooldown секунд
+    пропускается один пробный запрос (half_open): успех включает источник, отказ выключает
+    снова с удвоенным cooldown (не больше max_cooldown).
+    По той же статистике источники упорядочиваются (быстрые и результативные — первыми),
+    и между ними делится квота результатов.
+    """
+    def __init__(
+        self,
+        window: int = 50,
+        failure_threshold: int = 3,
+        error_rate: float = 0.5,
+        min_samples: int = 10,
+        cooldown: float = 60.0,
+        max_cooldown: float = 900.0,
+    ):
+        self._window = max(1, window)
+        self._failure_threshold = max(1, failure_threshold)
+        self._error_rate = error_rate
+        self._min_samples = max(1, min_samples)
+        self._cooldown = cooldown
+        self._max_cooldown = max(cooldown, max_cooldown)
+        self._sources: Dict[str, _Source] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, prefix: str) -> _Source:
+        source = self._sources.get(prefix)
+        if source is None:
+            source = self._sources[prefix] = _Source(self._window)
+        return source
+
+    def _open(self, source: _Source, now: float) -> None:
+        if source.state == HALF_OPEN:
+            source.cooldown = min(source.cooldown * 2, self._max_cooldown)
+        else:
+            source.cooldown = self._cooldown
+        source.state = OPEN
+        source.opened_at = now
+        source.probe_in_flight = False
+
+    def record(self, prefix: str, latency: float, outcome: str, count: int = 0) -> None:
+        now = time.monotonic()
+        with self._lock:
+            source = self._get(prefix)
+            source.samples.append((latency, outcome, count))
+            if outcome in _FAILURES:
+                source.consecutive_failures += 1
+            else:
+                source.consecutive_failures = 0
+            if source.state == HALF_OPEN:
+                if outcome in _FAILURES:
+                    self._open(source, now)
+                else:
+                    source.state = CLOSED
+                    source.probe_in_flight = False
+                    # после восстановления старые отказы не должны сразу выключить источник снова
+                    source.samples.clear()
+                    source.samples.append((latency, outcome, count))
+                return
+            if source.state != CLOSED:
+                return
+            if source.consecutive_failures >= self._failure_threshold:
+                self._open(source, now)
+                return
+            if len(source.samples) >= self._min_samples:
+                failures = sum(1 for _, o, _ in source.samples if o in _FAILURES)
+                if failures / len(source.samples) >= self._error_rate:
+                    self._open(source, now)
+
+    def allow(self, prefix: str) -> bool:
+        """Можно ли опрашивать источник сейчас. Для half_open разрешает ровно один пробный запрос."""
+        now = time.monotonic()
+        with self._lock:
+            source = self._get(prefix)
+            if source.state == OPEN and now - source.opened_at >= source.cooldown:
+                source.state = HALF_OPEN
+                source.probe_in_flight = False
+            if source.state == CLOSED:
+                return True
+            if source.state == HALF_OPEN and not source.probe_in_flight:
+                source.probe_in_flight = True
+                return True
+            source.skipped += 1
+            return False
+
+    def release(self, prefix: str) -> None:
+        """Пробный запрос отменён без результата (поиск завершился раньше) — следующий поиск попробует снова."""
+        with self._lock:
+            source = self._sources.get(prefix)
+            if source is not None and source.state == HALF_OPEN:
+                source.probe_in_flight = False
+
+    def _score(self, source: Optional[_Source], default_latency: float) -> float:
+        """Ожидаемое число непустых ответов в секунду; без данных — нейтральные априорные значения."""
+        samples = list(source.samples) if source is not None else []
+        ok = [s for s in samples if s[1] == "ok"]
+        # сглаживание Лапласа: новый источник получает шанс 50% на непустой ответ
+        success = (len(ok) + 1) / (len(samples) + 2)
+        # быстрые отказы не должны выглядеть быстрым источником
+        latencies = sorted(s[0] for s in samples if s[1] in ("ok", "empty"))
+        latency = latencies[len(latencies) // 2] if latencies else default_latency
+        return success / max(latency, 0.05)
+
+    def rank(self, sources: List[str], default_latency: float = 2.0) -> List[str]:
+        """Источники по убыванию score; при равенстве — в исходном порядке."""
+        with self._lock:
+            scores = [self._score(self._sources.get(p), default_latency) for p in sources]
+        order = sorted(range(len(sources)), key=lambda i: (-scores[i], i))
+        return [sources[i] for i in order]
+
+    def allocate(self, sources: List[str], total: int, minimum: int = 5) -> Dict[str, int]:
+        """
+        Делит квоту результатов между источниками пропорционально доле непустых ответов:
+        источник, который обычно возвращает пустоту, не должен занимать место быстрых.
+        """
+        if not sources:
+            return {}
+        with self._lock:
+            weights = []
+            for prefix in sources:
+                samples = list(self._sources[prefix].samples) if prefix in self._sources else []
+                ok = sum(1 for s in samples if s[1] == "ok")
+                weights.append((ok + 1) / (len(samples) + 2))
+        norm = sum(weights)
+        return {
+            prefix: max(minimum, math.ceil(total * weight / norm) + 2)
+            for prefix, weight in zip(sources, weights)
+        }
+
+    def snapshot(self) -> Dict[str, Dict[str, object]]:
+        """Текущее состояние источников для админ-команды и метрик."""
+        now = time.monotonic()
+        result = {}
+        with self._lock:
+            for prefix, source in self._sources.items():
+                samples = list(source.samples)
+                n = len(samples)
+                counts = {o: sum(1 for s in samples if s[1] == o) for o in OUTCOMES}
+                latencies = sorted(s[0] for s in samples if s[1] != "timeout")
+                retry_in = 0.0
+                if source.state == OPEN:
+                    retry_in = max(0.0, source.opened_at + source.cooldown - now)
+                result[prefix] = {
+                    "state": source.state,
+                    "samples": n,
+                    "error_rate": (counts["error"] + counts["timeout"]) / n if n else 0.0,
+                    "empty_rate": counts["empty"] / n if n else 0.0,
+                    "p50": latencies[len(latencies) // 2] if latencies else None,
+                    "p90": latencies[min(len(latencies) - 1, int(len(latencies) * 0.9))] if latencies else None,
+                    "avg_results": sum(s[2] for s in samples) / n if n else 0.0,
+                    "skipped": source.skipped,
+                    "retry_in": retry_in,
+                }
+        return result
@@ -0,0 +1,30 @@
+import os
+import sys
+import types
+
+import pytest
+
+# модули бота лежат в корне репозитория, а не в пакете
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache  # noqa: E402
+import sessions  # noqa: E402
+import source_health  # noqa: E402
+import track_store  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # одни часы для time.time и time.monotonic во всех модулях со сроками жизни и окнами; тест двигает clock.now
+    fake = FakeClock()
+    for module in (cache, sessions, source_health, track_store):
+        monkeypatch.setattr(module, "time", types.SimpleNamespace(monotonic=fake, time=fake))
+    return fake
@@ -0,0 +1,129 @@
+from cache import SQLiteCache, TTLCache, encode_value
+from track import Track, decode_results, encode_results, encode_tracks
+
+
+def test_get_set_and_counters(clock):
+    c = TTLCache(ttl=60)
+    assert c.get("a") is None
+    c.set("a", [1, 2])
+    assert c.get("a") == [1, 2]
+    stats = c.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_expired_entry_is_a_miss(clock):
+    c = TTLCache(ttl=60)
+    c.set("a", "x")
+    clock.now += 61
+    assert c.get("a") is None
+    assert len(c) == 0
+    assert c.stats()["expirations"] == 1
+
+
+def test_lru_eviction_by_entries(clock):
+    c = TTLCache(ttl=60, max_entries=2)
+    c.set("a", 1)
+    c.set("b", 2)
+    # "a" использован последним — вытесняется "b"
+    assert c.get("a") == 1
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+
+
+def test_eviction_by_bytes(clock):
+    c = TTLCache(ttl=60, max_bytes=10, sizeof=lambda value: value)
+    c.set("a", 4)
+    c.set("b", 4)
+    c.set("c", 4)
+    assert c.get("a") is None
+    assert c.stats()["bytes"] == 8
+
+
+def test_overwrite_keeps_byte_count(clock):
+    c = TTLCache(ttl=60, max_bytes=100, sizeof=lambda value: value)
+    c.set("a", 10)
+    c.set("a", 20)
+    assert c.stats()["bytes"] == 20
+    assert len(c) == 1
+
+
+def test_sweep_removes_only_expired(clock):
+    c = TTLCache(ttl=60)
+    c.set("old", 1)
+    clock.now += 30
+    c.set("new", 2)
+    clock.now += 40
+    assert c.sweep() == 1
+    assert c.get("old") is None
+    assert c.get("new") == 2
+
+
+def test_results_keep_playlist_title(tmp_path):
+    c = SQLiteCache(str(tmp_path / "cache.db"), encode=encode_results, decode=decode_results)
+    c.set("pl", ("Album", [Track(id="1", title="Only track", source="Youtube")]))
+    playlist, tracks = c.get("pl")
+    assert playlist == "Album"
+    assert [t.title for t in tracks] == ["Only track"]
+    assert tracks[0].source == "Youtube"
+    c.set("q", (None, []))
+    assert c.get("q") == (None, [])
+
+
+def test_results_of_old_format_are_a_miss(tmp_path):
+    c = SQLiteCache(str(tmp_path / "cache.db"), encode=encode_results, decode=decode_results)
+    # запись, сохранённая до появления названия плейлиста: только список треков
+    c._conn.execute(
+        "INSERT INTO cache (key, expires_at, value) VALUES (?, ?, ?)",
+        ("pl", 2e9, encode_tracks([Track(id="1")])),
+    )
+    assert c.get("pl") is None
+    assert len(c) == 0
+
+
+def test_sqlite_expired_entry_is_a_miss(clock, tmp_path):
+    c = SQLiteCache(str(tmp_path / "cache.db"), ttl=60)
+    c.set("a", [1, 2])
+    assert c.get("a") == [1, 2]
+    clock.now += 61
+    assert c.get("a") is None
+    assert c.sweep() == 1
+    assert len(c) == 0
+    stats = c.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["expirations"] == 1
+
+
+def test_sqlite_sweep_evicts_beyond_max_entries(clock, tmp_path):
+    c = SQLiteCache(str(tmp_path / "cache.db"), ttl=60, max_entries=2)
+    for key in ("a", "b", "c"):
+        c.set(key, key)
+        clock.now += 1
+    assert c.sweep() == 0
+    # раньше всех истекает самая старая запись — она и вытесняется
+    assert c.get("a") is None
+    assert c.get("b") == "b"
+    assert c.get("c") == "c"
+    assert c.stats()["evictions"] == 1
+
+
+def test_sqlite_corrupt_entry_is_a_miss(tmp_path):
+    c = SQLiteCache(str(tmp_path / "cache.db"), encode=encode_results, decode=decode_results)
+    rows = {
+        "garbage": b"jnot json",
+        "truncated": b"z" + b"\x00" * 8,
+        # строка трека с чужим числом полей: Track(*row) бросает TypeError
+        "wrong_row": encode_value({"playlist": None, "tracks": [["1"] * 10]}),
+    }
+    for key, blob in rows.items():
+        c._conn.execute("INSERT INTO cache (key, expires_at, value) VALUES (?, ?, ?)", (key, 2e9, blob))
+    for key in rows:
+        assert c.get(key) is None
+    assert len(c) == 0
+    assert c.stats()["hits"] == 0
+    assert c.stats()["misses"] == 3
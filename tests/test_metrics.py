@@ -0,0 +1,47 @@
+import logging
+
+from metrics import Registry, labels
+
+
+def test_on_loop_callback_serves_last_snapshot():
+    state = {"sessions": 1}
+    calls = []
+
+    def read():
+        calls.append(1)
+        return {labels(unit=k): v for k, v in state.items()}
+
+    reg = Registry()
+    reg.gauge_callback("bot_sessions", "Sessions", read, on_loop=True)
+    # до первого снимка метрики нет, а сбор не трогает состояние loop
+    assert "bot_sessions{" not in reg.render()
+    assert calls == []
+    reg.refresh()
+    state["sessions"] = 2
+    assert 'bot_sessions{unit="sessions"} 1' in reg.render()
+    reg.refresh()
+    assert 'bot_sessions{unit="sessions"} 2' in reg.render()
+    assert len(calls) == 2
+
+
+def test_plain_callback_is_read_at_scrape_time():
+    value = [1]
+    reg = Registry()
+    reg.gauge_callback("bot_bytes", "Bytes", lambda: value[0])
+    value[0] = 5
+    assert "bot_bytes 5" in reg.render()
+
+
+def test_failing_callback_is_logged(caplog):
+    def broken():
+        raise RuntimeError("dictionary changed size during iteration")
+
+    reg = Registry()
+    reg.gauge_callback("bot_broken", "Broken", broken)
+    reg.gauge_callback("bot_ok", "Ok", lambda: 1)
+    with caplog.at_level(logging.ERROR, logger="metrics"):
+        text = reg.render()
+    assert "bot_broken" not in text
+    assert "bot_ok 1" in text
+    assert "bot_broken" in caplog.text
+    assert "RuntimeError" in caplog.text
@@ -0,0 +1,19 @@
+from prefetch import PrefetchHolds
+
+
+def test_ready_only_after_successful_finish():
+    holds = PrefetchHolds(ttl=60)
+    assert holds.hold("a", group=1)
+    assert "a" in holds and not holds.ready("a")
+    assert holds.finish("a", 1000)
+    assert holds.ready("a")
+    assert holds.release_group(1) == ["a"]
+    assert not holds.ready("a")
+
+
+def test_dropped_running_download_is_never_ready():
+    holds = PrefetchHolds(ttl=60)
+    holds.hold("a", group=1)
+    assert holds.release_group(1) == []
+    assert not holds.finish("a", 1000)
+    assert not holds.ready("a")
@@ -0,0 +1,186 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from rate_limiter import PRIORITY_AUDIO, TelegramRateLimiter, TokenBucket
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def recorder(log, name, result=None):
+    async def callback(*args, **kwargs):
+        log.append(name)
+        return result if result is not None else name
+    return callback
+
+
+async def request(limiter, callback, endpoint, chat_id=1, message_id=None, rate_limit_args=None):
+    data = {"chat_id": chat_id}
+    if message_id is not None:
+        data["message_id"] = message_id
+    return await limiter.process_request(callback, (), {}, endpoint, data, rate_limit_args)
+
+
+def test_token_bucket_refills():
+    bucket = TokenBucket(rate=2, burst=1)
+    now = time.monotonic()
+    assert bucket.delay(now) == 0
+    bucket.take(now)
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.5) == 0
+
+
+def test_token_bucket_ignores_time_before_creation():
+    earlier = time.monotonic()
+    bucket = TokenBucket(rate=1, burst=1)
+    assert bucket.delay(earlier) == 0
+
+
+def test_audio_goes_before_replies_and_status_edits():
+    async def scenario():
+        # на чат один токен, следующий через 50 мс: очередь выстраивается по приоритету
+        limiter = TelegramRateLimiter(global_rate=100, chat_rate=20, burst=1)
+        await limiter.initialize()
+        log = []
+        tasks = [
+            asyncio.create_task(request(limiter, recorder(log, "edit"), "editMessageText", message_id=7)),
+            asyncio.create_task(request(limiter, recorder(log, "reply"), "sendMessage")),
+            asyncio.create_task(request(limiter, recorder(log, "audio"), "sendAudio")),
+        ]
+        await asyncio.gather(*tasks)
+        await limiter.shutdown()
+        return log
+
+    assert run(scenario()) == ["audio", "reply", "edit"]
+
+
+def test_rate_limit_args_override_priority():
+    async def scenario():
+        limiter = TelegramRateLimiter(global_rate=100, chat_rate=20, burst=1)
+        await limiter.initialize()
+        log = []
+        tasks = [
+            asyncio.create_task(request(limiter, recorder(log, "reply"), "sendMessage")),
+            asyncio.create_task(
+                request(limiter, recorder(log, "urgent"), "editMessageText", message_id=1, rate_limit_args=PRIORITY_AUDIO)
+            ),
+        ]
+        await asyncio.gather(*tasks)
+        await limiter.shutdown()
+        return log
+
+    assert run(scenario()) == ["urgent", "reply"]
+
+
+def test_blocked_chat_does_not_hold_other_chats():
+    async def scenario():
+        limiter = TelegramRateLimiter(global_rate=100, chat_rate=1, burst=1)
+        await limiter.initialize()
+        log = []
+        await request(limiter, recorder(log, "a1"), "sendMessage", chat_id=1)
+        slow = asyncio.create_task(request(limiter, recorder(log, "a2"), "sendMessage", chat_id=1))
+        await request(limiter, recorder(log, "b1"), "sendMessage", chat_id=2)
+        order = list(log)
+        await slow
+        await limiter.shutdown()
+        return order, limiter.counters
+
+    order, counters = run(scenario())
+    assert order == ["a1", "b1"]
+    assert counters["throttled"] == 1
+
+
+def test_queued_edits_of_one_message_are_merged():
+    async def scenario():
+        limiter = TelegramRateLimiter(global_rate=100, chat_rate=20, burst=1)
+        await limiter.initialize()
+        log = []
+        tasks = [
+            asyncio.create_task(request(limiter, recorder(log, "send"), "sendMessage")),
+            asyncio.create_task(request(limiter, recorder(log, "edit1"), "editMessageText", message_id=5)),
+            asyncio.create_task(request(limiter, recorder(log, "edit2"), "editMessageText", message_id=5)),
+        ]
+        results = await asyncio.gather(*tasks)
+        await limiter.shutdown()
+        return log, results, limiter.counters
+
+    log, results, counters = run(scenario())
+    assert log == ["send", "edit2"]
+    # оба вызывающих получают результат отправленной правки
+    assert results == ["send", "edit2", "edit2"]
+    assert counters["merged"] == 1
+
+
+def test_retry_after_is_retried():
+    async def scenario():
+        limiter = TelegramRateLimiter(max_retries=2)
+        await limiter.initialize()
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RetryAfter(0)
+            return "ok"
+
+        result = await request(limiter, flaky, "sendMessage")
+        await limiter.shutdown()
+        return result, len(attempts), limiter.counters
+
+    result, attempts, counters = run(scenario())
+    assert result == "ok"
+    assert attempts == 2
+    assert counters["retried"] == 1
+    assert counters["failed"] == 0
+
+
+def test_retry_after_gives_up_after_max_retries():
+    async def scenario():
+        limiter = TelegramRateLimiter(max_retries=1)
+        await limiter.initialize()
+
+        async def flood():
+            raise RetryAfter(0)
+
+        try:
+            with pytest.raises(RetryAfter):
+                await request(limiter, flood, "sendMessage")
+        finally:
+            await limiter.shutdown()
+        return limiter.counters
+
+    counters = run(scenario())
+    assert counters["retried"] == 1
+    assert counters["failed"] == 1
+
+
+def test_unlimited_endpoints_bypass_the_queue():
+    async def scenario():
+        limiter = TelegramRateLimiter(global_rate=100, chat_rate=0.1, burst=1)
+        await limiter.initialize()
+        log = []
+        await request(limiter, recorder(log, "send"), "sendMessage")
+        # чат исчерпал лимит, но ответ на нажатие уходит сразу
+        await asyncio.wait_for(request(limiter, recorder(log, "answer"), "answerCallbackQuery"), timeout=1)
+        await limiter.shutdown()
+        return log
+
+    assert run(scenario()) == ["send", "answer"]
+
+
+def test_initialize_twice_starts_one_dispatcher():
+    async def scenario():
+        limiter = TelegramRateLimiter()
+        # Application.initialize() инициализирует бота напрямую и через Updater
+        await limiter.initialize()
+        first = limiter._dispatcher
+        await limiter.initialize()
+        same = limiter._dispatcher is first
+        await limiter.shutdown()
+        return same, first.done()
+
+    assert run(scenario()) == (True, True)
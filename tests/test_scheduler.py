@@ -0,0 +1,246 @@
+import asyncio
+
+import pytest
+
+from scheduler import DownloadScheduler, JobCancelled, QueueFull
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def _settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_round_robin_between_users():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0)
+        order = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def factory():
+                order.append(name)
+                await gate.wait()
+            return factory
+
+        tasks = [asyncio.create_task(scheduler.submit(1, 1, job("a1")))]
+        await _settle()
+        for user, name in ((1, "a2"), (1, "a3"), (1, "a4"), (2, "b1")):
+            tasks.append(asyncio.create_task(scheduler.submit(user, user, job(name))))
+        await _settle()
+        gate.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    order = run(scenario())
+    # второй пользователь не ждёт, пока отработает вся очередь первого
+    assert order.index("b1") < order.index("a3")
+    assert order[0] == "a1"
+
+
+def test_per_user_limit_lets_other_users_run():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=2, per_user=1, per_chat=0)
+        running = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def factory():
+                running.append(name)
+                await gate.wait()
+            return factory
+
+        tasks = [
+            asyncio.create_task(scheduler.submit(1, 1, job("a1"))),
+            asyncio.create_task(scheduler.submit(1, 1, job("a2"))),
+            asyncio.create_task(scheduler.submit(2, 2, job("b1"))),
+        ]
+        await _settle()
+        started = list(running)
+        gate.set()
+        await asyncio.gather(*tasks)
+        return started
+
+    assert sorted(run(scenario())) == ["a1", "b1"]
+
+
+def test_priority_is_served_first():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0)
+        order = []
+        gate = asyncio.Event()
+
+        def job(name):
+            async def factory():
+                order.append(name)
+                await gate.wait()
+            return factory
+
+        tasks = [asyncio.create_task(scheduler.submit(1, 1, job("first")))]
+        await _settle()
+        tasks.append(asyncio.create_task(scheduler.submit(2, 2, job("background"), priority=5)))
+        tasks.append(asyncio.create_task(scheduler.submit(3, 3, job("normal"))))
+        await _settle()
+        gate.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert run(scenario()) == ["first", "normal", "background"]
+
+
+def test_queue_full_is_rejected():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0, max_queue=1)
+        gate = asyncio.Event()
+
+        async def factory():
+            await gate.wait()
+
+        running = asyncio.create_task(scheduler.submit(1, 1, factory))
+        await _settle()
+        queued = asyncio.create_task(scheduler.submit(2, 2, factory))
+        await _settle()
+        with pytest.raises(QueueFull):
+            await scheduler.submit(3, 3, factory)
+        gate.set()
+        await asyncio.gather(running, queued)
+        return scheduler.stats()
+
+    assert run(scenario())["rejected"] == 1
+
+
+def test_cancel_group_drops_only_queued_jobs_of_the_group():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0)
+        gate = asyncio.Event()
+        done = []
+
+        def job(name):
+            async def factory():
+                await gate.wait()
+                done.append(name)
+            return factory
+
+        running = asyncio.create_task(scheduler.submit(1, 1, job("running"), group="panel"))
+        await _settle()
+        queued = asyncio.create_task(scheduler.submit(1, 1, job("queued"), group="panel"))
+        other = asyncio.create_task(scheduler.submit(2, 2, job("other"), group="other"))
+        pinned = asyncio.create_task(scheduler.submit(3, 3, job("pinned")))
+        await _settle()
+        assert scheduler.cancel_group("panel") == 1
+        gate.set()
+        results = await asyncio.gather(running, queued, other, pinned, return_exceptions=True)
+        return results, done, scheduler.stats()
+
+    results, done, stats = run(scenario())
+    assert isinstance(results[1], JobCancelled)
+    assert sorted(done) == ["other", "pinned", "running"]
+    assert stats["cancelled"] == 1
+    assert stats["queued"] == 0 and stats["running"] == 0
+
+
+def test_attached_group_keeps_job_until_all_groups_close():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0)
+        gate = asyncio.Event()
+
+        async def factory():
+            await gate.wait()
+            return "ok"
+
+        running = asyncio.create_task(scheduler.submit(1, 1, factory))
+        await _settle()
+        shared = asyncio.create_task(scheduler.submit(2, 2, factory, key="track", group="p1"))
+        await _settle()
+        scheduler.attach("track", "p2")
+        first = scheduler.cancel_group("p1")
+        second = scheduler.cancel_group("p2")
+        gate.set()
+        results = await asyncio.gather(running, shared, return_exceptions=True)
+        return first, second, results
+
+    first, second, results = run(scenario())
+    assert first == 0
+    assert second == 1
+    assert isinstance(results[1], JobCancelled)
+
+
+def test_on_position_reports_queue_position_and_start():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0)
+        gate = asyncio.Event()
+        positions = []
+
+        async def factory():
+            await gate.wait()
+
+        async def on_position(n):
+            positions.append(n)
+
+        running = asyncio.create_task(scheduler.submit(1, 1, factory))
+        await _settle()
+        waiting = asyncio.create_task(scheduler.submit(2, 2, factory, on_position=on_position))
+        await _settle()
+        gate.set()
+        await asyncio.gather(running, waiting)
+        return positions
+
+    assert run(scenario()) == [1, 0]
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0)
+        gate = asyncio.Event()
+
+        async def factory():
+            await gate.wait()
+
+        running = asyncio.create_task(scheduler.submit(1, 1, factory))
+        await _settle()
+        waiting = asyncio.create_task(scheduler.submit(2, 2, factory))
+        await _settle()
+        waiting.cancel()
+        await _settle()
+        queued = scheduler.stats()["queued"]
+        gate.set()
+        await running
+        return queued, scheduler.stats()
+
+    queued, stats = run(scenario())
+    assert queued == 0
+    assert stats["running"] == 0
+
+
+def test_release_slot_lets_next_job_start_before_the_first_finishes():
+    async def scenario():
+        scheduler = DownloadScheduler(max_concurrent=1, per_user=0, per_chat=0)
+        started = []
+        transcode = asyncio.Event()
+
+        async def first():
+            started.append("first")
+            # скачивание закончилось, дальше трек ограничивает только стадия перекодирования
+            scheduler.release_slot()
+            scheduler.release_slot()
+            await transcode.wait()
+
+        async def second():
+            started.append("second")
+
+        tasks = [asyncio.create_task(scheduler.submit(1, 1, first))]
+        await _settle()
+        tasks.append(asyncio.create_task(scheduler.submit(2, 2, second)))
+        await _settle()
+        during = list(started)
+        transcode.set()
+        await asyncio.gather(*tasks)
+        return during, scheduler.stats()
+
+    during, stats = run(scenario())
+    assert during == ["first", "second"]
+    # повторное освобождение и завершение задачи не уводят счётчик в минус
+    assert stats["running"] == 0
@@ -0,0 +1,54 @@
+import contextlib
+import threading
+
+import music_downloader
+from metrics import SEARCH_SOURCE_RESULTS
+
+
+class FakePool:
+    def __init__(self, release: threading.Event):
+        self.release = release
+
+    @contextlib.contextmanager
+    def acquire(self):
+        yield self
+
+    def extract_info(self, url, download=False):
+        # url — "<prefix><count>:<query>"
+        prefix = url.rstrip("0123456789:q")
+        if prefix == "slow":
+            self.release.wait(5)
+        return {"entries": [{"id": f"{prefix}{i}", "title": "t", "webpage_url": f"{prefix}/{i}"} for i in range(2)]}
+
+
+def outcomes(source):
+    return {
+        dict(key)["outcome"]: value
+        for key, value in SEARCH_SOURCE_RESULTS._values.items()
+        if dict(key)["source"] == source
+    }
+
+
+def test_timed_out_source_is_counted_once(monkeypatch):
+    release = threading.Event()
+    pool = FakePool(release)
+    finished = threading.Event()
+    search_one = music_downloader._search_one_source
+
+    def search_and_signal(prefix, *args):
+        try:
+            return search_one(prefix, *args)
+        finally:
+            if prefix == "slow":
+                finished.set()
+
+    monkeypatch.setattr(music_downloader, "_search_pool", lambda timeout: pool)
+    monkeypatch.setattr(music_downloader, "_search_one_source", search_and_signal)
+    monkeypatch.setattr(SEARCH_SOURCE_RESULTS, "_values", {})
+    tracks = music_downloader.search_combined("q", ["fast", "slow"], max_results_total=10, source_timeouts={"slow": 0.05})
+    # опоздавший поток завершается уже после ответа и ничего не досчитывает
+    release.set()
+    assert finished.wait(5)
+    assert len(tracks) == 2
+    assert outcomes("slow") == {"timeout": 1}
+    assert outcomes("fast") == {"ok": 1}
@@ -0,0 +1,105 @@
+from sessions import SearchSessions, base62, short_key
+
+
+def test_base62():
+    assert base62(0) == "0"
+    assert base62(61) == "Z"
+    assert base62(62) == "10"
+
+
+def test_short_key_is_stable_and_short():
+    key = short_key("billie jean")
+    assert key == short_key("billie jean")
+    assert len(key) == 12
+    assert key.isalnum()
+    assert short_key("billie jean mj") != key
+
+
+def test_session_id_is_the_cache_key(clock):
+    key = short_key("query")
+    s = SearchSessions(ttl=60)
+    assert s.open(key) == key
+    assert s.open(key) == key
+    assert key in s
+
+
+def test_callback_data_fits_telegram_limit(clock):
+    sid = SearchSessions().open(short_key("q" * 500))
+    assert len(f"play:{sid}:29".encode()) <= 64
+
+
+def test_panel_survives_restart(clock):
+    key = short_key("query")
+    SearchSessions(ttl=60).open(key, playlist="Album")
+    # новый процесс: сессии в памяти нет, страница собирается из общего кэша
+    restarted = SearchSessions(ttl=60)
+    assert restarted.page(key, 1, lambda: "markup", playlist="Album") == "markup"
+    assert key in restarted
+    assert restarted.playlist(key) == "Album"
+    assert restarted.page(key, 1, lambda: "other") == "markup"
+
+
+def test_pages_are_built_once(clock):
+    s = SearchSessions(ttl=60)
+    sid = s.open("key")
+    builds = []
+
+    def build():
+        builds.append(1)
+        return "markup"
+
+    assert s.page(sid, 0, build) == "markup"
+    assert s.page(sid, 0, build) == "markup"
+    assert len(builds) == 1
+    # свежие результаты под тем же ключом — страницы перестраиваются
+    assert s.open("key", fresh=True) == sid
+    s.page(sid, 0, build)
+    assert len(builds) == 2
+
+
+def test_missing_results_are_not_cached(clock):
+    s = SearchSessions(ttl=60)
+    sid = s.open("key")
+    assert s.page(sid, 0, lambda: None) is None
+    assert s.page(sid, 0, lambda: "markup") == "markup"
+
+
+def test_expired_session(clock):
+    s = SearchSessions(ttl=60)
+    sid = s.open("key", playlist="Album")
+    s.page(sid, 0, lambda: "markup")
+    clock.now += 61
+    assert sid not in s
+    assert s.playlist(sid) is None
+    # результатов в кэше тоже нет
+    assert s.page(sid, 0, lambda: None) is None
+
+
+def test_sweep_drops_expired(clock):
+    s = SearchSessions(ttl=60)
+    s.open("old")
+    clock.now += 30
+    s.open("new")
+    clock.now += 40
+    assert s.sweep() == 1
+    assert len(s) == 1
+
+
+def test_lru_eviction(clock):
+    s = SearchSessions(max_sessions=2, ttl=60)
+    a = s.open("a")
+    b = s.open("b")
+    assert a in s
+    s.open("c")
+    assert b not in s
+    assert a in s
+    assert s.stats()["evictions"] == 1
+
+
+def test_has_page_only_after_it_was_built():
+    sessions = SearchSessions(max_sessions=10, ttl=60)
+    sid = sessions.open("key", fresh=True)
+    assert not sessions.has_page(sid, 0)
+    sessions.page(sid, 0, lambda: "markup")
+    assert sessions.has_page(sid, 0)
+    assert not sessions.has_page(sid, 1)
@@ -0,0 +1,70 @@
+import pytest
+
+from sizing import SIZE_MARGIN, DeliveryRejected, estimate_bytes, plan_delivery
+
+MB = 1024 * 1024
+LIMIT = 50 * MB
+
+
+def test_short_track_keeps_bitrate():
+    plan = plan_delivery(180, LIMIT, 192)
+    assert (plan.passthrough, plan.bitrate, plan.parts) == (False, 192, 1)
+    assert plan.estimated_size == estimate_bytes(180, 192)
+
+
+def test_small_source_is_sent_as_is():
+    plan = plan_delivery(180, LIMIT, 192, passthrough=True, source_size=5 * MB)
+    assert plan.passthrough
+    assert plan.estimated_size == 5 * MB
+
+
+def test_large_source_is_transcoded_instead_of_passthrough():
+    plan = plan_delivery(45 * 60, LIMIT, 192, passthrough=True, source_size=80 * MB)
+    assert not plan.passthrough
+    assert plan.bitrate == 128
+
+
+def test_unknown_source_size_is_checked_after_download():
+    plan = plan_delivery(180, LIMIT, 192, passthrough=True)
+    assert plan.passthrough
+
+
+def test_bitrate_lowered_to_fit():
+    # 45 мин при 192 кбит/с — 64.8 МБ, при 160 — 54 МБ (больше 95% лимита), при 128 — 43.2 МБ
+    plan = plan_delivery(45 * 60, LIMIT, 192)
+    assert (plan.bitrate, plan.parts) == (128, 1)
+
+
+def test_limit_boundary_includes_margin():
+    size = estimate_bytes(100, 192)
+    fits = int(size / SIZE_MARGIN) + 1
+    assert plan_delivery(100, fits, 192).bitrate == 192
+    assert plan_delivery(100, fits - 2, 192).bitrate == 160
+
+
+def test_split_keeps_bitrate_when_parts_allowed():
+    plan = plan_delivery(3 * 3600, LIMIT, 192, min_bitrate=64, max_parts=8)
+    assert (plan.bitrate, plan.parts) == (192, 6)
+
+
+def test_split_with_lower_bitrate_when_parts_capped():
+    plan = plan_delivery(3 * 3600, LIMIT, 192, min_bitrate=64, max_parts=4)
+    assert (plan.bitrate, plan.parts) == (128, 4)
+
+
+def test_min_bitrate_forces_split():
+    # 45 мин укладываются только в 128 кбит/с; с min_bitrate=160 трек режется
+    plan = plan_delivery(45 * 60, LIMIT, 192, min_bitrate=160, max_parts=4)
+    assert (plan.bitrate, plan.parts) == (192, 2)
+
+
+def test_rejected_when_nothing_fits():
+    with pytest.raises(DeliveryRejected):
+        plan_delivery(10 * 3600, LIMIT, 192, min_bitrate=64, max_parts=1)
+    with pytest.raises(DeliveryRejected):
+        plan_delivery(30 * 3600, LIMIT, 192, min_bitrate=64, max_parts=4)
+
+
+def test_unknown_duration_uses_default_plan():
+    plan = plan_delivery(None, LIMIT, 192)
+    assert (plan.bitrate, plan.parts) == (192, 1)
@@ -0,0 +1,79 @@
+from source_health import CLOSED, OPEN, SourceHealth
+
+
+def test_opens_after_consecutive_failures(clock):
+    health = SourceHealth(failure_threshold=3, cooldown=60)
+    for _ in range(2):
+        health.record("yt", 1.0, "error")
+    assert health.allow("yt")
+    health.record("yt", 1.0, "timeout")
+    assert not health.allow("yt")
+    assert health.snapshot()["yt"]["state"] == OPEN
+    assert health.snapshot()["yt"]["skipped"] == 1
+
+
+def test_success_resets_consecutive_failures(clock):
+    health = SourceHealth(failure_threshold=3, min_samples=100)
+    for outcome in ("error", "error", "ok", "error", "error"):
+        health.record("yt", 1.0, outcome)
+    assert health.allow("yt")
+
+
+def test_opens_on_error_rate(clock):
+    health = SourceHealth(failure_threshold=100, error_rate=0.5, min_samples=4)
+    for outcome in ("ok", "error", "ok", "error"):
+        health.record("sc", 1.0, outcome)
+    assert not health.allow("sc")
+
+
+def test_half_open_allows_a_single_probe(clock):
+    health = SourceHealth(failure_threshold=1, cooldown=60)
+    health.record("yt", 1.0, "error")
+    clock.now += 61
+    assert health.allow("yt")
+    assert not health.allow("yt")
+    health.record("yt", 0.5, "ok")
+    assert health.allow("yt")
+    assert health.snapshot()["yt"]["state"] == CLOSED
+
+
+def test_failed_probe_doubles_cooldown(clock):
+    health = SourceHealth(failure_threshold=1, cooldown=60, max_cooldown=100)
+    health.record("yt", 1.0, "error")
+    clock.now += 61
+    assert health.allow("yt")
+    health.record("yt", 1.0, "timeout")
+    clock.now += 61
+    assert not health.allow("yt")
+    clock.now += 40
+    # удвоенная пауза ограничена max_cooldown
+    assert health.allow("yt")
+
+
+def test_released_probe_can_be_retried(clock):
+    health = SourceHealth(failure_threshold=1, cooldown=60)
+    health.record("yt", 1.0, "error")
+    clock.now += 61
+    assert health.allow("yt")
+    health.release("yt")
+    assert health.allow("yt")
+
+
+def test_rank_prefers_fast_productive_sources(clock):
+    health = SourceHealth()
+    for _ in range(5):
+        health.record("slow", 1.0, "ok", 10)
+        health.record("fast", 0.5, "ok", 10)
+        health.record("empty", 0.5, "empty")
+    assert health.rank(["slow", "empty", "fast"]) == ["fast", "slow", "empty"]
+    # без статистики порядок сохраняется
+    assert health.rank(["b", "a"]) == ["b", "a"]
+
+
+def test_allocate_gives_productive_sources_more(clock):
+    health = SourceHealth()
+    for _ in range(8):
+        health.record("good", 1.0, "ok", 10)
+        health.record("bad", 1.0, "empty")
+    quota = health.allocate(["good", "bad"], total=30, minimum=5)
+    assert quota["good"] > quota["bad"] >= 5
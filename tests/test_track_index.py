@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+from track import Track
+from track_index import TrackIndex, tokenize
+
+
+def track(track_id: str, title: str, uploader: str = "") -> Track:
+    return Track(id=track_id, title=title, webpage_url=f"https://example.invalid/{track_id}", uploader=uploader, source="yt")
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = TrackIndex(str(tmp_path / "index.db"))
+    if not idx.enabled:
+        pytest.skip("SQLite FTS5 is not available")
+    yield idx
+    idx.close()
+
+
+def titles(tracks):
+    return [t.title for t in tracks]
+
+
+def test_yo_matches_both_spellings(index):
+    index.add([track("a", "Ёлка - Прованс"), track("b", "Ежик в тумане")])
+    for query in ("ёлка", "Ёлка прованс", "елка", "ЕЛКА", "прованс"):
+        assert titles(index.search(query)) == ["Ёлка - Прованс"], query
+    assert titles(index.search("ёжик")) == ["Ежик в тумане"]
+
+
+def test_latin_diacritics_are_folded(index):
+    index.add([track("a", "Café del Mar", "Beyoncé")])
+    for query in ("cafe", "café", "CAFÉ del", "beyonce", "Beyoncé"):
+        assert titles(index.search(query)) == ["Café del Mar"], query
+
+
+def test_old_index_is_rebuilt_with_folded_text(tmp_path):
+    path = str(tmp_path / "index.db")
+    TrackIndex(path).add([track("a", "Ёлка - Прованс")])
+    # индекс прежней версии: текст в FTS как есть, без fold()
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO tracks_fts(tracks_fts) VALUES ('delete-all')")
+    conn.execute("INSERT INTO tracks_fts(rowid, title, uploader) SELECT rowid, title, uploader FROM tracks")
+    conn.execute("PRAGMA user_version = 0")
+    conn.commit()
+    conn.close()
+    assert titles(TrackIndex(path).search("ёлка")) == ["Ёлка - Прованс"]
+
+
+def test_tokenize_drops_noise_and_folds():
+    assert tokenize("Ёлка — Прованс (Official Video)") == ["елка", "прованс"]
@@ -0,0 +1,57 @@
+import os
+
+from track_store import TrackStore
+
+
+def _audio(tmp_path, name: str, size: int) -> str:
+    path = tmp_path / "src" / f"{name}.mp3"
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(b"\0" * size)
+    return str(path)
+
+
+def test_file_id_survives_reopen(tmp_path):
+    db = str(tmp_path / "tracks.db")
+    store = TrackStore(db)
+    assert store.get_file_id("youtube", "a") is None
+    store.set_file_id("youtube", "a", "FILE_A")
+    store.close()
+    store = TrackStore(db)
+    assert store.get_file_id("youtube", "a") == "FILE_A"
+    store.forget_file_id("youtube", "a")
+    assert store.get_file_id("youtube", "a") is None
+
+
+def test_archive_evicts_least_recently_used_files(clock, tmp_path):
+    store = TrackStore(str(tmp_path / "tracks.db"), files_dir=str(tmp_path / "files"), max_bytes=250)
+    paths = {}
+    for track_id in ("a", "b", "c"):
+        paths[track_id] = store.put_file("youtube", track_id, _audio(tmp_path, track_id, 100))
+        clock.now += 1
+    # c не влез бы вместе с a и b: вытеснен самый давно использованный a
+    assert store.get_file("youtube", "a") is None
+    assert not os.path.exists(paths["a"])
+    assert store.get_file("youtube", "b") == paths["b"]
+    clock.now += 1
+    # b только что использован, поэтому следующим вытесняется c
+    store.put_file("youtube", "d", _audio(tmp_path, "d", 100))
+    assert store.get_file("youtube", "c") is None
+    assert store.get_file("youtube", "b") == paths["b"]
+    assert store.get_file("youtube", "d") is not None
+    assert sorted(os.listdir(tmp_path / "files")) == ["youtube_b.mp3", "youtube_d.mp3"]
+
+
+def test_evicted_file_keeps_file_id(clock, tmp_path):
+    store = TrackStore(str(tmp_path / "tracks.db"), files_dir=str(tmp_path / "files"), max_bytes=150)
+    store.set_file_id("youtube", "a", "FILE_A")
+    store.put_file("youtube", "a", _audio(tmp_path, "a", 100))
+    clock.now += 1
+    store.put_file("youtube", "b", _audio(tmp_path, "b", 100))
+    assert store.get_file("youtube", "a") is None
+    assert store.get_file_id("youtube", "a") == "FILE_A"
+
+
+def test_file_larger_than_the_archive_is_not_stored(tmp_path):
+    store = TrackStore(str(tmp_path / "tracks.db"), files_dir=str(tmp_path / "files"), max_bytes=50)
+    assert store.put_file("youtube", "big", _audio(tmp_path, "big", 100)) is None
+    assert os.listdir(tmp_path / "files") == []
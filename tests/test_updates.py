@@ -0,0 +1,90 @@
+import asyncio
+import importlib
+import json
+import time
+
+import pytest
+from telegram import Update
+from telegram.ext import ApplicationBuilder, ApplicationHandlerStop, TypeHandler
+from telegram.request import BaseRequest
+
+TOKEN = "123456:TEST-TOKEN"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "bot", "username": "test_bot"}
+
+
+class FakeRequest(BaseRequest):
+    """Bot API без сети: getMe отвечает ботом, остальные методы — True."""
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self):
+        return 1.0
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        result = BOT_USER if url.endswith("/getMe") else True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+
+@pytest.fixture(scope="module")
+def bot_main(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp("bot")
+    with pytest.MonkeyPatch.context() as mp:
+        # config.py читает окружение при импорте main
+        mp.setenv("BOT_TOKEN", TOKEN)
+        mp.setenv("TEMP_DIR", str(workdir / "tmp"))
+        mp.setenv("TRACK_DB_PATH", str(workdir / "tracks.db"))
+        mp.setenv("TRACK_INDEX_PATH", str(workdir / "track_index.db"))
+        mp.setenv("SEARCH_CACHE_BACKEND", "memory")
+        mp.setenv("METRICS_PORT", "0")
+        yield importlib.import_module("main")
+
+
+def _message(update_id: int, user_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"},
+            "text": "song",
+        },
+    }
+
+
+def test_updates_of_two_users_are_handled_concurrently(bot_main):
+    async def scenario():
+        app = bot_main.build_application(ApplicationBuilder().token(TOKEN).request(FakeRequest()))
+        downloading = asyncio.Event()
+        release = asyncio.Event()
+        answered = asyncio.Event()
+
+        async def handler(update: Update, context) -> None:
+            if update.effective_user.id == 1:
+                # как нажатие трека: обработчик ждёт всю загрузку
+                downloading.set()
+                await release.wait()
+            else:
+                answered.set()
+            raise ApplicationHandlerStop
+
+        app.add_handler(TypeHandler(Update, handler), group=-10)
+        await app.initialize()
+        await app.start()
+        try:
+            await app.update_queue.put(Update.de_json(_message(1, 1), app.bot))
+            await asyncio.wait_for(downloading.wait(), 5)
+            await app.update_queue.put(Update.de_json(_message(2, 2), app.bot))
+            # второй пользователь получает ответ, пока первый ещё ждёт загрузку
+            await asyncio.wait_for(answered.wait(), 5)
+        finally:
+            release.set()
+            await app.stop()
+            await app.shutdown()
+
+    asyncio.run(scenario())
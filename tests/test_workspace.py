@@ -0,0 +1,26 @@
+import os
+
+from workspace import Workspace
+
+
+def test_sweep_keeps_other_processes_downloads(tmp_path):
+    first = Workspace(str(tmp_path), owner="proc-a")
+    second = Workspace(str(tmp_path), owner="proc-b")
+    first.job_dir("x").mkdir()
+    second.job_dir("y").mkdir()
+    # второй процесс перезапустился: его старые каталоги удаляются, чужие — нет
+    assert second.sweep(()) == 1
+    assert second.sweep_stale() == 0
+    assert first.job_dir("x").exists()
+
+
+def test_sweep_stale_removes_dirs_of_finished_processes(tmp_path):
+    gone = Workspace(str(tmp_path), owner="proc-gone")
+    gone.job_dir("x").mkdir()
+    gone._lock.close()
+    (tmp_path / "legacy-key").mkdir()
+    old = os.path.getmtime(tmp_path / "legacy-key") - 7200
+    os.utime(tmp_path / "legacy-key", (old, old))
+    alive = Workspace(str(tmp_path), owner="proc-alive")
+    assert alive.sweep_stale(min_age=3600) == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["proc-alive", "proc-alive.lock"]
@@ -0,0 +1,53 @@
+import pytest
+
+import ydl_pool
+from ydl_pool import ExtractionFailed, YDLPool, checked
+
+
+class FakeYDL:
+    def __init__(self, result):
+        self.result = result
+        self.closed = False
+
+    def extract_info(self, url, download=False):
+        return self.result
+
+    def close(self):
+        self.closed = True
+
+
+def make_pool(monkeypatch, result, **kwargs):
+    pool = YDLPool(dict, **kwargs)
+    created = []
+
+    def new_slot():
+        created.append(FakeYDL(result))
+        return ydl_pool._Slot(created[-1])
+
+    monkeypatch.setattr(pool, "_new_slot", new_slot)
+    return pool, created
+
+
+def test_instance_is_reused_after_success(monkeypatch):
+    pool, created = make_pool(monkeypatch, {"id": "x"}, size=2)
+    for _ in range(3):
+        with pool.acquire() as ydl:
+            checked(ydl.extract_info("url"))
+    assert len(created) == 1
+
+
+def test_none_result_drops_the_instance(monkeypatch):
+    pool, created = make_pool(monkeypatch, None, size=2)
+    with pytest.raises(ExtractionFailed):
+        with pool.acquire() as ydl:
+            checked(ydl.extract_info("url"))
+    assert created[0].closed
+    assert pool.stats()["idle"] == 0 and pool.stats()["pooled"] == 0
+
+
+def test_configure_applies_to_new_pools(monkeypatch):
+    monkeypatch.setattr(ydl_pool, "_settings", dict(ydl_pool._settings))
+    monkeypatch.setattr(ydl_pool, "_pools", {})
+    ydl_pool.configure(size=3, max_uses=5, max_age=60)
+    pool = ydl_pool.pool_for("test", dict)
+    assert (pool._size, pool._max_uses, pool._max_age) == (3, 5, 60)
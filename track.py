@@ -0,0 +1,105 @@
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from cache import decode_value, encode_value
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # имён источников — единицы, а встречаются они в каждом результате
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Track:
+    """
+    Компактная запись о треке из результатов поиска или раскрытой ссылки (fetch_playlist).
+    Хранит только то, что читает бот: полный payload yt-dlp (миниатюры, списки форматов,
+    описание) отбрасывается при нормализации.
+    url — запасной адрес для скачивания, если у entry нет webpage_url.
+    """
+    __slots__ = ("id", "title", "webpage_url", "url", "duration", "uploader", "source")
+
+    def __init__(
+        self,
+        id: Optional[str] = None,  # noqa: A002 — имя поля как у yt-dlp
+        title: Optional[str] = None,
+        webpage_url: Optional[str] = None,
+        url: Optional[str] = None,
+        duration: Optional[float] = None,
+        uploader: Optional[str] = None,
+        source: Optional[str] = None,
+    ):
+        self.id = id
+        self.title = title
+        self.webpage_url = webpage_url
+        self.url = url
+        self.duration = duration
+        self.uploader = uploader
+        self.source = _intern(source)
+
+    @classmethod
+    def from_raw(cls, raw: Dict[str, Any]) -> "Track":
+        """Нормализуем разные структуры entry yt-dlp в единую запись."""
+        url = raw.get("url")
+        return cls(
+            id=raw.get("id"),
+            title=raw.get("title") or raw.get("name"),
+            webpage_url=raw.get("webpage_url") or url or raw.get("original_url"),
+            url=url if isinstance(url, str) else None,
+            duration=raw.get("duration"),
+            uploader=raw.get("uploader") or raw.get("uploader_id") or raw.get("channel"),
+            source=raw.get("extractor") or raw.get("extractor_key") or raw.get("ie_key"),
+        )
+
+    @classmethod
+    def from_row(cls, row: Any) -> "Track":
+        if isinstance(row, dict):
+            # формат кэша до появления Track: нормализованный dict с _raw = {"url": ...}
+            return cls(
+                id=row.get("id"),
+                title=row.get("title"),
+                webpage_url=row.get("webpage_url"),
+                url=(row.get("_raw") or {}).get("url"),
+                duration=row.get("duration"),
+                uploader=row.get("uploader"),
+                source=row.get("source"),
+            )
+        return cls(*row)
+
+    def to_row(self) -> List[Any]:
+        """Позиционная форма для сериализации: без имён полей в каждом элементе."""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @property
+    def download_url(self) -> Optional[str]:
+        return self.webpage_url or self.url or self.id
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Track):
+            return NotImplemented
+        return self.to_row() == other.to_row()
+
+    def __repr__(self) -> str:
+        return f"Track(source={self.source!r}, id={self.id!r}, title={self.title!r})"
+
+
+def encode_tracks(tracks: Iterable[Track]) -> bytes:
+    """Сериализация результатов поиска для постоянных бэкендов кэша."""
+    return encode_value([t.to_row() for t in tracks])
+
+
+def decode_tracks(blob: bytes) -> List[Track]:
+    return [Track.from_row(row) for row in decode_value(blob)]
+
+
+def encode_results(results: Tuple[Optional[str], Iterable[Track]]) -> bytes:
+    """Значение кэша поиска: (название плейлиста или None, треки)."""
+    playlist, tracks = results
+    return encode_value({"playlist": playlist, "tracks": [t.to_row() for t in tracks]})
+
+
+def decode_results(blob: bytes) -> Tuple[Optional[str], List[Track]]:
+    value = decode_value(blob)
+    if not isinstance(value, dict):
+        # запись старого формата (только список треков): без названия плейлиста — считаем промахом
+        raise ValueError("search results entry without a playlist field")
+    return value["playlist"], [Track.from_row(row) for row in value["tracks"]]
@@ -0,0 +1,200 @@
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Iterable, List, Optional
+
+from track import Track
+from track_store import track_key
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+# Слова, которые есть в половине заголовков и ничего не говорят о треке
+_NOISE = frozenset({"official", "video", "audio", "lyrics", "lyric", "hd", "hq", "mv", "ft", "feat", "the"})
+# Версия схемы FTS (PRAGMA user_version): 1 — в индекс пишется текст после fold()
+_SCHEMA_VERSION = 1
+
+
+def fold(text: Optional[str]) -> Optional[str]:
+    """
+    Нижний регистр без диакритики: "Ёлка" -> "елка", "Café" -> "cafe".
+    remove_diacritics у FTS5 не трогает кириллицу, поэтому и индекс, и запрос проходят через эту функцию.
+    """
+    if not text:
+        return text
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Нормализованные токены запроса/заголовка: fold(), без пунктуации и шумовых слов."""
+    words = _TOKEN_RE.findall(fold(text or ""))
+    return [w for w in words if w not in _NOISE and (len(w) > 1 or w.isdigit())]
+
+
+class TrackIndex:
+    """
+    Локальный полнотекстовый индекс (SQLite FTS5) всех треков, которые возвращал поиск.
+    Отвечает на похожие запросы ("billie jean" / "Billie Jean MJ") без обращения к источникам
+    и питает inline-режим. Если FTS5 в sqlite3 нет — индекс выключается и search() возвращает [].
+    Размер ограничен max_rows: prune() удаляет давно не встречавшиеся треки.
+    """
+    def __init__(self, db_path: str, max_rows: int = 200_000):
+        self._max_rows = max_rows
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        # триггеры ниже пишут в FTS текст через fold(): функция нужна каждому соединению
+        self._conn.create_function("fold", 1, fold, deterministic=True)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            " rowid INTEGER PRIMARY KEY,"
+            " extractor TEXT NOT NULL,"
+            " track_id TEXT NOT NULL,"
+            " source TEXT,"
+            " title TEXT,"
+            " uploader TEXT,"
+            " webpage_url TEXT,"
+            " url TEXT,"
+            " duration REAL,"
+            " seen_at REAL NOT NULL,"
+            " UNIQUE (extractor, track_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tracks_seen_at ON tracks(seen_at)")
+        try:
+            # external content: FTS хранит только токены, сами строки — в tracks
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5("
+                " title, uploader, content='tracks', content_rowid='rowid',"
+                " tokenize='unicode61 remove_diacritics 2')"
+            )
+            (version,) = self._conn.execute("PRAGMA user_version").fetchone()
+            if version < _SCHEMA_VERSION:
+                self._migrate()
+            self._conn.executescript(
+                "CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN"
+                "  INSERT INTO tracks_fts(rowid, title, uploader) VALUES (new.rowid, fold(new.title), fold(new.uploader));"
+                " END;"
+                "CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN"
+                "  INSERT INTO tracks_fts(tracks_fts, rowid, title, uploader)"
+                "  VALUES ('delete', old.rowid, fold(old.title), fold(old.uploader));"
+                " END;"
+                "CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE OF title, uploader ON tracks BEGIN"
+                "  INSERT INTO tracks_fts(tracks_fts, rowid, title, uploader)"
+                "  VALUES ('delete', old.rowid, fold(old.title), fold(old.uploader));"
+                "  INSERT INTO tracks_fts(rowid, title, uploader) VALUES (new.rowid, fold(new.title), fold(new.uploader));"
+                " END;"
+            )
+            self.enabled = True
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite FTS5 unavailable, local track index disabled: %s", e)
+            self.enabled = False
+
+    def _migrate(self) -> None:
+        # индекс без fold(): пересобираем его и триггеры (сами строки tracks не меняются)
+        self._conn.executescript(
+            "BEGIN;"
+            "DROP TRIGGER IF EXISTS tracks_ai;"
+            "DROP TRIGGER IF EXISTS tracks_ad;"
+            "DROP TRIGGER IF EXISTS tracks_au;"
+            "INSERT INTO tracks_fts(tracks_fts) VALUES ('delete-all');"
+            "INSERT INTO tracks_fts(rowid, title, uploader) SELECT rowid, fold(title), fold(uploader) FROM tracks;"
+            f"PRAGMA user_version = {_SCHEMA_VERSION};"
+            "COMMIT;"
+        )
+
+    def add(self, tracks: Iterable[Track]) -> None:
+        """Добавляет/обновляет треки; seen_at сдвигается, чтобы часто встречающиеся не вытеснялись."""
+        if not self.enabled:
+            return
+        now = time.time()
+        rows = []
+        for t in tracks:
+            tkey = track_key(t)
+            if not tkey or not t.title:
+                continue
+            rows.append((*tkey, t.source, t.title, t.uploader, t.webpage_url, t.url, t.duration, now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO tracks (extractor, track_id, source, title, uploader, webpage_url, url, duration, seen_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (extractor, track_id) DO UPDATE SET"
+                    " title = excluded.title, uploader = excluded.uploader, webpage_url = excluded.webpage_url,"
+                    " url = excluded.url, duration = excluded.duration, seen_at = excluded.seen_at",
+                    rows,
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _match(self, expr: str, limit: int) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT t.source, t.track_id, t.title, t.uploader, t.webpage_url, t.url, t.duration"
+                " FROM tracks_fts JOIN tracks t ON t.rowid = tracks_fts.rowid"
+                " WHERE tracks_fts MATCH ?"
+                # совпадение в заголовке весит больше, чем в имени автора
+                " ORDER BY bm25(tracks_fts, 10.0, 3.0) LIMIT ?",
+                (expr, limit),
+            ).fetchall()
+
+    def search(self, query: str, limit: int = 30) -> List[Track]:
+        """
+        Все токены запроса (последний — как префикс, для inline-ввода по буквам).
+        Для запросов из трёх и более слов добираем неполные совпадения: трек должен покрыть
+        не меньше 2/3 токенов, чтобы "Billie Jean MJ" нашёл "Michael Jackson - Billie Jean".
+        """
+        if not self.enabled:
+            return []
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        terms = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+        rows = self._match(" AND ".join(terms), limit)
+        if len(rows) < limit and len(tokens) > 2:
+            need = math.ceil(len(tokens) * 2 / 3)
+            seen = {(row[0], row[1]) for row in rows}
+            rows += [
+                row for row in self._match(" OR ".join(terms), limit * 4)
+                if (row[0], row[1]) not in seen
+                and len(set(tokens) & set(tokenize(f"{row[2]} {row[3] or ''}"))) >= need
+            ][:limit - len(rows)]
+        return [
+            Track(id=track_id, title=title, webpage_url=webpage_url, url=url, duration=duration, uploader=uploader, source=source)
+            for source, track_id, title, uploader, webpage_url, url, duration in rows
+        ]
+
+    def prune(self) -> int:
+        """Удаляет самые давно встречавшиеся треки сверх max_rows. Возвращает число удалённых."""
+        if not self.enabled or not self._max_rows:
+            return 0
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()
+            excess = count - self._max_rows
+            if excess <= 0:
+                return 0
+            self._conn.execute(
+                "DELETE FROM tracks WHERE rowid IN (SELECT rowid FROM tracks ORDER BY seen_at LIMIT ?)", (excess,)
+            )
+            return excess
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM tracks").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,157 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+from track import Track
+
+
+def track_key(entry: Track) -> Optional[Tuple[str, str]]:
+    """
+    Ключ трека для постоянного хранилища: (extractor, id).
+    Возвращает None, если у entry нет id.
+    """
+    if not entry.id:
+        return None
+    extractor = (entry.source or "generic").lower()
+    return extractor, str(entry.id)
+
+
+class TrackStore:
+    """
+    Постоянное хранилище уже отправленных треков.
+    (extractor, id) -> Telegram file_id, плюс опциональный архив аудиофайлов на диске
+    с ограничением по размеру и LRU-вытеснением.
+    """
+    def __init__(self, db_path: str, files_dir: Optional[str] = None, max_bytes: int = 0):
+        self._files_dir = files_dir or None
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        if self._files_dir:
+            os.makedirs(self._files_dir, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tracks ("
+            " extractor TEXT NOT NULL,"
+            " track_id TEXT NOT NULL,"
+            " file_id TEXT,"
+            " file_path TEXT,"
+            " file_size INTEGER NOT NULL DEFAULT 0,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (extractor, track_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tracks_last_used ON tracks(last_used)")
+
+    def get_file_id(self, extractor: str, track_id: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id FROM tracks WHERE extractor = ? AND track_id = ?",
+                (extractor, track_id),
+            ).fetchone()
+            if not row or not row[0]:
+                return None
+            self._touch(extractor, track_id)
+            return row[0]
+
+    def set_file_id(self, extractor: str, track_id: str, file_id: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tracks (extractor, track_id, file_id, last_used) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(extractor, track_id) DO UPDATE SET file_id = excluded.file_id,"
+                " last_used = excluded.last_used",
+                (extractor, track_id, file_id, time.time()),
+            )
+
+    def forget_file_id(self, extractor: str, track_id: str) -> None:
+        # file_id может стать недействительным (например, после смены токена бота)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tracks SET file_id = NULL WHERE extractor = ? AND track_id = ?",
+                (extractor, track_id),
+            )
+
+    def get_file(self, extractor: str, track_id: str) -> Optional[str]:
+        """Путь к сохранённому аудиофайлу или None."""
+        if not self._files_dir:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_path FROM tracks WHERE extractor = ? AND track_id = ?",
+                (extractor, track_id),
+            ).fetchone()
+            if not row or not row[0]:
+                return None
+            if not os.path.exists(row[0]):
+                self._conn.execute(
+                    "UPDATE tracks SET file_path = NULL, file_size = 0 WHERE extractor = ? AND track_id = ?",
+                    (extractor, track_id),
+                )
+                return None
+            self._touch(extractor, track_id)
+            return row[0]
+
+    def put_file(self, extractor: str, track_id: str, src_path: str) -> Optional[str]:
+        """
+        Копирует аудиофайл в архив и вытесняет самые давно использованные файлы,
+        если суммарный размер превышает лимит. Возвращает путь в архиве или None.
+        """
+        if not self._files_dir:
+            return None
+        size = os.path.getsize(src_path)
+        if self._max_bytes and size > self._max_bytes:
+            return None
+        safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in f"{extractor}_{track_id}")
+        ext = os.path.splitext(src_path)[1].lower() or ".mp3"
+        dst_path = os.path.join(self._files_dir, safe_name + ext)
+        tmp_path = dst_path + ".part"
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, dst_path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO tracks (extractor, track_id, file_path, file_size, last_used) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(extractor, track_id) DO UPDATE SET file_path = excluded.file_path,"
+                " file_size = excluded.file_size, last_used = excluded.last_used",
+                (extractor, track_id, dst_path, size, time.time()),
+            )
+            self._evict()
+        return dst_path
+
+    def _touch(self, extractor: str, track_id: str) -> None:
+        self._conn.execute(
+            "UPDATE tracks SET last_used = ? WHERE extractor = ? AND track_id = ?",
+            (time.time(), extractor, track_id),
+        )
+
+    def _evict(self) -> None:
+        if not self._max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(file_size), 0) FROM tracks").fetchone()[0]
+        if total <= self._max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT extractor, track_id, file_path, file_size FROM tracks"
+            " WHERE file_path IS NOT NULL ORDER BY last_used"
+        ).fetchall()
+        for extractor, track_id, file_path, file_size in rows:
+            if total <= self._max_bytes:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+            # file_id оставляем — он по-прежнему позволяет отправить трек без загрузки
+            self._conn.execute(
+                "UPDATE tracks SET file_path = NULL, file_size = 0 WHERE extractor = ? AND track_id = ?",
+                (extractor, track_id),
+            )
+            total -= file_size
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
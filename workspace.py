@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import os
+import shutil
+import socket
+import time
+from pathlib import Path
+from typing import IO, Container, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: живость чужих процессов не проверить, их каталоги не трогаем
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Каталоги процессов: TEMP_DIR/proc-<host>-<pid>/ и рядом proc-<host>-<pid>.lock
+OWNER_PREFIX = "proc-"
+
+
+class WorkspaceFull(Exception):
+    """В TEMP_DIR не освободилось места за отведённое время — загрузку не начинаем."""
+
+
+def _lock(path: Path) -> Optional[IO]:
+    """Открывает lock-файл и берёт на нём flock; None — его держит живой процесс."""
+    handle = open(path, "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+    return handle
+
+
+def _remove(item: Path) -> None:
+    if item.is_dir() and not item.is_symlink():
+        shutil.rmtree(item, ignore_errors=True)
+    else:
+        item.unlink()
+
+
+def dir_bytes(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class Workspace:
+    """
+    Рабочая папка загрузок: TEMP_DIR/<процесс>/<key>/ на каждую загрузку.
+    - у каждого процесса свой подкаталог и lock-файл, который он держит, пока жив: несколько
+      процессов с общим TEMP_DIR не удаляют загрузки друг друга;
+    - квота max_bytes на весь TEMP_DIR: новая загрузка ждёт, пока освободится место (wait_for_room),
+      или отклоняется;
+    - уборка сирот: каталоги своего процесса, которые не держит ни одна загрузка, удаляются при
+      старте и по таймеру (sweep), каталоги завершившихся процессов — целиком (sweep_stale);
+    - staging: промежуточные файлы (исходник до перекодирования) можно писать в каталог в RAM
+      (например, /dev/shm) со своей квотой; готовый файл переносится в TEMP_DIR.
+    Квота проверяется при допуске: загрузка, начатая при свободном месте, может её немного превысить.
+    """
+    def __init__(
+        self,
+        root: str,
+        max_bytes: int = 0,
+        staging_root: Optional[str] = None,
+        staging_max_bytes: int = 0,
+        owner: Optional[str] = None,
+    ):
+        # hostname отличает контейнеры с общим томом, где у всех процессов бывает один и тот же PID
+        self.owner = owner or f"{OWNER_PREFIX}{socket.gethostname()}-{os.getpid()}"
+        self.base = Path(root)
+        self.staging_base = Path(staging_root) if staging_root else None
+        self.root = self.base / self.owner
+        self.staging_root = self.staging_base / self.owner if self.staging_base is not None else None
+        self._max_bytes = max_bytes
+        self._staging_max_bytes = staging_max_bytes
+        self._freed: Optional[asyncio.Event] = None
+        self.base.mkdir(parents=True, exist_ok=True)
+        # lock-файл берётся раньше, чем появляется каталог, — иначе другой процесс счёл бы его брошенным
+        self._lock = _lock(self.base / f"{self.owner}.lock")
+        if self._lock is None:
+            logger.warning("TEMP_DIR owner %s is locked by another process", self.owner)
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.staging_root is not None:
+            self.staging_root.mkdir(parents=True, exist_ok=True)
+
+    def job_dir(self, key: str) -> Path:
+        return self.root / key
+
+    def staging_dir(self, key: str) -> Optional[Path]:
+        """Каталог для промежуточных файлов в RAM или None, если staging выключен или заполнен."""
+        if self.staging_root is None:
+            return None
+        if self._staging_max_bytes and self.staging_usage() >= self._staging_max_bytes:
+            return None
+        return self.staging_root / key
+
+    def usage(self) -> int:
+        return dir_bytes(self.base)
+
+    def staging_usage(self) -> int:
+        return dir_bytes(self.staging_base) if self.staging_base is not None else 0
+
+    def has_room(self) -> bool:
+        return not self._max_bytes or self.usage() < self._max_bytes
+
+    async def wait_for_room(self, timeout: float) -> bool:
+        """Ждёт, пока TEMP_DIR опустится ниже квоты. False — не дождались за timeout секунд."""
+        deadline = time.monotonic() + timeout
+        while not self.has_room():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._freed is None:
+                self._freed = asyncio.Event()
+            self._freed.clear()
+            try:
+                # место может освободиться и не через remove() (например, файлы удалили вручную)
+                await asyncio.wait_for(self._freed.wait(), timeout=min(remaining, 5.0))
+            except asyncio.TimeoutError:
+                pass
+        return True
+
+    def remove(self, key: str) -> None:
+        shutil.rmtree(self.job_dir(key), ignore_errors=True)
+        if self.staging_root is not None:
+            shutil.rmtree(self.staging_root / key, ignore_errors=True)
+        if self._freed is not None:
+            self._freed.set()
+
+    def sweep(self, active: Container[str], min_age: float = 0.0) -> int:
+        """
+        Удаляет из каталогов этого процесса (в TEMP_DIR и staging) всё, что не принадлежит
+        активным загрузкам (active) и не менялось min_age секунд. Возвращает число удалённых записей.
+        """
+        now = time.time()
+        removed = 0
+        for base in (self.root, self.staging_root):
+            if base is None or not base.exists():
+                continue
+            for item in base.iterdir():
+                if item.name in active:
+                    continue
+                try:
+                    if now - item.stat().st_mtime < min_age:
+                        continue
+                    _remove(item)
+                    removed += 1
+                except OSError as e:
+                    logger.warning("Failed to remove orphan %s: %s", item, e)
+        if removed and self._freed is not None:
+            self._freed.set()
+        return removed
+
+    def sweep_stale(self, min_age: float = 0.0) -> int:
+        """
+        Удаляет каталоги процессов, которые уже не работают (их lock-файл никто не держит),
+        и записи в TEMP_DIR вне каталогов процессов, не менявшиеся min_age секунд.
+        Возвращает число удалённых записей.
+        """
+        now = time.time()
+        removed = 0
+        owners = set()
+        for base in (self.base, self.staging_base):
+            if base is None or not base.exists():
+                continue
+            for item in base.iterdir():
+                name = item.name
+                if name.startswith(OWNER_PREFIX):
+                    owners.add(name[: -len(".lock")] if name.endswith(".lock") else name)
+                    continue
+                try:
+                    if now - item.stat().st_mtime < min_age:
+                        continue
+                    _remove(item)
+                    removed += 1
+                except OSError as e:
+                    logger.warning("Failed to remove orphan %s: %s", item, e)
+        owners.discard(self.owner)
+        for owner in owners:
+            if fcntl is None:
+                break
+            lock_path = self.base / f"{owner}.lock"
+            handle = _lock(lock_path)
+            if handle is None:
+                continue
+            try:
+                for base in (self.base, self.staging_base):
+                    if base is not None and (base / owner).exists():
+                        shutil.rmtree(base / owner, ignore_errors=True)
+                        removed += 1
+                lock_path.unlink()
+            except OSError as e:
+                logger.warning("Failed to remove stale dir of %s: %s", owner, e)
+            finally:
+                handle.close()
+        if removed and self._freed is not None:
+            self._freed.set()
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bytes": self.usage(),
+            "max_bytes": self._max_bytes,
+            "staging_bytes": self.staging_usage(),
+            "staging_max_bytes": self._staging_max_bytes,
+        }
@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Hashable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    # yt_dlp с сотнями extractors импортируется при создании первого экземпляра, а не при старте бота
+    from yt_dlp import YoutubeDL
+
+# Параметры пулов, создаваемых pool_for: размер на профиль опций, число использований и возраст (сек),
+# после которых экземпляр пересоздаётся. Задаются через configure() (YDL_POOL_* в config)
+_settings: Dict[str, Any] = {"size": 8, "max_uses": 200, "max_age": 1800.0}
+
+
+class ExtractionFailed(Exception):
+    """extract_info вернул None: с ignoreerrors=True так yt-dlp сообщает об ошибке extractor'а."""
+
+
+def checked(info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Результат extract_info / process_ie_result, None превращается в ExtractionFailed.
+    Вызывается внутри acquire(): исключение сообщает пулу, что экземпляр нужно выбросить.
+    """
+    if info is None:
+        raise ExtractionFailed()
+    return info
+
+
+class _Slot:
+    __slots__ = ("ydl", "created", "uses")
+
+    def __init__(self, ydl: "YoutubeDL"):
+        self.ydl = ydl
+        self.created = time.monotonic()
+        self.uses = 0
+
+
+class YDLPool:
+    """
+    Потокобезопасный пул экземпляров YoutubeDL с одинаковыми опциями.
+    Экземпляр выдаётся одному потоку за раз (YoutubeDL не потокобезопасен), затем возвращается
+    в пул вместе с инициализированными extractors, cookie jar и HTTP-сессиями.
+    Проверка при выдаче: экземпляры старше max_age или с max_uses использованиями пересоздаются,
+    после исключения экземпляр выбрасывается. Если все заняты — создаётся временный сверх лимита,
+    чтобы поток поиска не ждал чужую загрузку.
+    """
+    def __init__(
+        self,
+        make_opts: Callable[[], Dict[str, Any]],
+        size: int = 8,
+        max_uses: int = 200,
+        max_age: float = 1800.0,
+    ):
+        self._make_opts = make_opts
+        self._size = max(1, size)
+        self._max_uses = max_uses
+        self._max_age = max_age
+        self._idle: Deque[_Slot] = deque()
+        self._pooled = 0
+        self._lock = threading.Lock()
+        self.created = 0
+        self.recycled = 0
+        self.overflow = 0
+
+    @contextmanager
+    def acquire(self) -> Iterator["YoutubeDL"]:
+        slot, pooled = self._take()
+        ok = False
+        try:
+            yield slot.ydl
+            ok = True
+        finally:
+            slot.uses += 1
+            self._give_back(slot, pooled, ok)
+
+    def warm(self, count: int = 1, prepare: Optional[Callable[["YoutubeDL"], None]] = None) -> None:
+        """
+        Заранее создаёт до count экземпляров (инициализация extractors на старте, а не в первом запросе).
+        prepare(ydl) вызывается для каждого нового экземпляра — например, чтобы загрузить нужные extractors.
+        """
+        with self._lock:
+            count = max(0, min(count, self._size - self._pooled))
+            self._pooled += count
+        for _ in range(count):
+            try:
+                slot = self._new_slot()
+                if prepare is not None:
+                    prepare(slot.ydl)
+            except Exception:
+                with self._lock:
+                    self._pooled -= 1
+                raise
+            with self._lock:
+                self._idle.append(slot)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "idle": len(self._idle),
+                "pooled": self._pooled,
+                "created": self.created,
+                "recycled": self.recycled,
+                "overflow": self.overflow,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            slots = list(self._idle)
+            self._idle.clear()
+            self._pooled -= len(slots)
+        for slot in slots:
+            self._close(slot)
+
+    def _new_slot(self) -> _Slot:
+        from yt_dlp import YoutubeDL
+
+        slot = _Slot(YoutubeDL(self._make_opts()))
+        with self._lock:
+            self.created += 1
+        return slot
+
+    def _expired(self, slot: _Slot) -> bool:
+        return (self._max_uses and slot.uses >= self._max_uses) or (
+            self._max_age and time.monotonic() - slot.created > self._max_age
+        )
+
+    def _take(self):
+        stale: List[_Slot] = []
+        with self._lock:
+            slot = None
+            while self._idle:
+                candidate = self._idle.pop()  # LIFO: самые «тёплые» соединения
+                if self._expired(candidate):
+                    stale.append(candidate)
+                    self._pooled -= 1
+                    self.recycled += 1
+                    continue
+                slot = candidate
+                break
+            pooled = True
+            if slot is None:
+                if self._pooled < self._size:
+                    self._pooled += 1
+                else:
+                    pooled = False
+                    self.overflow += 1
+        for old in stale:
+            self._close(old)
+        if slot is None:
+            try:
+                slot = self._new_slot()
+            except Exception:
+                if pooled:
+                    with self._lock:
+                        self._pooled -= 1
+                raise
+        return slot, pooled
+
+    def _give_back(self, slot: _Slot, pooled: bool, ok: bool) -> None:
+        if pooled and ok and not self._expired(slot):
+            with self._lock:
+                self._idle.append(slot)
+            return
+        if pooled:
+            with self._lock:
+                self._pooled -= 1
+                if ok:
+                    self.recycled += 1
+        self._close(slot)
+
+    @staticmethod
+    def _close(slot: _Slot) -> None:
+        try:
+            slot.ydl.close()
+        except Exception:
+            pass
+
+
+_pools: Dict[Hashable, YDLPool] = {}
+_pools_lock = threading.Lock()
+
+
+def configure(size: int, max_uses: int, max_age: float) -> None:
+    """Параметры для пулов, которые ещё не созданы: вызывается из main до прогрева и первого запроса."""
+    _settings.update(size=size, max_uses=max_uses, max_age=max_age)
+
+
+def pool_for(profile: Hashable, make_opts: Callable[[], Dict[str, Any]]) -> YDLPool:
+    """Пул для профиля опций (search / playlist / fetch ...); создаётся при первом обращении."""
+    with _pools_lock:
+        pool = _pools.get(profile)
+        if pool is None:
+            pool = _pools[profile] = YDLPool(make_opts, **_settings)
+        return pool
+
+
+def pools_stats() -> Dict[str, Dict[str, int]]:
+    with _pools_lock:
+        items = list(_pools.items())
+    return {str(profile): pool.stats() for profile, pool in items}